@@ -5,27 +5,102 @@
 The Controller module bridging the UI, Config, and Git logic.
 """
 
+import contextlib
+import os
 import re
-import tiktoken
-from typing import List, Dict, Any
-from openai import OpenAI  # NEW IMPORT
-from git_utils import GitManager
+import sqlite3
+import time
+from typing import TYPE_CHECKING, List, Dict, Any, Callable, Optional, Tuple
+from git_utils import GitManager, RepoSnapshot
 from config_manager import ConfigManager
+from diff_packer import DiffPacker, budget_for_model, DIFF_READ_FACTOR
+from token_service import TokenCounter, BYTES_PER_TOKEN
+from cancellation import CancelToken
+from generation_cache import GenerationCache
+from map_reduce import MapReduceSummarizer, estimate_tokens
+from secret_scanner import SecretScanner, Finding
+from tracing import Trace, TraceLog
+from dispatcher import HedgedDispatcher, LatencyStats
+from history_index import HistoryIndex
+from file_classifier import FileClassifier
+from staged_diff import StagedDiff
+from branch_rewrite import BranchRewriter
+from prompt_builder import PROMPT_VERSION, build_messages
+
+if TYPE_CHECKING:
+    from openai import OpenAI  # Imported on first use: it is the bulk of cold-start time
+
+# Per-request HTTP timeout; slow models are hedged long before this (see dispatcher.py)
+REQUEST_TIMEOUT_SEC = 60.0
+
+# History lines given to the model, and how long a refresh waits for the history index to catch up
+HISTORY_N = 10
+HISTORY_INDEX_WAIT_SEC = 0.3
+
+# Figures of the winning request copied onto a generation trace
+STREAM_FIGURES = ("prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens",
+                  "ttft_ms", "tokens_per_sec", "http_latency_ms")
+
+def _usage_figures(usage: Any) -> Dict[str, Any]:
+    """Token counts, cached prompt tokens and cost (OpenRouter extension) from an API usage object."""
+    if usage is None:
+        return {}
+    raw = usage.model_dump() if hasattr(usage, "model_dump") else dict(usage)
+    figures = {key: raw.get(key) for key in ("prompt_tokens", "completion_tokens", "total_tokens") if raw.get(key) is not None}
+    details = raw.get("prompt_tokens_details") or {}
+    if details.get("cached_tokens") is not None:
+        figures["cached_tokens"] = details["cached_tokens"]
+    if raw.get("cost") is not None:
+        figures["cost"] = raw["cost"]
+    return figures
+
 
 class AppLogic:
-    def __init__(self):
-        self.config = ConfigManager()
+    def __init__(self, repo_path: str = None, config: ConfigManager = None, tokens: TokenCounter = None,
+                 generation_cache: GenerationCache = None):
+        """
+        All arguments are optional; headless callers pass `repo_path` to bypass the
+        saved repo, and share config/tokens/cache between several instances.
+        """
+        self.config = config or ConfigManager()
         
-        # Initialize Git with the last used path
-        initial_path = self.config.get("last_repo_path")
+        # Initialize Git with the explicit path, or the last used one
+        initial_path = repo_path or self.config.get("last_repo_path")
         self.git = GitManager(initial_path)
 
-        # Definitions
-        self.lockfiles = {
-            "package-lock.json", "yarn.lock", "pnpm-lock.yaml", 
-            "Cargo.lock", "go.sum", "composer.lock", "Gemfile.lock"
-        }
-        
+        # Shared tokenizer: encoders load once, counts are memoized by content hash
+        self.tokens = tokens or TokenCounter()
+
+        # Generated messages are cached beside the config file
+        if generation_cache is None:
+            cache_dir = os.path.dirname(self.config.config_path)
+            generation_cache = GenerationCache(os.path.join(cache_dir, ".git-ai-commit-cache.json"))
+        self.generation_cache = generation_cache
+
+        # Optional RateLimiter wrapped around every API call (set by batch callers)
+        self.rate_limiter = None
+
+        # API clients per (endpoint, key), reused so their pooled connections stay open
+        # between requests (shareable, like rate_limiter)
+        self.api_clients: Dict[Tuple[str, str], "OpenAI"] = {}
+
+        # Content scanning results are reused for as long as the snapshot is
+        self.secret_scanner = SecretScanner()
+        self._scan_cache = (None, [], None)
+
+        # Snapshot behind the last load_repo_data; the diff viewer slices file diffs from it
+        self._last_snapshot: Optional[RepoSnapshot] = None
+
+        # Past commits relevant to the staged paths (index per repo, history text per snapshot)
+        self._history_index: Optional[HistoryIndex] = None
+        self._history_cache = (None, "")
+
+        # Rolling time-to-first-token per model; sets the hedge thresholds (shareable, like rate_limiter)
+        self.latency_stats = LatencyStats()
+
+        # Per-stage timings of every refresh and generation, appended to a rotating JSONL file
+        self.trace_log = TraceLog(os.path.join(os.path.dirname(self.config.config_path), ".git-ai-commit-trace.jsonl"))
+
         # Regex for sensitive files
         self.sensitive_patterns = [
             r"\.env.*",           # Environment files
@@ -35,39 +110,110 @@ class AppLogic:
             r"secrets\..*"        # Explicit secret files
         ]
 
-    def load_repo_data(self) -> Dict[str, Any]:
-        """Fetches current state, filters noise, and checks security."""
+    def load_repo_data(self, model: str = None, cancel: CancelToken = None, trace: Trace = None) -> Dict[str, Any]:
+        """
+        Fetches current state, filters noise, and checks security.
+        Cancelling `cancel` kills running git processes and returns {"error": "Cancelled"}.
+        Stage timings go into `trace` (or a new "refresh" trace, which is logged) and are
+        returned as data["trace"].
+        """
         if not self.git.set_repo_path(self.git.repo_path):
             return {"error": "Invalid Repository"}
 
-        # 1. Get List of Files
-        all_files = self.git.get_staged_files()
+        model = model or self.config.get("selected_model")
+        own_trace = trace is None
+        if own_trace:
+            trace = Trace("refresh", repo=self.git.repo_path, model=model)
 
-        # 2. Identify Lockfiles & Security Risks
-        found_lockfiles = [f for f in all_files if f in self.lockfiles]
+        # 1. Gather the staged state in one batched pass (cached until the index changes).
+        # Lockfiles, generated/vendored code, binaries and oversized files are excluded from the
+        # diff up front via pathspecs to save tokens, and reading stops past a multiple of the
+        # model's budget so huge diffs are never fully loaded.
+        budget = budget_for_model(model)
+        with trace.span("git.snapshot") as span:
+            snapshot = self.git.get_snapshot(
+                classifier=self._get_classifier(),
+                history_n=HISTORY_N,
+                diff_max_bytes=budget * BYTES_PER_TOKEN * DIFF_READ_FACTOR,
+                cancel=cancel
+            )
+            cached = snapshot is self._scan_cache[0]
+            span.attrs.update(cached=cached, bytes_read=snapshot.diff_bytes_read, truncated=snapshot.diff_truncated)
+            if not cached:
+                span.attrs["commands"] = snapshot.git_commands
+        if cancel is not None and cancel.cancelled:
+            return {"error": "Cancelled"}
+        if snapshot.diff_error:
+            return {"error": f"Reading the staged diff failed: {snapshot.diff_error}"}
+        self._last_snapshot = snapshot
+        all_files = snapshot.files
+
+        # 2. Excluded files & Security Risks (sensitive filenames and secrets in added lines)
+        excluded = snapshot.excluded
+        found_lockfiles = [f for f in all_files if excluded.get(f) == "lockfile"]
         security_warnings = self._scan_for_secrets(all_files)
+        with trace.span("secrets.scan", cached=cached) as span:
+            findings, safe_diff = self._scan_diff_content(snapshot)
+            span.attrs["findings"] = len(findings)
 
-        # 3. Get Smart Diff (Excluding lockfiles to save tokens)
-        diff_text = self.git.get_staged_diff(exclude_files=found_lockfiles)
-        
-        # 4. Fallback: If diff is massive (> 12k chars), use stat only
-        if len(diff_text) > 12000:
-            diff_text = "(Diff too large. Using summary.)\n" + self.git._run_command("git diff --cached --stat")
+        # 3. Pack the diff into the token budget: best hunks verbatim, the rest summarized
+        numstat = [entry for entry in snapshot.numstat if entry[2] not in excluded]
+        with trace.span("diff.pack", budget=budget) as span:
+            packed = DiffPacker(lambda texts: self.tokens.count_many(texts, model)).pack(safe_diff, budget, numstat)
+            span.attrs.update(diff_tokens=packed.token_count, included_files=len(packed.included_files),
+                              summarized_files=len(packed.summarized_files))
+        diff_text = packed.text
 
-        # 5. Calculate Tokens (Simulated Prompt)
-        # We estimate based on a theoretical prompt structure to be safe
-        est_prompt = f"{diff_text}\n{str(all_files)}\n{self.git.get_recent_history()}"
-        token_count = self._count_tokens(est_prompt)
+        # 4. Past commits that touched the same files or directories, for scope and style matching
+        with trace.span("history.related") as span:
+            history = self._related_history(snapshot, span)
 
-        return {
+        data = {
             "files": all_files,
             "diff_text": diff_text,
-            "history": self.git.get_recent_history(),
+            "history": history,
+        }
+
+        # 5. Count exactly what will be sent (without a hint, which is typed later)
+        with trace.span("tokens.prompt") as span:
+            token_count = self.tokens.count_messages(self._build_messages(data, "", model), model)
+            span.attrs["tokens"] = token_count
+
+        # 6. Per-file stats for the diff viewer; files beyond the read limit get an estimate
+        summarized = set(packed.summarized_files)
+        file_stats = []
+        for added, deleted, path in snapshot.numstat:
+            tokens = packed.file_tokens.get(path)
+            file_stats.append({
+                "path": path,
+                "added": added,
+                "deleted": deleted,
+                "blobs": snapshot.blob_oids.get(path),  # Identifies the file's diff across refreshes
+                "tokens": tokens if tokens is not None else estimate_tokens(added, deleted),
+                "estimated": tokens is None,
+                "excluded": excluded.get(path),  # The reason, or None
+                "summarized": path in summarized,
+            })
+
+        data.update({
             "repo_name": self.git.repo_path,
             "token_count": token_count,
             "warnings": security_warnings,
-            "lockfiles_excluded": found_lockfiles
-        }
+            "secret_findings": [f.to_dict() for f in findings],
+            "lockfiles_excluded": found_lockfiles,
+            "excluded_files": excluded,
+            "summarized_files": packed.summarized_files,
+            "diff_budget": budget,
+            "numstat": numstat,
+            "file_stats": file_stats,
+            # Some files only fit as summaries: the change is too big for one prompt
+            "needs_map_reduce": bool(packed.summarized_files),
+            "trace": trace,
+        })
+        trace.set(files=len(all_files), prompt_tokens_est=token_count)
+        if own_trace:
+            self._log_trace(trace)
+        return data
 
     def _scan_for_secrets(self, file_list: List[str]) -> List[str]:
         warnings = []
@@ -78,75 +224,306 @@ class AppLogic:
                     break
         return warnings
 
-    def _count_tokens(self, text: str) -> int:
+    def _get_classifier(self) -> FileClassifier:
+        """Exclusion rules from the current settings (built per load, so edits apply immediately)."""
+        return FileClassifier(
+            extra_globs=self.config.get("exclude_globs") or [],
+            max_lines=int(self.config.get("max_file_lines")),
+            max_bytes=int(self.config.get("max_file_bytes")),
+        )
+
+    def _related_history(self, snapshot, span) -> str:
+        """
+        The HISTORY_N past commits most relevant to the staged paths, from the incremental
+        history index. Falls back to the latest commits (from the snapshot) when the index
+        is disabled, empty or unavailable.
+        """
+        if not self.config.get("history_index_enabled") or not snapshot.head_oid or not snapshot.files:
+            return snapshot.history
+        cached_snapshot, history = self._history_cache
+        if cached_snapshot is snapshot:
+            span.attrs["cached"] = True
+            return history
+
         try:
-            # cl100k_base is used by GPT-3.5/4/Mistral
-            encoding = tiktoken.get_encoding("cl100k_base")
-            return len(encoding.encode(text))
-        except Exception:
-            return 0
-
-    def generate_commit_message(self, hint: str, model: str) -> str:
-        """Constructs prompt and calls OpenRouter API."""
-        
+            index = self._get_history_index()
+            fresh = index.refresh(self.git, snapshot.head_oid, wait=HISTORY_INDEX_WAIT_SEC)
+            commits = index.related(snapshot.files, HISTORY_N)
+        except (sqlite3.Error, OSError) as e:
+            span.attrs["error"] = str(e)
+            return snapshot.history
+
+        span.attrs.update(fresh=fresh, related=sum(1 for c in commits if c.score))
+        if not commits:
+            return snapshot.history
+        history = "\n".join(c.format() for c in commits)
+        # Only a complete index gives a stable answer for this snapshot
+        if fresh:
+            self._history_cache = (snapshot, history)
+        return history
+
+    def _get_history_index(self) -> HistoryIndex:
+        """The history index of the current repo (reopened when the repo changes)."""
+        path = HistoryIndex.for_git_dir(self.git.git_dir).path
+        if self._history_index is None or self._history_index.path != path:
+            if self._history_index is not None:
+                self._history_index.close()
+            self._history_index = HistoryIndex(path)
+        return self._history_index
+
+    def load_file_diff(self, path: str, max_bytes: int = None, cancel: CancelToken = None) -> Tuple[str, bool]:
+        """
+        Reads one staged file's diff for display. Returns (text, truncated).
+        Files fully contained in the last snapshot's diff are sliced from it; others
+        (excluded, or beyond the read limit) are read from git.
+        """
+        snapshot = self._last_snapshot
+        record = snapshot.diff.file(path) if snapshot is not None else None
+        if record is not None and snapshot.diff.is_complete(record):
+            end = record.end if max_bytes is None else min(record.end, record.start + max_bytes)
+            return snapshot.diff.text(record.start, end), end < record.end
+        result = self.git.read_staged_diff(paths=[path], max_bytes=max_bytes, cancel=cancel)
+        if not result.ok:
+            return "", False
+        return result.text, result.truncated
+
+    def _scan_diff_content(self, snapshot) -> Tuple[List[Finding], StagedDiff]:
+        """
+        Scans the snapshot's added lines for secrets (memoized per snapshot).
+        Returns the findings and the diff to prompt with, redacted unless the mode is "warn".
+        Without findings that is the snapshot's own StagedDiff, not a copy.
+        """
+        mode = self.config.get("secret_scan_mode")
+        cached_snapshot, findings, redacted = self._scan_cache
+        if cached_snapshot is not snapshot:
+            findings = self.secret_scanner.scan(snapshot.diff)
+            redacted = self.secret_scanner.redact(snapshot.diff) if findings else snapshot.diff
+            self._scan_cache = (snapshot, findings, redacted)
+        return findings, (snapshot.diff if mode == "warn" else redacted)
+
+    def warm_up(self, model: str = None) -> None:
+        """
+        Imports the API client and loads the tokenizer ahead of first use.
+        Meant for a background thread once the window is up, so neither delays startup.
+        """
+        import openai  # noqa: F401
+        self.tokens.count("", model or self.config.get("selected_model"))
+
+    def _count_tokens(self, text: str, model: str = None) -> int:
+        """Counts tokens with the encoder matching `model` (memoized)."""
+        return self.tokens.count(text, model)
+
+    def generate_commit_message(self, hint: str, model: str, on_token: Callable[[str], None] = None,
+                                cancel: CancelToken = None, force: bool = False, trace: Trace = None,
+                                expected_key: str = None) -> str:
+        """
+        Constructs prompt and streams the completion from OpenRouter.
+        Each content delta is passed to `on_token` as it arrives; cancelling `cancel`
+        closes the in-flight HTTP stream. A cached message for the same diff, files,
+        hint, model and prompt version is returned without a network call unless `force`.
+        With `expected_key`, an error is returned (before any API call) if the staged change
+        no longer has that generation key.
+        Stage timings, usage and cost are recorded in `trace` (created if not given) and logged.
+        """
+        trace = trace or Trace("generate")
+        trace.set(repo=self.git.repo_path, model=model, prompt_version=PROMPT_VERSION)
+        message = self._generate(hint, model, on_token, cancel or CancelToken(), force, trace, expected_key)
+        trace.set(outcome="error" if message.startswith(("Error", "API Error")) else "ok")
+        self._log_trace(trace)
+        return message
+
+    def _generate(self, hint: str, model: str, on_token: Optional[Callable[[str], None]],
+                  cancel: CancelToken, force: bool, trace: Trace, expected_key: str = None) -> str:
         # 1. Validation
         api_key = self.config.get("api_key")
         if not api_key:
             return "Error: API Key is missing. Please add it in the settings."
 
         # 2. Refresh data
-        data = self.load_repo_data()
+        data = self.load_repo_data(model, trace=trace)
         if "error" in data:
             return f"Error: {data['error']}"
         
         if not data["diff_text"]:
             return "Error: No staged changes to commit."
 
-        # 3. Construct Prompts (IMPROVED)
-        system_prompt = (
-            "You are a senior developer and git expert. You write commit messages that strictly adhere to the 'Conventional Commits' specification.\n\n"
-            "## RULES\n"
-            "1. **Header Format**: <type>(<scope>): <subject>\n"
-            "   - Types: feat, fix, docs, style, refactor, perf, test, build, ci, chore, revert.\n"
-            "   - Scope: Optional, based on file names/modules (e.g., 'auth', 'ui', 'api').\n"
-            "   - Subject: Imperative mood ('add' not 'added'), lowercase, max 50 chars, no period.\n"
-            "2. **Body**:\n"
-            "   - Required for non-trivial changes.\n"
-            "   - Wrap lines strictly at 72 characters.\n"
-            "   - Use bullet points (-) for listing specific changes.\n"
-            "   - Focus on the 'why' and 'what', not just code translation.\n"
-            "3. **Output**:\n"
-            "   - Return ONLY the raw message. No Markdown code blocks (```). No conversational filler.\n"
-        )
+        if data["secret_findings"] and self.config.get("secret_scan_mode") == "block":
+            listed = ", ".join(f"{f['rule']} in {f['file']}:{f['line']}" for f in data["secret_findings"][:3])
+            return f"Error: Possible secrets in staged changes ({listed}). Remove them or change secret_scan_mode."
 
-        user_content = (
-            f"## CONTEXT HINT (User Intent - Priority High)\n{hint if hint else 'None'}\n\n"
-            f"## RECENT HISTORY (For style consistency)\n{data['history']}\n\n"
-            f"## STAGED FILE LIST\n{str(data['files'])}\n\n"
-            f"## CODE DIFF\n{data['diff_text']}"
-        )
+        # 3. Serve from the generation cache when nothing relevant has changed
+        cache_key = self.generation_key(data, hint, model)
+        if expected_key is not None and cache_key != expected_key:
+            return "Error: The staged changes changed before generation started."
+        if not force:
+            with trace.span("cache.lookup") as span:
+                cached = self.generation_cache.get(cache_key)
+                span.attrs["hit"] = cached is not None
+            if cached is not None:
+                trace.set(cache_hit=True)
+                return cached
 
-        # 4. API Call
+        # 4. Construct Prompts
         try:
-            client = OpenAI(
-                base_url="https://openrouter.ai/api/v1",
-                api_key=api_key,
-            )
+            client = self._get_client(api_key)
+
+            if data["needs_map_reduce"] and self.config.get("map_reduce_enabled"):
+                # Oversized change: summarize shards in parallel, then reduce from the summaries
+                with trace.span("map_reduce", files=len(data["numstat"])):
+                    summaries = self._summarize_shards(client, data, model, cancel, trace)
+                if summaries is None:
+                    return "Error: Generation cancelled."
+                data = dict(data, diff_text="(Change too large for one prompt. Per-part summaries follow.)\n\n" + summaries)
+
+            with trace.span("prompt.build"):
+                messages = self._build_messages(data, hint, model)
 
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_content}
-                ],
+            # 5. API Call (streamed), hedged across the fallback chain when a model is slow
+            models = [model] + [m for m in (self.config.get("model_fallbacks") or []) if m != model]
+            dispatcher = HedgedDispatcher(self.latency_stats, self.config.get("latency_budgets"),
+                                          max_retries=int(self.config.get("api_max_retries")))
+            used_model, raw_msg, lanes = dispatcher.run(
+                models,
+                lambda m, deliver, token, started: self._stream_completion(client, m, messages, deliver, token,
+                                                                           trace, started),
+                on_token=on_token,
+                cancel=cancel,
             )
-            
-            raw_msg = response.choices[0].message.content.strip()
-            return self._clean_output(raw_msg)
+
+            if cancel.cancelled:
+                return "Error: Generation cancelled."
+            self._record_generation_figures(trace, used_model, lanes)
+
+            message = self._clean_output(raw_msg.strip())
+            if not message:
+                return "Error: The model returned an empty message."
+            self.generation_cache.put(cache_key, message)
+            return message
 
         except Exception as e:
+            if cancel.cancelled:
+                return "Error: Generation cancelled."
             return f"API Error: {str(e)}"
 
+    def _stream_completion(self, client: "OpenAI", model: str, messages: List[Dict[str, str]],
+                           on_token: Callable[[str], None], cancel: CancelToken, trace: Trace,
+                           on_started: Callable[[], None] = None) -> str:
+        """
+        One streamed request (a dispatcher attempt). Raises on API errors; the dispatcher
+        owns retries, so the client's own are disabled here. `on_started` is called once the
+        rate limiter lets the request through.
+        """
+        with contextlib.ExitStack() as stack:
+            # Queueing behind the rate limiter is timed separately from the request
+            with trace.span("api.queue", model=model):
+                stack.enter_context(self.rate_limiter or contextlib.nullcontext())
+            if on_started:
+                on_started()
+
+            with trace.span("api.stream", model=model) as span:
+                request_start = time.perf_counter()
+                parts = []
+                first_at = last_at = None
+                usage = None
+                try:
+                    stream = client.with_options(max_retries=0).chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        stream=True,
+                        stream_options={"include_usage": True},
+                    )
+                    # create() returns once the response headers arrive
+                    span.attrs["http_latency_ms"] = round((time.perf_counter() - request_start) * 1000, 2)
+                    # Closing the stream aborts the underlying HTTP response immediately
+                    cancel.on_cancel(stream.close)
+
+                    for chunk in stream:
+                        if cancel.cancelled:
+                            break
+                        if getattr(chunk, "usage", None):
+                            usage = chunk.usage
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            last_at = time.perf_counter()
+                            first_at = first_at or last_at
+                            parts.append(delta)
+                            on_token(delta)
+                except Exception as e:
+                    span.attrs["error"] = "cancelled" if cancel.cancelled else f"{type(e).__name__}: {e}"
+                    raise
+                finally:
+                    self._record_stream_stats(span, model, request_start, first_at, last_at, "".join(parts), usage)
+        return "".join(parts)
+
+    def _record_stream_stats(self, span, model: str, request_start: float, first_at: Optional[float],
+                             last_at: Optional[float], text: str, usage: Any) -> None:
+        """Time to first token, tokens/second and the API's usage and cost figures of one request."""
+        figures = _usage_figures(usage)
+        if first_at is not None:
+            figures["ttft_ms"] = round((first_at - request_start) * 1000, 2)
+            if last_at > first_at:
+                completion_tokens = figures.get("completion_tokens") or self.tokens.count(text, model)
+                figures["tokens_per_sec"] = round(completion_tokens / (last_at - first_at), 1)
+        span.attrs.update(figures)
+
+    def _record_generation_figures(self, trace: Trace, used_model: str, lanes: int) -> None:
+        """Lifts the winning request's figures onto the trace; cost covers every request made."""
+        winner = trace.find("api.stream", model=used_model, error=None)
+        figures = {key: winner.attrs[key] for key in STREAM_FIGURES if winner and key in winner.attrs}
+        cost = trace.sum_attr("api.stream", "cost") + trace.sum_attr("api.map_call", "cost")
+        if cost:
+            figures["cost"] = round(cost, 6)
+        trace.set(model_used=used_model, hedged_requests=lanes - 1, **figures)
+
+    def _log_trace(self, trace: Trace) -> None:
+        if self.config.get("trace_log_enabled"):
+            self.trace_log.write(trace)
+
+    def _get_client(self, api_key: str) -> "OpenAI":
+        base_url = self.config.get("api_base_url")
+        client = self.api_clients.get((base_url, api_key))
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(base_url=base_url, api_key=api_key, timeout=REQUEST_TIMEOUT_SEC)
+            client = self.api_clients.setdefault((base_url, api_key), client)
+        return client
+
+    def _complete(self, client: "OpenAI", messages: List[Dict[str, str]], model: str, cancel: CancelToken,
+                  trace: Trace = None) -> str:
+        """Non-streaming completion used for intermediate (map) calls."""
+        if cancel.cancelled:
+            return ""
+        with self.rate_limiter or contextlib.nullcontext():
+            with (trace.span("api.map_call") if trace else contextlib.nullcontext()) as span:
+                response = client.chat.completions.create(model=model, messages=messages)
+                if span is not None:
+                    span.attrs.update(_usage_figures(response.usage))
+        return response.choices[0].message.content or ""
+
+    def _summarize_shards(self, client: "OpenAI", data: Dict[str, Any], model: str, cancel: CancelToken,
+                          trace: Trace = None) -> Optional[str]:
+        """Map step: concurrent per-shard summaries (cached per shard). None if cancelled."""
+        summarizer = MapReduceSummarizer(
+            self.git,
+            DiffPacker(lambda texts: self.tokens.count_many(texts, model)),
+            self.generation_cache,
+            lambda messages, token: self._complete(client, messages, model, token, trace),
+            width=int(self.config.get("map_reduce_width")),
+            # Shards read diff content beyond the scanned snapshot, so redact unless only warning
+            redact=None if self.config.get("secret_scan_mode") == "warn" else self.secret_scanner.redact,
+        )
+        return summarizer.summarize(data["numstat"], model, data["diff_budget"], cancel)
+
+    def generation_key(self, data: Dict[str, Any], hint: str, model: str) -> str:
+        """Generation cache key of the staged change in `data` (equal keys get the same message)."""
+        return GenerationCache.make_key(data["diff_text"], data["files"], hint, model, PROMPT_VERSION)
+
+    def _build_messages(self, data: Dict[str, Any], hint: str, model: str = None) -> List[Dict[str, Any]]:
+        """Builds the chat messages sent to the model (also used for the token estimate)."""
+        return build_messages(data["history"], data["files"], data["diff_text"], hint, model)
+
     def _clean_output(self, text: str) -> str:
         """Removes quotes and markdown wrappers often added by LLMs."""
         # Remove surrounding quotes if present
@@ -155,6 +532,49 @@ class AppLogic:
         text = text.replace("```git commit", "").replace("```", "").strip()
         return text
 
+    def plan_branch_rewrite(self, base: str, branch: str = "HEAD", model: str = None, hint: str = "",
+                            match: str = None, on_progress: Callable[[int, int], None] = None,
+                            cancel: CancelToken = None) -> Dict[str, Any]:
+        """
+        Generates new messages for the commits in base..branch (see branch_rewrite.py).
+        Returns a reviewable plan for apply_branch_rewrite, or {"error": ...}.
+        """
+        if not self.git.set_repo_path(self.git.repo_path):
+            return {"error": "Invalid Repository"}
+        api_key = self.config.get("api_key")
+        if not api_key:
+            return {"error": "API Key is missing. Please add it in the settings."}
+        model = model or self.config.get("selected_model")
+        client = self._get_client(api_key)
+        rewriter = self._branch_rewriter(model, lambda messages, token: self._complete(client, messages, model, token))
+        return rewriter.plan(base, branch, model, budget_for_model(model), hint, match, clean=self._clean_output,
+                             on_progress=on_progress, cancel=cancel)
+
+    def apply_branch_rewrite(self, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """Applies a (possibly edited) plan in one history rewrite of its branch."""
+        if not self.git.set_repo_path(self.git.repo_path):
+            return {"ok": False, "error": "Invalid Repository"}
+        return self._branch_rewriter(plan.get("model")).apply(plan)
+
+    def _branch_rewriter(self, model: str, complete: Callable = None) -> BranchRewriter:
+        mode = self.config.get("secret_scan_mode")
+        return BranchRewriter(
+            self.git,
+            self._get_classifier(),
+            DiffPacker(lambda texts: self.tokens.count_many(texts, model)),
+            self.generation_cache,
+            complete,
+            width=int(self.config.get("rewrite_concurrency")),
+            redact=None if mode == "warn" else self.secret_scanner.redact,
+            scan=self.secret_scanner.scan if mode == "block" else None,
+        )
+
+    def close(self) -> None:
+        """Releases the history index connection (for long-lived callers that drop instances)."""
+        if self._history_index is not None:
+            self._history_index.close()
+            self._history_index = None
+
     def save_setting(self, key: str, value: str):
         """Pass-through to config manager."""
         self.config.save_config(key, value)
@@ -0,0 +1,420 @@
+# benchmark.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Benchmark harness for the hot paths: repository loading, token counting, prompt
+construction and end-to-end generation against a local OpenAI-compatible stub.
+
+Examples:
+    python benchmark.py                                  # small, medium and large presets
+    python benchmark.py --preset large --repeat 3 --output bench.json
+    python benchmark.py --files 500 --lines 40 --lockfiles 2 --history 300 --latency 0.2
+
+Synthetic repositories are created in a temporary directory (removed unless --keep).
+Results are printed as one JSON document so runs can be diffed and tracked offline.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List
+
+from app_logic import AppLogic
+from config_manager import ConfigManager
+from generation_cache import GenerationCache
+from history_index import HistoryIndex
+from prompt_builder import message_text
+from token_service import TokenCounter
+from tracing import Trace
+
+BENCHMARK_FORMAT_VERSION = 1
+
+# files: changed source files, lines: changed lines per file, lockfiles: changed lockfiles,
+# history: commits before the staged change
+PRESETS = {
+    "small": {"files": 10, "lines": 40, "lockfiles": 0, "history": 20},
+    "medium": {"files": 200, "lines": 80, "lockfiles": 2, "history": 200},
+    "large": {"files": 2000, "lines": 120, "lockfiles": 3, "history": 1000},
+}
+LOCKFILES = ["package-lock.json", "yarn.lock", "Cargo.lock", "go.sum", "poetry.lock"]
+LOCKFILE_LINES = 5000
+
+MOCK_MESSAGE = "feat(core): add synthetic benchmark change\n\n- Update generated modules"
+PROMPT_CACHE_ENTRIES = 64
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_STEP = 128
+
+
+# --- Mock OpenRouter server ---
+
+class MockOpenRouter:
+    """
+    Minimal OpenAI-compatible chat completions endpoint on 127.0.0.1.
+    `latency` is the delay before the first token; `chunk_interval` is the delay between streamed chunks.
+    Prompt caching is simulated like OpenAI's: the longest prefix shared with a recent prompt is
+    reported as `cached_tokens`, in 128-token steps from 1024 tokens.
+    """
+
+    def __init__(self, latency: float = 0.1, chunk_interval: float = 0.01, message: str = MOCK_MESSAGE):
+        self.latency = latency
+        self.chunk_interval = chunk_interval
+        self.message = message
+        self.requests = 0
+        self._recent_prompts: List[str] = []
+        self._prompts_lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MockOpenRouter", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def start(self) -> "MockOpenRouter":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def cached_tokens(self, prompt: str) -> int:
+        """Tokens of `prompt` a prefix cache would serve, given the recent prompts (then remembers it)."""
+        with self._prompts_lock:
+            shared = max((len(os.path.commonprefix([prompt, p])) for p in self._recent_prompts), default=0)
+            self._recent_prompts = (self._recent_prompts + [prompt])[-PROMPT_CACHE_ENTRIES:]
+        tokens = shared // 4
+        return 0 if tokens < PROMPT_CACHE_MIN_TOKENS else tokens - tokens % PROMPT_CACHE_STEP
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                mock.requests += 1
+                prompt = "".join(message_text(m) for m in body.get("messages", []))
+                usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(mock.message) // 4,
+                         "total_tokens": (len(prompt) + len(mock.message)) // 4,
+                         "prompt_tokens_details": {"cached_tokens": mock.cached_tokens(prompt)}}
+                time.sleep(mock.latency)
+                if body.get("stream"):
+                    self._stream(body.get("model", ""), usage)
+                else:
+                    self._complete(body.get("model", ""), usage)
+
+            def _complete(self, model, usage):
+                payload = json.dumps({
+                    "id": "bench", "object": "chat.completion", "created": 0, "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": mock.message},
+                                 "finish_reason": "stop"}],
+                    "usage": usage,
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, model, usage):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def send(data: str):
+                    event = f"data: {data}\n\n".encode()
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+                    self.wfile.flush()
+
+                def chunk(delta, finish=None, extra=None):
+                    obj = {"id": "bench", "object": "chat.completion.chunk", "created": 0, "model": model,
+                           "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+                    obj.update(extra or {})
+                    return json.dumps(obj)
+
+                try:
+                    words = mock.message.split(" ")
+                    for idx, word in enumerate(words):
+                        if idx:
+                            time.sleep(mock.chunk_interval)
+                        send(chunk({"content": word + (" " if idx < len(words) - 1 else "")}))
+                    send(chunk({}, "stop", {"usage": usage}))
+                    send("[DONE]")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Client cancelled
+
+        return Handler
+
+
+# --- Synthetic repositories ---
+
+def _git(repo: str, *args: str, input_data: bytes = None) -> None:
+    subprocess.run(["git", *args], cwd=repo, input=input_data, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+def _source_lines(rng: random.Random, count: int, seed_word: str) -> List[str]:
+    lines = []
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            lines.append(f"def {seed_word}_{i}(value):")
+        elif kind == 1:
+            lines.append(f"    total = value * {rng.randint(1, 999)} + {rng.randint(1, 999)}")
+        elif kind == 2:
+            lines.append(f"    # {seed_word} step {i}: adjust {rng.choice(['cache', 'index', 'buffer', 'queue'])}")
+        else:
+            lines.append("    return total")
+    return lines
+
+
+def _lockfile_lines(rng: random.Random, count: int) -> List[str]:
+    return [f'"pkg-{i}": "{rng.randint(0, 9)}.{rng.randint(0, 40)}.{rng.randint(0, 99)}"' for i in range(count)]
+
+
+def make_repo(path: str, files: int, lines: int, lockfiles: int, history: int, seed: int = 0) -> None:
+    """
+    Creates a repository with `history` commits (via git fast-import) and a staged change
+    touching `files` source files (`lines` changed lines each) plus `lockfiles` lockfiles.
+    """
+    rng = random.Random(seed)
+    os.makedirs(path)
+    _git(path, "init", "-q", "-b", "main")
+    _git(path, "config", "user.name", "Benchmark")
+    _git(path, "config", "user.email", "bench@example.com")
+    _git(path, "config", "commit.gpgsign", "false")
+
+    # 1. Base tree plus history in one fast-import stream
+    base = {f"src/pkg{i % 20}/module_{i}.py": "\n".join(_source_lines(rng, lines * 2, f"m{i}")) + "\n"
+            for i in range(files)}
+    for name in LOCKFILES[:lockfiles]:
+        base[name] = "\n".join(_lockfile_lines(rng, LOCKFILE_LINES)) + "\n"
+
+    stream: List[bytes] = []
+
+    def data(text: str) -> None:
+        raw = text.encode()
+        stream.append(b"data %d\n%s\n" % (len(raw), raw))
+
+    for n in range(max(1, history)):
+        stream.append(b"commit refs/heads/main\n")
+        stream.append(b"committer Benchmark <bench@example.com> %d +0000\n" % (1700000000 + n * 3600))
+        pkg = rng.randrange(20)
+        data(f"{rng.choice(['feat', 'fix', 'refactor', 'docs'])}(pkg{pkg}): synthetic change {n}")
+        if n == 0:
+            for name, content in base.items():
+                stream.append(f"M 100644 inline {name}\n".encode())
+                data(content)
+        # Each commit touches one package, so related-history lookups have something to find
+        stream.append(f"M 100644 inline src/pkg{pkg}/NOTES.md\n".encode())
+        data(f"Change {n}\n")
+        stream.append(b"M 100644 inline CHANGELOG.md\n")
+        data(f"Release {n}\n")
+    _git(path, "fast-import", "--quiet", input_data=b"".join(stream))
+    _git(path, "checkout", "-q", "-f", "main")
+
+    # 2. The staged change: rewrite half of each file's lines, bump lockfile versions
+    for name in list(base)[:files]:
+        current = base[name].splitlines()
+        for i in range(0, min(len(current), lines * 2), 2):
+            current[i] = current[i].replace("value", "item") + "  # changed"
+        with open(os.path.join(path, name), "w", encoding="utf-8") as f:
+            f.write("\n".join(current) + "\n")
+    for name in LOCKFILES[:lockfiles]:
+        with open(os.path.join(path, name), "w", encoding="utf-8") as f:
+            f.write("\n".join(_lockfile_lines(rng, LOCKFILE_LINES)) + "\n")
+    _git(path, "add", "-A")
+
+
+# --- Measurement ---
+
+def measure(fn: Callable[[], Any], repeat: int, setup: Callable[[], None] = None) -> Dict[str, float]:
+    """Runs `fn` `repeat` times (calling `setup` untimed before each) and summarizes in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "n": len(samples),
+        "min_ms": round(min(samples), 2),
+        "median_ms": round(statistics.median(samples), 2),
+        "mean_ms": round(statistics.mean(samples), 2),
+        "max_ms": round(max(samples), 2),
+    }
+
+
+def bench_scenario(name: str, params: Dict[str, int], workdir: str, server: MockOpenRouter,
+                   model: str, repeat: int) -> Dict[str, Any]:
+    repo = os.path.join(workdir, name)
+    start = time.perf_counter()
+    make_repo(repo, **params)
+    setup_sec = time.perf_counter() - start
+
+    # Isolated config and cache: nothing from the user's real settings leaks in
+    config = ConfigManager(os.path.join(workdir, f"{name}-config.json"))
+    for key, value in (("api_key", "bench"), ("api_base_url", server.base_url),
+                       ("selected_model", model), ("last_repo_path", repo)):
+        config.set_override(key, value)
+    cache = GenerationCache(os.path.join(workdir, f"{name}-cache.json"))
+    logic = AppLogic(repo_path=repo, config=config, tokens=TokenCounter(), generation_cache=cache)
+
+    timings: Dict[str, Dict[str, float]] = {}
+
+    # 1. Repository loading: cold (snapshot rebuilt from git) and warm (index unchanged)
+    timings["load_repo_data_cold"] = measure(lambda: logic.load_repo_data(model), repeat,
+                                             setup=logic.git.invalidate_snapshot)
+    timings["load_repo_data_warm"] = measure(lambda: logic.load_repo_data(model), repeat)
+    data = logic.load_repo_data(model)
+    raw_diff = logic.git.get_staged_diff()
+
+    # 2. History index: a full build from scratch, then a related-commit lookup for the staged paths
+    index = HistoryIndex(os.path.join(workdir, f"{name}-history.sqlite"))
+    head_oid = subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo, capture_output=True, text=True).stdout.strip()
+    timings["history_index_build"] = measure(lambda: index.update(logic.git, head_oid), 1)
+    timings["history_lookup"] = measure(lambda: index.related(data["files"], 10), repeat)
+    index.close()
+
+    # 3. Token counting on the full staged diff: cold (memo cleared) and memoized
+    timings["count_tokens_cold"] = measure(lambda: logic._count_tokens(raw_diff, model), repeat,
+                                           setup=logic.tokens.clear)
+    timings["count_tokens_warm"] = measure(lambda: logic._count_tokens(raw_diff, model), repeat)
+
+    # 4. Prompt construction
+    timings["build_messages"] = measure(lambda: logic._build_messages(data, "benchmark hint"), repeat)
+
+    # 5. End to end against the stub, with the generation cache cleared each time
+    first_token: List[float] = []
+
+    def generate():
+        started = time.perf_counter()
+        seen = []
+
+        def on_token(text):
+            if not seen:
+                seen.append(True)
+                first_token.append((time.perf_counter() - started) * 1000)
+
+        message = logic.generate_commit_message("", model, on_token=on_token, force=True)
+        if message.startswith("Error") or message.startswith("API Error"):
+            raise RuntimeError(message)
+
+    requests_before = server.requests
+    timings["generate_e2e"] = measure(generate, repeat, setup=cache.clear)
+    timings["generate_first_token"] = {
+        "n": len(first_token),
+        "min_ms": round(min(first_token), 2),
+        "median_ms": round(statistics.median(first_token), 2),
+        "mean_ms": round(statistics.mean(first_token), 2),
+        "max_ms": round(max(first_token), 2),
+    }
+    requests_per_generation = (server.requests - requests_before) / max(1, repeat)
+    timings["generate_cache_hit"] = measure(lambda: logic.generate_commit_message("", model), repeat)
+
+    # 6. Regenerating with new hints: share of the final prompt the provider serves from its prompt cache
+    cache_ratios = []
+    for idx in range(repeat):
+        trace = Trace("generate")
+        logic.generate_commit_message(f"benchmark hint {idx}", model, force=True, trace=trace)
+        if trace.attrs.get("prompt_tokens"):
+            cache_ratios.append(trace.attrs.get("cached_tokens", 0) / trace.attrs["prompt_tokens"])
+
+    return {
+        "name": name,
+        "params": params,
+        "setup_sec": round(setup_sec, 3),
+        "repo": {
+            "staged_files": len(data["files"]),
+            "diff_bytes": len(raw_diff.encode("utf-8")),
+            "prompt_tokens": data["token_count"],
+            "summarized_files": len(data["summarized_files"]),
+            "needs_map_reduce": data["needs_map_reduce"],
+            "api_requests_per_generation": requests_per_generation,
+            "prompt_cache_ratio": round(statistics.median(cache_ratios), 3) if cache_ratios else None,
+        },
+        "timings": timings,
+    }
+
+
+def git_version() -> str:
+    try:
+        return subprocess.run(["git", "--version"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark GitAI Commit's hot paths.")
+    parser.add_argument("--preset", nargs="*", choices=sorted(PRESETS), help="Presets to run (default: all).")
+    parser.add_argument("--files", type=int, help="Custom scenario: changed source files.")
+    parser.add_argument("--lines", type=int, default=80, help="Custom scenario: changed lines per file.")
+    parser.add_argument("--lockfiles", type=int, default=0, help=f"Custom scenario: changed lockfiles (max {len(LOCKFILES)}).")
+    parser.add_argument("--history", type=int, default=100, help="Custom scenario: commits of history.")
+    parser.add_argument("--repeat", type=int, default=5, help="Samples per measurement.")
+    parser.add_argument("--latency", type=float, default=0.1, help="Stub delay before the first token (s).")
+    parser.add_argument("--chunk-interval", type=float, default=0.01, help="Stub delay between streamed chunks (s).")
+    parser.add_argument("--model", default="openai/gpt-4o-mini", help="Model id (drives budget and tokenizer).")
+    parser.add_argument("--output", help="Also write the JSON results to this file.")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated repositories.")
+    args = parser.parse_args(argv)
+
+    scenarios: Dict[str, Dict[str, int]] = {}
+    if args.files:
+        scenarios["custom"] = {"files": args.files, "lines": args.lines,
+                               "lockfiles": min(args.lockfiles, len(LOCKFILES)), "history": args.history}
+    for name in args.preset or ([] if args.files else sorted(PRESETS, key=lambda n: PRESETS[n]["files"])):
+        scenarios[name] = PRESETS[name]
+
+    workdir = tempfile.mkdtemp(prefix="git-ai-commit-bench-")
+    server = MockOpenRouter(args.latency, args.chunk_interval).start()
+    results = []
+    try:
+        for name, params in scenarios.items():
+            print(f"Running {name} {params}...", file=sys.stderr)
+            results.append(bench_scenario(name, params, workdir, server, args.model, max(1, args.repeat)))
+    finally:
+        server.stop()
+        if args.keep:
+            print(f"Repositories kept in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "version": BENCHMARK_FORMAT_VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "git": git_version(),
+        "model": args.model,
+        "stub": {"latency_sec": args.latency, "chunk_interval_sec": args.chunk_interval},
+        "scenarios": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
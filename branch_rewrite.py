@@ -0,0 +1,299 @@
+# branch_rewrite.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Rewrites the commit messages of a branch (e.g. a feature branch full of "wip" commits).
+  1. Plan: every commit in base..branch is read with one `git log`, classified in one
+     pass, and its diff is packed like a staged change. Messages are generated
+     concurrently with bounded parallelism. The plan is plain JSON for review and editing.
+  2. Apply: the commits are rebuilt in memory with the new messages (trees, authors and
+     dates unchanged), written with one `git hash-object` call, and the branch is moved
+     with one compare-and-swap `git update-ref`.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cancellation import CancelToken
+from diff_packer import DiffPacker, DIFF_READ_FACTOR
+from file_classifier import FileClassifier
+from generation_cache import GenerationCache
+from git_utils import GitManager
+from prompt_builder import PROMPT_VERSION, build_messages
+from token_service import BYTES_PER_TOKEN
+
+PLAN_FORMAT_VERSION = 1
+REFLOG_MESSAGE = "git-ai-commit: rewrite commit messages"
+
+# Headers that no longer hold once a commit is rebuilt
+DROPPED_HEADERS = (b"gpgsig", b"gpgsig-sha256")
+
+
+class RangeCommit:
+    """One commit of the range with the files it changed against its first parent."""
+
+    def __init__(self, oid: str, parents: List[str]):
+        self.oid = oid
+        self.parents = parents
+        self.numstat: List[Tuple[str, str, str]] = []
+        self.blob_oids: Dict[str, str] = {}
+
+    @property
+    def files(self) -> List[str]:
+        return [path for _, _, path in self.numstat]
+
+
+def parse_range_log(output: str) -> List[RangeCommit]:
+    """
+    Parses GitManager.read_range_log output. Each commit record is "<oid> <parents>\0"
+    followed by -z raw entries (":<meta>\0<path>\0") and numstat entries ("<a>\t<d>\t<path>\0");
+    paths are taken verbatim, never quoted.
+    """
+    commits = []
+    for record in output.split("\x1e"):
+        fields = record.split("\0")
+        header = fields[0].strip()
+        if not header:
+            continue
+        oid, *parents = header.split()
+        commit = RangeCommit(oid, parents)
+        i = 1
+        while i < len(fields):
+            field = fields[i].lstrip("\n")
+            i += 1
+            if field.startswith(":"):
+                parts = field.split()
+                path = fields[i] if i < len(fields) else ""
+                i += 1
+                if path and len(parts) == 5:
+                    commit.blob_oids[path] = parts[3]
+            elif field:
+                parts = field.split("\t", 2)
+                if len(parts) == 3:
+                    commit.numstat.append((parts[0], parts[1], parts[2]))
+        commits.append(commit)
+    return commits
+
+
+def split_commit(raw: bytes) -> Tuple[List[bytes], bytes]:
+    """Splits a raw commit object into header lines and the message."""
+    header, _, message = raw.partition(b"\n\n")
+    return header.split(b"\n"), message
+
+
+def commit_message(raw: bytes) -> str:
+    return split_commit(raw)[1].decode('utf-8', errors='replace')
+
+
+def rebuild_commit(raw: bytes, parents: List[str], message: Optional[str]) -> bytes:
+    """
+    The commit with new parent ids and (if given) a new message. Signatures are dropped
+    since they no longer match; a custom encoding header is dropped with a new (UTF-8) message.
+    """
+    lines, old_message = split_commit(raw)
+    out: List[bytes] = []
+    skipping = False
+    for line in lines:
+        if line.startswith(b" ") and skipping:
+            continue  # Continuation of a dropped multi-line header
+        skipping = False
+        name = line.split(b" ", 1)[0]
+        if name in DROPPED_HEADERS or (name == b"encoding" and message is not None):
+            skipping = True
+            continue
+        if name == b"parent":
+            continue
+        out.append(line)
+        if name == b"tree":
+            out.extend(b"parent " + p.encode() for p in parents)
+    body = old_message if message is None else message.strip().encode('utf-8') + b"\n"
+    return b"\n".join(out) + b"\n\n" + body
+
+
+def object_id(kind: str, payload: bytes, algorithm: str = "sha1") -> str:
+    """The id git assigns to an object, computed locally so children can reference it before it is written."""
+    return hashlib.new(algorithm, f"{kind} {len(payload)}\0".encode() + payload).hexdigest()
+
+
+class BranchRewriter:
+    """
+    Plans and applies a message rewrite for base..branch. `complete(messages, cancel)` sends
+    one prompt and returns the raw completion (wrapped by the caller with rate limiting).
+    """
+
+    def __init__(self, git: GitManager, classifier: FileClassifier, packer: DiffPacker, cache: GenerationCache,
+                 complete: Callable[[List[Dict[str, Any]], CancelToken], str], width: int = 4,
+                 redact: Callable[[str], str] = None, scan: Callable[[str], list] = None):
+        self.git = git
+        self.classifier = classifier
+        self.packer = packer
+        self.cache = cache
+        self.complete = complete
+        self.width = max(1, width)
+        self.redact = redact    # Applied to each commit's diff before it is packed
+        self.scan = scan        # When given, commits whose diff has findings keep their message
+
+    def plan(self, base: str, branch: str, model: str, budget: int, hint: str = "", match: str = None,
+             clean: Callable[[str], str] = None, on_progress: Callable[[int, int], None] = None,
+             cancel: CancelToken = None) -> Dict[str, Any]:
+        """
+        Generates new messages for the non-merge commits of base..branch (only those whose
+        original subject matches the `match` regex, if given). Returns the plan, or {"error": ...}.
+        """
+        cancel = cancel or CancelToken()
+        start = time.perf_counter()
+        ref, tip = self.git.resolve_branch(branch)
+        if not ref.startswith("refs/heads/") or not tip:
+            return {"error": f"'{branch}' is not a local branch."}
+        base_oid = self.git.resolve_branch(base)[1]
+        if not base_oid:
+            return {"error": f"Unknown base '{base}'."}
+
+        # 1. Every commit's changed files in one log call, and their raw objects in one cat-file call
+        log = self.git.read_range_log(base_oid, tip, cancel=cancel)
+        if not log.ok:
+            return {"error": log.stderr.decode('utf-8', errors='replace').strip() or "git log failed."}
+        commits = parse_range_log(log.text)
+        if not commits:
+            return {"error": f"No commits in {base}..{branch}."}
+        raws = self.git.read_objects([c.oid for c in commits], cancel=cancel)
+        originals = {c.oid: commit_message(raws.get(c.oid, b"")).strip() for c in commits}
+
+        pattern = re.compile(match) if match else None
+        selected = [c for c in commits if len(c.parents) <= 1
+                    and (pattern is None or pattern.search(originals[c.oid].split("\n", 1)[0]))]
+
+        # 2. One classification pass over all selected commits
+        exclusions = self.classifier.classify_many(self.git, [(c.numstat, c.blob_oids) for c in selected],
+                                                   cancel=cancel)
+        history = self.git.get_recent_history(10, cancel=cancel, rev=base_oid)
+        specs = self.classifier.exclude_pathspecs()
+
+        done = [0]
+        progress_lock = threading.Lock()
+
+        def run(commit: RangeCommit, excluded: Dict[str, str]) -> Dict[str, Any]:
+            entry = {"oid": commit.oid, "original": originals[commit.oid]}
+            try:
+                entry.update(self._generate(commit, excluded, entry["original"], history, specs, model, budget,
+                                            hint, clean, cancel))
+            except Exception as e:
+                entry.update(status="error", message=entry["original"], error=f"{type(e).__name__}: {e}")
+            with progress_lock:
+                done[0] += 1
+                if on_progress:
+                    on_progress(done[0], len(selected))
+            return entry
+
+        # 3. Concurrent generation, bounded by `width` (and by the caller's rate limiter)
+        with ThreadPoolExecutor(max_workers=self.width) as pool:
+            generated = {e["oid"]: e for e in pool.map(run, selected, exclusions)}
+        if cancel.cancelled:
+            return {"error": "Cancelled"}
+
+        entries = []
+        for c in commits:
+            entry = generated.get(c.oid)
+            if entry is None:
+                entry = {"oid": c.oid, "original": originals[c.oid], "message": originals[c.oid],
+                         "status": "merge" if len(c.parents) > 1 else "skipped"}
+            entries.append(entry)
+
+        return {
+            "version": PLAN_FORMAT_VERSION,
+            "repo": self.git.repo_path,
+            "ref": ref,
+            "base": base_oid,
+            "old_tip": tip,
+            "model": model,
+            "commits": entries,
+            "elapsed_sec": round(time.perf_counter() - start, 3),
+        }
+
+    def _generate(self, commit: RangeCommit, excluded: Dict[str, str], original: str, history: str,
+                  specs: List[str], model: str, budget: int, hint: str, clean: Callable[[str], str],
+                  cancel: CancelToken) -> Dict[str, Any]:
+        """Reads, filters and packs one commit's diff like a staged change, then generates its message."""
+        literal = sorted(p for p, reason in excluded.items() if reason in ("binary", "too large"))
+        diff = self.git.read_commit_diff(commit.oid, literal, specs,
+                                         max_bytes=budget * BYTES_PER_TOKEN * DIFF_READ_FACTOR, cancel=cancel)
+        diff_text = diff.text if diff.ok else ""
+        if self.scan and self.scan(diff_text):
+            return {"status": "error", "message": original, "error": "Possible secrets in this commit's diff."}
+        if self.redact:
+            diff_text = self.redact(diff_text)
+        numstat = [entry for entry in commit.numstat if entry[2] not in excluded]
+        packed = self.packer.pack(diff_text, budget, numstat, complete=not diff.truncated)
+
+        # The original message goes last, with the hint: the rules, style examples and diff stay cacheable
+        request = f"Rewrite this commit's message. Original message:\n{original}"
+        if hint:
+            request += f"\n\n{hint}"
+        key = GenerationCache.make_key(packed.text, commit.files, request, model, f"rewrite-{PROMPT_VERSION}")
+        cached = self.cache.get(key)
+        if cached is not None:
+            return {"status": "cached", "message": cached}
+
+        raw = self.complete(build_messages(history, commit.files, packed.text, request, model), cancel)
+        message = clean(raw) if clean else raw.strip()
+        if not message:
+            return {"status": "error", "message": original, "error": "Empty response."}
+        self.cache.put(key, message)
+        return {"status": "generated", "message": message}
+
+    def apply(self, plan: Dict[str, Any], cancel: CancelToken = None) -> Dict[str, Any]:
+        """Rewrites the branch with the plan's messages in one ref update. Returns the outcome."""
+        ref, old_tip = plan.get("ref"), plan.get("old_tip")
+        current_ref, current_tip = self.git.resolve_branch(ref or "")
+        if current_ref != ref or current_tip != old_tip:
+            return {"ok": False, "error": f"{ref} has moved since the plan was made; plan again."}
+
+        # 1. The plan must list exactly the commits of base..branch, in order (an edited plan may not)
+        order = [entry["oid"] for entry in plan["commits"]]
+        if self.git.range_oids(plan.get("base") or "", old_tip, cancel=cancel) != order:
+            return {"ok": False, "error": "The plan's commits do not match the branch (dropped, added or "
+                                          "reordered); plan again."}
+
+        # 2. Raw objects of every planned commit (one cat-file call)
+        raws = self.git.read_objects(order, cancel=cancel)
+        if len(raws) != len(order):
+            return {"ok": False, "error": "Some planned commits could not be read."}
+
+        # 3. Rebuild parents-first; untouched commits with untouched parents keep their ids
+        algorithm = self.git.object_format()
+        mapping: Dict[str, str] = {}
+        payloads: List[bytes] = []
+        expected: List[str] = []
+        changed = 0
+        for entry in plan["commits"]:
+            oid = entry["oid"]
+            raw = raws[oid]
+            parents = [line[len(b"parent "):].decode() for line in split_commit(raw)[0] if line.startswith(b"parent ")]
+            new_parents = [mapping.get(p, p) for p in parents]
+            message = entry.get("message") or entry["original"]
+            new_message = message if message.strip() != commit_message(raw).strip() else None
+            if new_message is None and new_parents == parents:
+                mapping[oid] = oid
+                continue
+            payload = rebuild_commit(raw, new_parents, new_message)
+            mapping[oid] = object_id("commit", payload, algorithm)
+            payloads.append(payload)
+            expected.append(mapping[oid])
+            changed += new_message is not None
+
+        new_tip = mapping[order[-1]]
+        if new_tip == old_tip:
+            return {"ok": True, "ref": ref, "old_tip": old_tip, "new_tip": new_tip, "rewritten": 0}
+
+        # 4. Write all new commits at once, check git agrees on their ids, then move the branch
+        written = self.git.write_objects("commit", payloads, cancel=cancel)
+        if written != expected:
+            return {"ok": False, "error": "Writing the rewritten commits failed; the branch was not changed."}
+        if not self.git.update_ref(ref, new_tip, old_tip, REFLOG_MESSAGE):
+            return {"ok": False, "error": f"Could not update {ref}; it may have moved. Nothing was changed."}
+        return {"ok": True, "ref": ref, "old_tip": old_tip, "new_tip": new_tip, "rewritten": changed,
+                "commits": len(payloads)}
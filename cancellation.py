@@ -0,0 +1,53 @@
+# cancellation.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Cooperative cancellation shared between the UI and background workers.
+"""
+
+import threading
+from typing import Callable, List
+
+
+class CancelToken:
+    """
+    A cancellation flag that can also abort blocking work (HTTP streams,
+    subprocesses) by running registered closers when cancelled.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._closers: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        """Marks the token cancelled and runs every registered closer once."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            closers, self._closers = self._closers, []
+        for closer in closers:
+            try:
+                closer()
+            except Exception:
+                pass
+
+    def on_cancel(self, closer: Callable[[], None]) -> None:
+        """Registers a closer; runs it immediately if already cancelled."""
+        with self._lock:
+            if not self._event.is_set():
+                self._closers.append(closer)
+                return
+        try:
+            closer()
+        except Exception:
+            pass
+
+    def wait(self, timeout: float = None) -> bool:
+        """Blocks until cancelled or the timeout elapses; returns True if cancelled."""
+        return self._event.wait(timeout)
@@ -0,0 +1,389 @@
+# cli.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Headless command-line entry point for scripts and CI runners.
+
+Examples:
+    python cli.py status --repo path/to/repo
+    python cli.py generate --repo . --hint "Fixes login bug" --commit
+    python cli.py commit --repo . -m "fix(auth): handle expired tokens"
+    python cli.py batch services/* --concurrency 8 --rate 30 --commit
+    python cli.py rewrite main --branch feature --match "^wip" --plan plan.json
+    python cli.py rewrite --apply plan.json
+    python cli.py install-hook --repo .
+    python cli.py daemon --status
+
+Every command prints JSON (one object per repo for `batch`, as JSON Lines).
+The API key is read from OPENROUTER_API_KEY, falling back to the saved config
+(OPENROUTER_BASE_URL likewise overrides the API endpoint).
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List
+
+from app_logic import AppLogic
+from config_manager import ConfigManager
+from daemon import GenerationDaemon, IDLE_TIMEOUT_SEC
+from dispatcher import LatencyStats
+from generation_cache import GenerationCache
+from git_utils import GitManager
+from hook_client import HOOK_MARKER, request, socket_path
+from rate_limit import RateLimiter
+from token_service import TokenCounter, build_encoder_cache, bundled_cache_path
+from tracing import Trace
+
+
+def is_error(message: str) -> bool:
+    """AppLogic reports failures as strings with these prefixes."""
+    return message.startswith("Error") or message.startswith("API Error")
+
+
+def make_logic(repo: str, config: ConfigManager, tokens: TokenCounter = None,
+               cache: GenerationCache = None) -> AppLogic:
+    return AppLogic(repo_path=os.path.abspath(repo), config=config, tokens=tokens, generation_cache=cache)
+
+
+def load_config() -> ConfigManager:
+    """Loads the shared config, letting the environment override the API key and URL (never persisted)."""
+    config = ConfigManager()
+    env_key = os.environ.get("OPENROUTER_API_KEY")
+    if env_key:
+        config.set_override("api_key", env_key)
+    env_url = os.environ.get("OPENROUTER_BASE_URL")
+    if env_url:
+        config.set_override("api_base_url", env_url)
+    return config
+
+
+def status_result(logic: AppLogic, model: str, include_diff: bool = False) -> Dict[str, Any]:
+    data = logic.load_repo_data(model)
+    if "error" in data:
+        return {"repo": logic.git.repo_path, "ok": False, "error": data["error"]}
+    result = {
+        "repo": logic.git.repo_path,
+        "ok": True,
+        "files": data["files"],
+        "token_count": data["token_count"],
+        "diff_budget": data["diff_budget"],
+        "warnings": data["warnings"],
+        "secret_findings": data["secret_findings"],
+        "lockfiles_excluded": data["lockfiles_excluded"],
+        "excluded_files": data["excluded_files"],
+        "summarized_files": data["summarized_files"],
+        "trace": data["trace"].to_dict(),
+    }
+    if include_diff:
+        result["diff_text"] = data["diff_text"]
+    return result
+
+
+def generate_result(logic: AppLogic, model: str, hint: str, force: bool = False, commit: bool = False,
+                    allow_sensitive: bool = False) -> Dict[str, Any]:
+    """Generates (and optionally commits) for one repo, returning a JSON-ready dict."""
+    start = time.perf_counter()
+    result: Dict[str, Any] = {"repo": logic.git.repo_path, "model": model}
+
+    status = status_result(logic, model)
+    if not status["ok"]:
+        result.update(ok=False, error=status["error"])
+        return result
+    result.update(files=status["files"], token_count=status["token_count"], warnings=status["warnings"],
+                  secret_findings=status["secret_findings"])
+    if not status["files"]:
+        result.update(ok=False, error="No staged changes to commit.")
+        return result
+
+    trace = Trace("generate")
+    message = logic.generate_commit_message(hint, model, force=force, trace=trace)
+    result["trace"] = trace.to_dict()
+    if is_error(message):
+        result.update(ok=False, error=message)
+    else:
+        result.update(ok=True, message=message, committed=False)
+        if commit:
+            if (status["warnings"] or status["secret_findings"]) and not allow_sensitive:
+                result.update(ok=False, error="Refusing to commit sensitive files or secrets: "
+                                              f"{status['warnings'] + status['secret_findings']}")
+            else:
+                output = logic.finalize_commit(message)
+                result.update(committed=bool(output), commit_output=output)
+                if not output:
+                    result.update(ok=False, error="git commit failed.")
+
+    result["elapsed_sec"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def emit(obj: Dict[str, Any]) -> None:
+    sys.stdout.write(json.dumps(obj, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def cmd_status(args) -> int:
+    config = load_config()
+    result = status_result(make_logic(args.repo, config), args.model or config.get("selected_model"), args.include_diff)
+    emit(result)
+    return 0 if result["ok"] else 1
+
+
+def cmd_generate(args) -> int:
+    config = load_config()
+    logic = make_logic(args.repo, config)
+    result = generate_result(logic, args.model or config.get("selected_model"), args.hint, args.force,
+                             args.commit, args.allow_sensitive)
+    emit(result)
+    return 0 if result["ok"] else 1
+
+
+def cmd_commit(args) -> int:
+    config = load_config()
+    logic = make_logic(args.repo, config)
+    if args.file:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            message = f.read()
+    else:
+        message = args.message or ""
+    output = logic.finalize_commit(message)
+    ok = bool(output) and not is_error(output)
+    emit({"repo": logic.git.repo_path, "ok": ok, "commit_output": output})
+    return 0 if ok else 1
+
+
+def cmd_batch(args) -> int:
+    """
+    Processes many repositories concurrently. Git work runs in parallel across up to
+    --concurrency repos, while API calls share one global RateLimiter.
+    """
+    config = load_config()
+    model = args.model or config.get("selected_model")
+    repos: List[str] = list(args.repos)
+    if args.repos_file:
+        with open(args.repos_file, 'r', encoding='utf-8') as f:
+            repos.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+
+    # One tokenizer, cache and limiter shared by every repo
+    tokens = TokenCounter()
+    cache = GenerationCache(os.path.join(os.path.dirname(config.config_path), ".git-ai-commit-cache.json"))
+    limiter = RateLimiter(max_concurrent=args.api_concurrency or args.concurrency, per_minute=args.rate)
+    latency_stats = LatencyStats()
+
+    def process(repo: str) -> Dict[str, Any]:
+        try:
+            logic = make_logic(repo, config, tokens, cache)
+            logic.rate_limiter = limiter
+            logic.latency_stats = latency_stats
+            if args.status_only:
+                return status_result(logic, model)
+            return generate_result(logic, model, args.hint, args.force, args.commit, args.allow_sensitive)
+        except Exception as e:
+            return {"repo": os.path.abspath(repo), "ok": False, "error": f"{type(e).__name__}: {e}"}
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        futures = [pool.submit(process, repo) for repo in repos]
+        for future in as_completed(futures):
+            result = future.result()
+            failures += 0 if result["ok"] else 1
+            emit(result)
+    return 0 if failures == 0 else 1
+
+
+def cmd_rewrite(args) -> int:
+    """
+    Regenerates the commit messages of base..branch. Writes the plan (for review and
+    editing) with --plan, applies a reviewed plan with --apply, or does both with --yes.
+    """
+    config = load_config()
+    logic = make_logic(args.repo, config)
+    if args.apply:
+        with open(args.apply, 'r', encoding='utf-8') as f:
+            plan = json.load(f)
+        result = logic.apply_branch_rewrite(plan)
+        emit({"repo": logic.git.repo_path, **result})
+        return 0 if result["ok"] else 1
+
+    if not args.base:
+        emit({"repo": logic.git.repo_path, "ok": False, "error": "A base (or --apply FILE) is required."})
+        return 1
+    if args.concurrency:
+        config.set_override("rewrite_concurrency", args.concurrency)
+    if args.rate:
+        logic.rate_limiter = RateLimiter(max_concurrent=int(config.get("rewrite_concurrency")), per_minute=args.rate)
+
+    def progress(done: int, total: int) -> None:
+        print(f"{done}/{total} commits", file=sys.stderr, flush=True)
+
+    plan = logic.plan_branch_rewrite(args.base, args.branch, args.model, args.hint, args.match, on_progress=progress)
+    if "error" in plan:
+        emit({"repo": logic.git.repo_path, "ok": False, "error": plan["error"]})
+        return 1
+    if args.plan:
+        with open(args.plan, 'w', encoding='utf-8') as f:
+            json.dump(plan, f, indent=2)
+    if not args.yes:
+        emit({"ok": True, **plan} if not args.plan else
+             {"repo": logic.git.repo_path, "ok": True, "plan": args.plan, "commits": len(plan["commits"])})
+        return 0
+    result = logic.apply_branch_rewrite(plan)
+    emit({"repo": logic.git.repo_path, **result})
+    return 0 if result["ok"] else 1
+
+
+def cmd_install_hook(args) -> int:
+    """Installs (or with --uninstall removes) the prepare-commit-msg hook that asks the daemon."""
+    git = GitManager(os.path.abspath(args.repo))
+    hooks_dir = git._run_text(["rev-parse", "--git-path", "hooks"])
+    if not hooks_dir:
+        emit({"repo": git.repo_path, "ok": False, "error": "Invalid Repository"})
+        return 1
+    path = os.path.join(git.repo_path, hooks_dir, "prepare-commit-msg")
+    existing = ""
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            existing = f.read()
+    if existing and HOOK_MARKER not in existing and not args.force:
+        emit({"repo": git.repo_path, "ok": False, "hook": path,
+              "error": "Another prepare-commit-msg hook is installed; use --force to replace it."})
+        return 1
+
+    if args.uninstall:
+        if existing:
+            os.remove(path)
+        emit({"repo": git.repo_path, "ok": True, "hook": path, "removed": bool(existing)})
+        return 0
+    client = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hook_client.py")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'#!/bin/sh\n# {HOOK_MARKER}\nexec "{sys.executable}" "{client}" "$@"\n')
+    os.chmod(path, 0o755)
+    emit({"repo": git.repo_path, "ok": True, "hook": path})
+    return 0
+
+
+def cmd_daemon(args) -> int:
+    """Runs the warm generation daemon in the foreground, or queries/stops a running one."""
+    path = args.socket or socket_path()
+    if not hasattr(socket, "AF_UNIX"):
+        emit({"socket": path, "ok": False, "error": "The daemon needs Unix domain sockets."})
+        return 1
+    if args.status or args.stop:
+        try:
+            response = request({"op": "shutdown" if args.stop else "ping"}, 5.0, path)
+        except (OSError, ValueError) as e:
+            emit({"socket": path, "ok": False, "error": f"Daemon not reachable: {e}"})
+            return 1
+        emit({"socket": path, **response})
+        return 0 if response.get("ok") else 1
+    try:
+        GenerationDaemon(path, load_config(), idle_timeout=args.idle).serve()
+    except RuntimeError as e:
+        emit({"socket": path, "ok": False, "error": str(e)})
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def cmd_tokenizer_cache(args) -> int:
+    """Pre-downloads tokenizer files so the app (and PyInstaller bundle) never fetches them at runtime."""
+    try:
+        names = build_encoder_cache(args.dir)
+    except Exception as e:
+        emit({"ok": False, "dir": args.dir, "error": f"{type(e).__name__}: {e}"})
+        return 1
+    emit({"ok": True, "dir": args.dir, "encodings": names, "files": sorted(os.listdir(args.dir))})
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="git-ai-commit", description="Headless GitAI Commit.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(p, repo=True):
+        if repo:
+            p.add_argument("--repo", default=".", help="Repository path (default: current directory).")
+        p.add_argument("--model", help="OpenRouter model id (default: saved selection).")
+
+    p = sub.add_parser("status", help="Show staged files, token estimate and warnings.")
+    add_common(p)
+    p.add_argument("--include-diff", action="store_true", help="Include the packed diff text.")
+    p.set_defaults(func=cmd_status)
+
+    p = sub.add_parser("generate", help="Generate a commit message for the staged changes.")
+    add_common(p)
+    p.add_argument("--hint", default="", help="Optional context hint.")
+    p.add_argument("--force", action="store_true", help="Bypass the generation cache.")
+    p.add_argument("--commit", action="store_true", help="Commit with the generated message.")
+    p.add_argument("--allow-sensitive", action="store_true", help="Commit even if sensitive files or secrets are staged.")
+    p.set_defaults(func=cmd_generate)
+
+    p = sub.add_parser("commit", help="Commit the staged changes with a given message.")
+    add_common(p)
+    group = p.add_mutually_exclusive_group(required=True)
+    group.add_argument("-m", "--message", help="Commit message.")
+    group.add_argument("-F", "--file", help="Read the commit message from a file.")
+    p.set_defaults(func=cmd_commit)
+
+    p = sub.add_parser("batch", help="Process many repositories concurrently (JSON Lines output).")
+    add_common(p, repo=False)
+    p.add_argument("repos", nargs="*", help="Repository paths.")
+    p.add_argument("--repos-file", help="File with one repository path per line.")
+    p.add_argument("--concurrency", type=int, default=4, help="Repositories processed at once.")
+    p.add_argument("--api-concurrency", type=int, help="Max in-flight API calls (default: --concurrency).")
+    p.add_argument("--rate", type=float, default=0, help="Max API calls per minute across all repos (0 = unlimited).")
+    p.add_argument("--hint", default="", help="Context hint applied to every repo.")
+    p.add_argument("--force", action="store_true", help="Bypass the generation cache.")
+    p.add_argument("--commit", action="store_true", help="Commit each repo with its generated message.")
+    p.add_argument("--allow-sensitive", action="store_true", help="Commit even if sensitive files or secrets are staged.")
+    p.add_argument("--status-only", action="store_true", help="Only report status; make no API calls.")
+    p.set_defaults(func=cmd_batch)
+
+    p = sub.add_parser("rewrite", help="Regenerate the commit messages of a branch (e.g. squashed-in 'wip' commits).")
+    add_common(p)
+    p.add_argument("base", nargs="?", help="Commits after this revision are rewritten (e.g. main).")
+    p.add_argument("--branch", default="HEAD", help="Local branch to rewrite (default: the current branch).")
+    p.add_argument("--match", help="Only rewrite commits whose subject matches this regex.")
+    p.add_argument("--hint", default="", help="Context hint applied to every commit.")
+    p.add_argument("--concurrency", type=int, help="Commits generated at once (default: rewrite_concurrency).")
+    p.add_argument("--rate", type=float, default=0, help="Max API calls per minute (0 = unlimited).")
+    p.add_argument("--plan", help="Write the plan to this file for review instead of printing it.")
+    p.add_argument("--apply", help="Apply a (reviewed) plan file.")
+    p.add_argument("--yes", action="store_true", help="Apply the plan right away.")
+    p.set_defaults(func=cmd_rewrite)
+
+    p = sub.add_parser("install-hook", help="Install a prepare-commit-msg hook that fills in generated messages.")
+    p.add_argument("--repo", default=".", help="Repository path (default: current directory).")
+    p.add_argument("--force", action="store_true", help="Replace another prepare-commit-msg hook.")
+    p.add_argument("--uninstall", action="store_true", help="Remove the hook instead.")
+    p.set_defaults(func=cmd_install_hook)
+
+    p = sub.add_parser("daemon", help="Run the warm generation daemon used by the hook (foreground).")
+    p.add_argument("--socket", help="Socket path (default: $GIT_AI_COMMIT_SOCKET or ~/.git-ai-commit.sock).")
+    p.add_argument("--idle", type=float, default=IDLE_TIMEOUT_SEC, help="Exit after this many idle seconds (0 = never).")
+    group = p.add_mutually_exclusive_group()
+    group.add_argument("--status", action="store_true", help="Report whether a daemon is running.")
+    group.add_argument("--stop", action="store_true", help="Stop the running daemon.")
+    p.set_defaults(func=cmd_daemon)
+
+    p = sub.add_parser("tokenizer-cache", help="Download tokenizer files for offline use and bundling.")
+    p.add_argument("--dir", default=bundled_cache_path(),
+                   help="Target directory (default: the tiktoken_cache folder next to the sources, where the app looks).")
+    p.set_defaults(func=cmd_tokenizer_cache)
+
+    return parser
+
+
+def main(argv: List[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,45 +3,178 @@
 
 """
 This module handles loading and saving application settings to a local JSON file.
+Changes are batched in memory and flushed after a short delay (or at exit) with an
+atomic rename under an inter-process file lock, so concurrent app instances and
+crashes mid-write cannot corrupt the file.
 """
 
+import atexit
+import contextlib
 import json
 import os
-from typing import Dict, Any
+import tempfile
+import threading
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+FLUSH_DELAY_SEC = 1.0  # Saves within this window are written together
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+@contextlib.contextmanager
+def _file_lock(lock_path: str) -> Iterator[None]:
+    """Exclusive advisory lock on `lock_path`, held across processes."""
+    with open(lock_path, "a+") as f:
+        if os.name == "nt":
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # Retries for ~10s before raising
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
 
 class ConfigManager:
-    def __init__(self):
-        self.config_path = os.path.expanduser("~/.git-ai-commit-config.json")
+    def __init__(self, path: str = None):
+        self.config_path = path or os.path.expanduser("~/.git-ai-commit-config.json")
         self.default_config = {
             "api_key": "",
             "selected_model": "mistralai/mistral-7b-instruct",
+            "model_fallbacks": [],        # Tried in order when the selected model is slow or failing
+            "latency_budgets": {},        # {model: seconds to first token before hedging}; automatic if unset
+            "api_max_retries": 2,         # Retries per model for transient errors (exponential backoff)
+            "api_base_url": "https://openrouter.ai/api/v1",  # Any OpenAI-compatible endpoint
             "last_repo_path": os.getcwd(),
-            "system_style": "Professional"
+            "system_style": "Professional",
+            "map_reduce_enabled": True,   # Summarize oversized change sets in parallel shards
+            "map_reduce_width": 4,        # Max concurrent shard summaries
+            "rewrite_concurrency": 4,     # Commits generated at once when rewriting a branch
+            "secret_scan_mode": "redact", # "warn", "redact" (before prompting) or "block" generation
+            "speculative_generation": False, # Generate in the background once the staged change settles
+            "speculative_calls_per_hour": 20, # ...with at most this many API calls per hour
+            "speculative_delay_sec": 2.0, # How long the staged change must stay the same first
+            "history_index_enabled": True, # Show the model past commits related to the staged paths
+            "exclude_globs": [],          # Extra paths left out of the prompt, e.g. "**/generated/**"
+            "max_file_lines": 5000,       # Files with more changed lines are left out of the prompt
+            "max_file_bytes": 524288,     # ...as are staged files larger than this
+            "trace_log_enabled": True     # Append per-stage timings to ~/.git-ai-commit-trace.jsonl
         }
+        self._lock = threading.RLock()
+        self._pending: Dict[str, Any] = {}     # Saved in memory, not yet flushed
+        self._overrides: Dict[str, Any] = {}   # Session-only values, never written
+        self._timer: Optional[threading.Timer] = None
+        self._stat_key: Optional[Tuple[int, int]] = None
+        self._saved: Dict[str, Any] = {}       # Last settings read from or written to disk
         self.config = self.load_config()
+        atexit.register(self.flush)
 
     def load_config(self) -> Dict[str, Any]:
         """Loads config from disk or returns defaults if not found."""
-        if not os.path.exists(self.config_path):
-            return self.default_config.copy()
-        
-        try:
-            with open(self.config_path, 'r') as f:
-                saved_config = json.load(f)
-                # Merge with defaults to ensure all keys exist
-                return {**self.default_config, **saved_config}
-        except (json.JSONDecodeError, IOError):
-            return self.default_config.copy()
+        with self._lock:
+            self._stat_key = self._read_stat_key()
+            saved_config = self._read_disk()
+            if saved_config is not None:
+                self._saved = saved_config
+            # Merge with defaults to ensure all keys exist; unsaved and session values win.
+            # An unreadable file keeps the settings last read instead of dropping them.
+            return {**self.default_config, **self._saved, **self._pending, **self._overrides}
 
     def save_config(self, key: str, value: Any) -> None:
-        """Updates a specific key and persists to disk."""
-        self.config[key] = value
-        try:
-            with open(self.config_path, 'w') as f:
-                json.dump(self.config, f, indent=4)
-        except IOError as e:
-            print(f"Error saving config: {e}")
+        """Updates a specific key; it is persisted on the next (debounced) flush."""
+        with self._lock:
+            if self.config.get(key) == value and key not in self._pending:
+                return
+            self.config[key] = value
+            self._pending[key] = value
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(FLUSH_DELAY_SEC, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def set_override(self, key: str, value: Any) -> None:
+        """Sets a value for this session only (e.g. from an environment variable); never saved."""
+        with self._lock:
+            self._overrides[key] = value
+            self.config[key] = value
+
+    def flush(self) -> None:
+        """Writes pending changes now, merged into whatever is on disk."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            try:
+                with _file_lock(self.config_path + ".lock"):
+                    # Another instance may have written since we loaded; keep its other keys.
+                    # If the file is unreadable, rewrite it from the settings last read rather
+                    # than from the pending keys alone (which would drop e.g. the API key).
+                    on_disk = self._read_disk()
+                    merged = {**(self._saved if on_disk is None else on_disk), **self._pending}
+                    self._write_atomic(merged)
+                    self._saved = merged
+                    self._stat_key = self._read_stat_key()
+                self._pending.clear()
+                self.config = {**self.default_config, **merged, **self._overrides}
+            except (IOError, OSError) as e:
+                print(f"Error saving config: {e}")
 
     def get(self, key: str) -> Any:
         """Retrieves a value from the configuration."""
-        return self.config.get(key, self.default_config.get(key))
\ No newline at end of file
+        self._reload_if_changed()
+        return self.config.get(key, self.default_config.get(key))
+
+    def _reload_if_changed(self) -> None:
+        """Picks up writes from other instances; a stat call when nothing changed."""
+        stat_key = self._read_stat_key()
+        if stat_key == self._stat_key:
+            return
+        with self._lock:
+            if stat_key != self._stat_key:
+                self.config = self.load_config()
+
+    def _read_stat_key(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.config_path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read_disk(self) -> Optional[Dict[str, Any]]:
+        """The saved settings ({} if the file does not exist yet), or None if it is unreadable."""
+        if not os.path.exists(self.config_path):
+            return {}
+        try:
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                saved_config = json.load(f)
+            return saved_config if isinstance(saved_config, dict) else None
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Error loading config: {e}")
+            return None
+
+    def _write_atomic(self, data: Dict[str, Any]) -> None:
+        """Writes to a temp file in the same directory, then renames it over the config."""
+        directory = os.path.dirname(self.config_path) or "."
+        fd, tmp_path = tempfile.mkstemp(prefix=".git-ai-commit-config.", dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.config_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -0,0 +1,177 @@
+# daemon.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Long-lived local generation server for the `prepare-commit-msg` hook (hook_client.py).
+Importing the API client, loading tokenizer encoders and opening a TLS connection take
+longer than most generations, so the daemon does it once and keeps an AppLogic per
+repository (snapshot, history index and secret scan caches) and the pooled API clients
+warm between commits.
+
+Protocol: one JSON request line per connection on a Unix socket, one JSON response line.
+    {"op": "generate", "repo": path, "index_file": path?, "hint": "", "model": null}
+        -> {"ok": true, "message": "..."} or {"ok": false, "error": "..."}
+    {"op": "ping"} -> {"ok": true, "pid": ..., "repos": ...}
+    {"op": "shutdown"} -> {"ok": true}
+
+    python cli.py daemon [--socket PATH] [--idle SECONDS] [--status | --stop]
+(`python daemon.py ...` is the same command; the hook client starts it that way.)
+"""
+
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app_logic import AppLogic
+from config_manager import ConfigManager
+from dispatcher import LatencyStats
+from generation_cache import GenerationCache
+from hook_client import request, socket_path
+from token_service import TokenCounter
+
+IDLE_TIMEOUT_SEC = 2 * 60 * 60   # Exit after this long without requests (0 = never)
+MAX_REPOS = 32                   # Warm AppLogic instances kept, least recently used dropped first
+MAX_REQUEST_BYTES = 64 * 1024
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline(MAX_REQUEST_BYTES)
+        try:
+            payload = json.loads(line.decode('utf-8'))
+            response = self.server.daemon.dispatch(payload)
+        except ValueError as e:
+            response = {"ok": False, "error": f"Bad request: {e}"}
+        except Exception as e:
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        self.wfile.write(json.dumps(response).encode('utf-8') + b"\n")
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class GenerationDaemon:
+    """Serves generate requests from warm, shared state. One request per repository runs at a time."""
+
+    def __init__(self, path: str = None, config: ConfigManager = None, idle_timeout: float = IDLE_TIMEOUT_SEC):
+        self.path = path or socket_path()
+        self.config = config or ConfigManager()
+        self.idle_timeout = idle_timeout
+
+        # Shared by every repository's AppLogic
+        self.tokens = TokenCounter()
+        self.cache = GenerationCache(os.path.join(os.path.dirname(self.config.config_path),
+                                                  ".git-ai-commit-cache.json"))
+        self.latency_stats = LatencyStats()
+        self.api_clients: Dict[Tuple[str, str], Any] = {}
+
+        self._logics: "OrderedDict[str, Tuple[AppLogic, threading.Lock]]" = OrderedDict()
+        self._logics_lock = threading.Lock()
+        self._last_request = time.monotonic()
+        self._server: Optional[_Server] = None
+
+    def warm_up(self) -> None:
+        """Imports the API client, loads the selected model's encoder and creates the API client."""
+        logic = self._new_logic(os.getcwd())
+        logic.warm_up()
+        api_key = self.config.get("api_key")
+        if api_key:
+            logic._get_client(api_key)
+
+    def _new_logic(self, repo: str) -> AppLogic:
+        logic = AppLogic(repo_path=repo, config=self.config, tokens=self.tokens, generation_cache=self.cache)
+        logic.latency_stats = self.latency_stats
+        logic.api_clients = self.api_clients
+        return logic
+
+    def _logic_for(self, repo: str) -> Tuple[AppLogic, threading.Lock]:
+        with self._logics_lock:
+            entry = self._logics.get(repo)
+            if entry is None:
+                entry = (self._new_logic(repo), threading.Lock())
+                self._logics[repo] = entry
+                while len(self._logics) > MAX_REPOS:
+                    self._logics.popitem(last=False)[1][0].close()
+            self._logics.move_to_end(repo)
+            return entry
+
+    def dispatch(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        self._last_request = time.monotonic()
+        op = payload.get("op")
+        if op == "ping":
+            return {"ok": True, "pid": os.getpid(), "repos": len(self._logics)}
+        if op == "shutdown":
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+            return {"ok": True}
+        if op == "generate":
+            return self.generate(payload)
+        return {"ok": False, "error": f"Unknown op '{op}'."}
+
+    def generate(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        repo = os.path.realpath(payload.get("repo") or "")
+        if not os.path.isdir(repo):
+            return {"ok": False, "error": f"Not a directory: {repo}"}
+        logic, lock = self._logic_for(repo)
+        with lock:
+            # The hook's index (e.g. `commit -a`) differs from the repository's own index
+            index_file = payload.get("index_file")
+            if index_file != logic.git.index_file:
+                logic.git.index_file = index_file
+                logic.git.invalidate_snapshot()
+            model = payload.get("model") or self.config.get("selected_model")
+            message = logic.generate_commit_message(payload.get("hint", ""), model)
+        if not message or message.startswith(("Error", "API Error")):
+            return {"ok": False, "error": message or "Empty response."}
+        return {"ok": True, "message": message}
+
+    def serve(self) -> None:
+        """Listens until shut down or idle for `idle_timeout` seconds."""
+        self._claim_socket()
+        old_umask = os.umask(0o177)   # Socket usable by this user only
+        try:
+            self._server = _Server(self.path, _Handler)
+        finally:
+            os.umask(old_umask)
+        self._server.daemon = self
+        self._last_request = time.monotonic()
+        if self.idle_timeout:
+            threading.Thread(target=self._idle_watch, name="DaemonIdle", daemon=True).start()
+        threading.Thread(target=self.warm_up, name="DaemonWarmUp", daemon=True).start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.config.flush()
+
+    def _claim_socket(self) -> None:
+        """Removes a stale socket file; refuses to start if another daemon answers on it."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            request({"op": "ping"}, 1.0, self.path)
+        except (OSError, ValueError):
+            os.remove(self.path)
+            return
+        raise RuntimeError(f"A daemon is already listening on {self.path}.")
+
+    def _idle_watch(self) -> None:
+        while True:
+            remaining = self._last_request + self.idle_timeout - time.monotonic()
+            if remaining <= 0:
+                self._server.shutdown()
+                return
+            time.sleep(min(remaining, 60.0))
+
+
+if __name__ == "__main__":
+    # One entry point for starting, querying and stopping the daemon: `cli.py daemon`
+    from cli import main
+    sys.exit(main(["daemon", *sys.argv[1:]]))
@@ -0,0 +1,207 @@
+# diff_packer.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Packs the most useful per-file/per-hunk pieces of a staged diff (see staged_diff.py)
+into a model-dependent token budget. Files that don't fit are summarized.
+"""
+
+import fnmatch
+import re
+from typing import Callable, Dict, List, Tuple, Union
+
+from file_classifier import is_generated
+from staged_diff import FileRecord, StagedDiff, as_staged_diff
+
+# Approximate context windows (tokens) by model prefix. Unknown models get the default.
+MODEL_CONTEXT_TOKENS = {
+    "openai/gpt-4o": 128000,
+    "openai/gpt-4": 128000,
+    "openai/gpt-3.5": 16000,
+    "anthropic/": 200000,
+    "google/gemini": 1000000,
+    "mistralai/mistral-7b": 32000,
+    "meta-llama/": 128000,
+}
+DEFAULT_CONTEXT_TOKENS = 16000
+
+# The diff gets a fraction of the context window, but never more than the hard cap,
+# so prompt size (and cost) stays bounded regardless of the model.
+CONTEXT_FRACTION = 0.25
+MAX_DIFF_TOKENS = 12000
+MIN_DIFF_TOKENS = 1500
+
+# Callers read this many times the token budget (in bytes) so the packer has hunks to choose from
+DIFF_READ_FACTOR = 4
+
+# Relative value of a file's hunks. Higher is packed first.
+WEIGHT_SOURCE = 3
+WEIGHT_DOCS = 2
+WEIGHT_TESTS = 2
+WEIGHT_GENERATED = 0
+
+TEST_PATTERNS = ["test_*", "*_test.*", "*.test.*", "*.spec.*", "*/tests/*", "tests/*", "*/test/*", "test/*"]
+DOC_PATTERNS = ["*.md", "*.rst", "*.txt", "docs/*", "*/docs/*"]
+
+SIGNATURE_RE = re.compile(
+    r"^[+-]\s*(?:export\s+|public\s+|private\s+|protected\s+|static\s+|async\s+)*"
+    r"(?:def|class|function|func|fn|interface|struct|impl|enum|trait|type)\b"
+)
+MAX_SIGNATURES_PER_FILE = 5
+
+
+def budget_for_model(model: str) -> int:
+    """Returns the diff token budget for a given OpenRouter model id."""
+    context = DEFAULT_CONTEXT_TOKENS
+    for prefix, size in MODEL_CONTEXT_TOKENS.items():
+        if (model or "").startswith(prefix):
+            context = size
+            break
+    return max(MIN_DIFF_TOKENS, min(MAX_DIFF_TOKENS, int(context * CONTEXT_FRACTION)))
+
+
+def _matches(path: str, patterns: List[str]) -> bool:
+    return any(fnmatch.fnmatch(path, p) for p in patterns)
+
+
+def file_weight(path: str) -> int:
+    """Scores a path: source over docs/tests over generated files (see file_classifier.py)."""
+    lowered = path.lower()
+    if is_generated(path):
+        return WEIGHT_GENERATED
+    if _matches(lowered, TEST_PATTERNS):
+        return WEIGHT_TESTS
+    if _matches(lowered, DOC_PATTERNS):
+        return WEIGHT_DOCS
+    return WEIGHT_SOURCE
+
+
+def signatures(diff: StagedDiff, record: FileRecord) -> List[str]:
+    """Definitions touched by a file's changes, from hunk headers and changed lines."""
+    found: List[str] = []
+    for hunk in record.hunks:
+        lines = diff.text(hunk.start, hunk.end).splitlines()
+        # "@@ -1,2 +1,3 @@ def context():" carries the enclosing definition
+        context = lines[0].split("@@", 2)[-1].strip() if lines else ""
+        candidates = ([context] if context else []) + [
+            line[1:].strip() for line in lines[1:] if SIGNATURE_RE.match(line)
+        ]
+        for sig in candidates:
+            if sig not in found:
+                found.append(sig)
+            if len(found) >= MAX_SIGNATURES_PER_FILE:
+                return found
+    return found
+
+
+class PackedDiff:
+    """Result of packing: prompt-ready text plus accounting."""
+
+    def __init__(self, text: str, token_count: int, budget: int,
+                 included_files: List[str], summarized_files: List[str], file_tokens: Dict[str, int] = None):
+        self.text = text
+        self.token_count = token_count
+        self.budget = budget
+        self.included_files = included_files      # At least one hunk included
+        self.summarized_files = summarized_files  # Represented only by a summary
+        self.file_tokens = file_tokens or {}      # Full diff size of every completely read file
+
+
+class DiffPacker:
+    """Greedy, score-ordered packing of diff hunks into a token budget."""
+
+    def __init__(self, count_tokens_batch: Callable[[List[Union[str, memoryview]]], List[int]]):
+        self.count_tokens_batch = count_tokens_batch
+
+    def pack(self, diff: Union[str, StagedDiff], budget: int, numstat: List[Tuple[str, str, str]] = None,
+             complete: bool = True) -> PackedDiff:
+        """
+        Packs `diff` into `budget` tokens. Plain text is parsed first (`complete` applies
+        to it); a StagedDiff is used as parsed, and only the chosen slices are decoded.
+          1. Hunks are ordered by file weight, then by size (small first), and added while they fit.
+          2. Files left without any hunks get a stat line plus touched signatures.
+          3. Files missing from a truncated diff are summarized from numstat.
+        """
+        diff = as_staged_diff(diff, complete)
+        files = diff.files
+        stats: Dict[str, Tuple[str, str]] = {path: (a, d) for a, d, path in (numstat or [])}
+
+        # 1. Score every hunk (headers and hunks are counted in one batch, as buffer slices)
+        header_tokens = self.count_tokens_batch([diff.header_view(f) for f in files])
+        hunk_tokens = iter(self.count_tokens_batch([diff.hunk_view(h) for f in files for h in f.hunks]))
+        candidates = []
+        file_tokens: Dict[str, int] = {}
+        for f_idx, f in enumerate(files):
+            weight = file_weight(f.path)
+            file_tokens[f.path] = header_tokens[f_idx]
+            for h_idx in range(len(f.hunks)):
+                tokens = next(hunk_tokens)
+                file_tokens[f.path] += tokens
+                candidates.append((-weight, tokens, f_idx, h_idx))
+        candidates.sort()
+        if files and not diff.complete:
+            # The last file was cut off, so its count is partial
+            del file_tokens[files[-1].path]
+
+        # Reserve a slice of the budget for the summaries of whatever doesn't fit
+        reserve = min(budget // 5, 20 * max(len(files), len(stats)))
+        hunk_budget = budget - reserve
+
+        used = 0
+        chosen: Dict[int, List[int]] = {}
+        for _, tokens, f_idx, h_idx in candidates:
+            cost = tokens
+            if f_idx not in chosen:
+                cost += header_tokens[f_idx]
+            if used + cost > hunk_budget:
+                continue
+            chosen.setdefault(f_idx, []).append(h_idx)
+            used += cost
+
+        # 2. Reassemble included files in their original order
+        parts: List[str] = []
+        included: List[str] = []
+        for f_idx, f in enumerate(files):
+            if f_idx not in chosen:
+                continue
+            included.append(f.path)
+            hunk_ids = sorted(chosen[f_idx])
+            parts.append(diff.text(f.start, f.header_end))
+            parts.extend(diff.text(f.hunks[i].start, f.hunks[i].end) for i in hunk_ids)
+            if len(hunk_ids) < len(f.hunks):
+                parts.append(f"... ({len(f.hunks) - len(hunk_ids)} more hunks omitted)")
+
+        # 3. Summaries for files without any included hunks
+        summarized: List[str] = []
+        summary_lines: List[Tuple[str, str]] = []
+        seen = set(included)
+        pending = [f for f in files if f.path not in seen]
+        in_diff = {f.path for f in files}
+        missing = [p for p in stats if p not in in_diff]
+        for f in pending:
+            added, deleted = stats.get(f.path, (str(f.added), str(f.deleted)))
+            line = f"- {f.path} (+{added} -{deleted})"
+            sigs = signatures(diff, f)
+            if sigs:
+                line += ": " + "; ".join(sigs)
+            summary_lines.append((f.path, line))
+        for path in missing:
+            added, deleted = stats[path]
+            desc = "binary" if added == "-" else f"+{added} -{deleted}"
+            summary_lines.append((path, f"- {path} ({desc})"))
+
+        if summary_lines:
+            block = ["## OMITTED FROM DIFF (summaries)"]
+            title_cost, *line_costs = self.count_tokens_batch([block[0]] + [line for _, line in summary_lines])
+            used += title_cost
+            for idx, ((path, line), cost) in enumerate(zip(summary_lines, line_costs)):
+                if used + cost > budget:
+                    block.append(f"- ... and {len(summary_lines) - idx} more files")
+                    break
+                block.append(line)
+                summarized.append(path)
+                used += cost
+            parts.append("\n".join(block))
+
+        text = "\n".join(parts)
+        return PackedDiff(text, used, budget, included, summarized, file_tokens)
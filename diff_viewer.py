@@ -0,0 +1,280 @@
+# diff_viewer.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Virtualized viewer for the staged diff.
+A file list shows per-file line and token counts; a file's diff is only read from git
+when it is selected, inserted into the text widget a page at a time as it scrolls
+into view, and syntax-tagged only around the visible region.
+"""
+
+import re
+import threading
+import tkinter as tk
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple
+
+import customtkinter as ctk
+
+from cancellation import CancelToken
+
+PAGE_LINES = 400                # Lines inserted into the text widget at a time
+LOAD_AHEAD_FRACTION = 0.8       # Insert the next page once the view passes this point
+TAG_MARGIN_LINES = 40           # Lines tagged above/below the visible region
+MAX_FILE_BYTES = 1024 * 1024    # Per-file diff read limit
+CACHE_MAX_BYTES = 8 * 1024 * 1024  # Recently viewed file diffs kept in memory
+# Row fields that identify a file's diff; a refresh keeps cached diffs whose fields are unchanged
+DIFF_KEY_FIELDS = ("added", "deleted", "blobs")
+
+KEYWORD_RE = re.compile(
+    r"\b(?:def|class|return|import|from|if|elif|else|for|while|try|except|finally|with|as|raise|"
+    r"function|const|let|var|export|async|await|public|private|protected|static|struct|func|fn|"
+    r"impl|interface|new|None|True|False|null|true|false|self|this)\b"
+)
+STRING_RE = re.compile(r"\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'")
+COMMENT_RE = re.compile(r"(?:#|//).*$")
+
+COLORS = {
+    "bg": "#1d1e1e",
+    "fg": "#d4d4d4",
+    "select": "#1f538d",
+    "add": "#173d25",
+    "del": "#4b1d1d",
+    "hunk": "#56b6c2",
+    "meta": "#808080",
+    "keyword": "#c586c0",
+    "string": "#ce9178",
+    "comment": "#6a9955",
+}
+
+
+def diff_key(stat: Dict[str, Any]) -> Tuple:
+    return tuple(stat.get(field) for field in DIFF_KEY_FIELDS)
+
+
+def format_file_row(stat: Dict[str, Any]) -> str:
+    """One list row: path, line counts and token count (estimated counts get a ~)."""
+    lines = "binary" if stat["added"] == "-" else f"+{stat['added']} -{stat['deleted']}"
+    tokens = f"{'~' if stat['estimated'] else ''}{stat['tokens']} tok"
+    mark = f"  [excluded: {stat['excluded']}]" if stat["excluded"] else "  [summary]" if stat["summarized"] else ""
+    return f"{stat['path']}   {lines}   {tokens}{mark}"
+
+
+class DiffViewer(ctk.CTkFrame):
+    """
+    File list plus a lazily rendered diff pane.
+    `load_file(path, max_bytes, cancel)` must return (diff_text, truncated); it runs on a worker thread.
+    """
+
+    def __init__(self, master, load_file: Callable[[str, int, CancelToken], Tuple[str, bool]], **kwargs):
+        super().__init__(master, **kwargs)
+        self.load_file = load_file
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1, minsize=80)
+        self.grid_rowconfigure(3, weight=3)
+
+        self._stats: List[Dict[str, Any]] = []
+        self._cache: "OrderedDict[str, Tuple[List[str], int]]" = OrderedDict()
+        self._cache_bytes = 0
+        self._load_token = None
+        self._current_path = None
+        self._lines: List[str] = []   # Lines of the selected file's diff
+        self._rendered = 0            # How many of them are in the text widget
+        self._tagged = set()          # Widget line numbers that already carry syntax tags
+        self._tag_after_id = None
+        self._page_after_id = None
+
+        # 1. Summary + file list (a native Listbox handles thousands of rows cheaply)
+        self.lbl_summary = ctk.CTkLabel(self, text="No staged files.", anchor="w")
+        self.lbl_summary.grid(row=0, column=0, columnspan=2, sticky="ew", padx=5)
+
+        self.list_files = tk.Listbox(
+            self, activestyle="none", exportselection=False, font=("Consolas", 11), height=8,
+            bg=COLORS["bg"], fg=COLORS["fg"], selectbackground=COLORS["select"],
+            highlightthickness=0, borderwidth=0
+        )
+        self.list_files.grid(row=1, column=0, sticky="nsew")
+        list_scroll = ctk.CTkScrollbar(self, command=self.list_files.yview)
+        list_scroll.grid(row=1, column=1, sticky="ns")
+        self.list_files.configure(yscrollcommand=list_scroll.set)
+        self.list_files.bind("<<ListboxSelect>>", self._on_select)
+
+        # 2. Diff pane for the selected file
+        self.lbl_file = ctk.CTkLabel(self, text="Select a file to view its diff.", anchor="w", text_color="gray")
+        self.lbl_file.grid(row=2, column=0, columnspan=2, sticky="ew", padx=5, pady=(5, 0))
+
+        self.txt_diff = tk.Text(
+            self, wrap="none", font=("Consolas", 12), bg=COLORS["bg"], fg=COLORS["fg"],
+            insertbackground=COLORS["fg"], highlightthickness=0, borderwidth=0, undo=False
+        )
+        self.txt_diff.grid(row=3, column=0, sticky="nsew")
+        self.diff_scroll = ctk.CTkScrollbar(self, command=self.txt_diff.yview)
+        self.diff_scroll.grid(row=3, column=1, sticky="ns")
+        self.txt_diff.configure(yscrollcommand=self._on_diff_scroll, state="disabled")
+        self.txt_diff.bind("<Configure>", lambda e: self._schedule_tagging())
+
+        for tag in ("add", "del"):
+            self.txt_diff.tag_configure(tag, background=COLORS[tag])
+        for tag in ("hunk", "meta", "keyword", "string", "comment"):
+            self.txt_diff.tag_configure(tag, foreground=COLORS[tag])
+        # Syntax colors win over the (background-only) add/del tags
+        for tag in ("keyword", "string", "comment"):
+            self.txt_diff.tag_raise(tag)
+
+    def set_files(self, file_stats: List[Dict[str, Any]]) -> None:
+        """
+        Replaces the file list. Cached diffs are kept for files whose row is unchanged, and
+        the open file stays as it is (scroll position included) unless its diff changed.
+        """
+        selected = self._current_path
+        old_keys = {s["path"]: diff_key(s) for s in self._stats}
+        self._stats = list(file_stats)
+        new_keys = {s["path"]: diff_key(s) for s in self._stats}
+
+        # 1. Drop cached diffs of files that changed or are no longer staged
+        for path in [p for p in self._cache if new_keys.get(p) != old_keys.get(p)]:
+            _, size = self._cache.pop(path)
+            self._cache_bytes -= size
+
+        # 2. Rebuild the list, keeping its scroll position
+        list_top = self.list_files.yview()[0]
+        self.list_files.delete(0, "end")
+        if self._stats:
+            self.list_files.insert("end", *[format_file_row(s) for s in self._stats])
+        self.list_files.yview_moveto(list_top)
+
+        added = sum(int(s["added"]) for s in self._stats if s["added"] != "-")
+        deleted = sum(int(s["deleted"]) for s in self._stats if s["deleted"] != "-")
+        tokens = sum(s["tokens"] for s in self._stats if not s["excluded"])
+        self.lbl_summary.configure(
+            text=f"{len(self._stats)} files   +{added} -{deleted}   ~{tokens} tokens" if self._stats else "No staged files."
+        )
+
+        # 3. Keep showing the same file if it is still staged, reloading it only if it changed
+        paths = [s["path"] for s in self._stats]
+        if selected in paths:
+            self.list_files.selection_set(paths.index(selected))
+            if new_keys[selected] != old_keys.get(selected):
+                self.open_file(selected)
+        else:
+            self.show_message("Select a file to view its diff.")
+
+    def show_message(self, message: str) -> None:
+        """Clears the diff pane and shows a status line instead."""
+        if self._load_token is not None:
+            self._load_token.cancel()
+            self._load_token = None
+        self._current_path = None
+        self.lbl_file.configure(text=message)
+        self._set_lines([])
+
+    def open_file(self, path: str) -> None:
+        """Shows `path`, reading its diff on a worker thread unless cached."""
+        if self._load_token is not None:
+            self._load_token.cancel()
+        self._current_path = path
+
+        cached = self._cache.get(path)
+        if cached is not None:
+            self._cache.move_to_end(path)
+            self.lbl_file.configure(text=path)
+            self._set_lines(cached[0])
+            return
+
+        self.lbl_file.configure(text=f"{path} (loading...)")
+        self._set_lines([])
+        token = CancelToken()
+        self._load_token = token
+
+        def work():
+            text, truncated = self.load_file(path, MAX_FILE_BYTES, token)
+            self.after(0, lambda: self._on_loaded(token, path, text, truncated))
+
+        threading.Thread(target=work, daemon=True).start()
+
+    def _on_loaded(self, token: CancelToken, path: str, text: str, truncated: bool) -> None:
+        if token is not self._load_token or token.cancelled:
+            return
+        self._load_token = None
+        lines = text.splitlines() if text else ["(no diff: the file may have been unstaged)"]
+        if truncated:
+            lines.append(f"... diff truncated at {MAX_FILE_BYTES // 1024} KiB")
+
+        # 1. Remember it (bounded by total size, least recently viewed first out)
+        self._cache[path] = (lines, len(text))
+        self._cache_bytes += len(text)
+        while self._cache_bytes > CACHE_MAX_BYTES and len(self._cache) > 1:
+            _, (_, size) = self._cache.popitem(last=False)
+            self._cache_bytes -= size
+
+        # 2. Render
+        self.lbl_file.configure(text=path)
+        self._set_lines(lines)
+
+    def _on_select(self, event=None) -> None:
+        selection = self.list_files.curselection()
+        if selection:
+            self.open_file(self._stats[selection[0]]["path"])
+
+    def _set_lines(self, lines: List[str]) -> None:
+        self._lines = lines
+        self._rendered = 0
+        self._tagged = set()
+        self.txt_diff.configure(state="normal")
+        self.txt_diff.delete("1.0", "end")
+        self.txt_diff.configure(state="disabled")
+        self._render_page()
+
+    def _render_page(self) -> None:
+        """Appends the next PAGE_LINES lines of the current file."""
+        self._page_after_id = None
+        if self._rendered >= len(self._lines):
+            return
+        page = self._lines[self._rendered:self._rendered + PAGE_LINES]
+        self.txt_diff.configure(state="normal")
+        self.txt_diff.insert("end", ("\n" if self._rendered else "") + "\n".join(page))
+        self.txt_diff.configure(state="disabled")
+        self._rendered += len(page)
+        self._schedule_tagging()
+
+    def _on_diff_scroll(self, first: str, last: str) -> None:
+        self.diff_scroll.set(first, last)
+        if float(last) >= LOAD_AHEAD_FRACTION and self._rendered < len(self._lines) and self._page_after_id is None:
+            self._page_after_id = self.after_idle(self._render_page)
+        self._schedule_tagging()
+
+    def _schedule_tagging(self) -> None:
+        """Coalesces scroll/resize events into a single tagging pass."""
+        if self._tag_after_id is None:
+            self._tag_after_id = self.after_idle(self._tag_visible)
+
+    def _tag_visible(self) -> None:
+        """Applies syntax tags to the visible lines (plus a margin) that don't have them yet."""
+        self._tag_after_id = None
+        if not self._rendered:
+            return
+        top = int(self.txt_diff.index("@0,0").split(".")[0])
+        bottom = int(self.txt_diff.index(f"@0,{self.txt_diff.winfo_height()}").split(".")[0])
+        for line_no in range(max(1, top - TAG_MARGIN_LINES), min(self._rendered, bottom + TAG_MARGIN_LINES) + 1):
+            if line_no not in self._tagged:
+                self._tagged.add(line_no)
+                self._tag_line(line_no, self._lines[line_no - 1])
+
+    def _tag_line(self, line_no: int, line: str) -> None:
+        text = self.txt_diff
+        if line.startswith("@@"):
+            text.tag_add("hunk", f"{line_no}.0", f"{line_no}.end")
+            return
+        if line.startswith(("diff --git", "index ", "--- ", "+++ ", "new file", "deleted file",
+                            "similarity", "rename ", "old mode", "new mode", "Binary files", "...")):
+            text.tag_add("meta", f"{line_no}.0", f"{line_no}.end")
+            return
+        if line.startswith("+"):
+            text.tag_add("add", f"{line_no}.0", f"{line_no}.end")
+        elif line.startswith("-"):
+            text.tag_add("del", f"{line_no}.0", f"{line_no}.end")
+
+        # Light, language-agnostic highlighting of the code after the +/-/space prefix
+        for pattern, tag in ((KEYWORD_RE, "keyword"), (STRING_RE, "string"), (COMMENT_RE, "comment")):
+            for m in pattern.finditer(line, 1):
+                text.tag_add(tag, f"{line_no}.{m.start()}", f"{line_no}.{m.end()}")
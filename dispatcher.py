@@ -0,0 +1,260 @@
+# dispatcher.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Hedged, latency-aware dispatch of a streamed completion over an ordered model chain.
+If a model has not produced its first token within its latency budget, the next model
+is started as well; the first to stream wins and the others are cancelled. Retryable
+errors are retried with exponential backoff, then fall through to the next model.
+"""
+
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from cancellation import CancelToken
+
+DEFAULT_HEDGE_SEC = 8.0   # Budget for models without enough latency samples
+MIN_HEDGE_SEC = 2.0
+MAX_HEDGE_SEC = 30.0
+HEDGE_MULTIPLIER = 1.5    # Budget = p90 time-to-first-token * this
+MIN_SAMPLES = 5
+STATS_WINDOW = 50
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout",
+                    "ConnectTimeout", "RemoteProtocolError", "ReadError"}
+
+
+def is_retryable(error: Exception) -> bool:
+    """Transient failures (rate limits, 5xx, timeouts, dropped connections) are worth retrying."""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+
+def backoff_delay(attempt: int, error: Exception, base: float, cap: float) -> float:
+    """Exponential backoff with jitter, honouring a Retry-After header when the API sends one."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(cap, float(retry_after))
+        except ValueError:
+            pass
+    return min(cap, base * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+
+class LatencyStats:
+    """Rolling per-model time-to-first-token samples; they set the hedge thresholds."""
+
+    def __init__(self, window: int = STATS_WINDOW):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._failures: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, ttft_sec: float) -> None:
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self.window)).append(ttft_sec)
+
+    def record_failure(self, model: str) -> None:
+        with self._lock:
+            self._failures[model] = self._failures.get(model, 0) + 1
+
+    def percentile(self, model: str, q: float = 0.9) -> Optional[float]:
+        with self._lock:
+            samples = list(self._samples.get(model, ()))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return statistics.quantiles(samples, n=100, method="inclusive")[int(q * 100) - 1]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            models = set(self._samples) | set(self._failures)
+            data = {m: (list(self._samples.get(m, ())), self._failures.get(m, 0)) for m in models}
+        return {
+            m: {"samples": len(s), "median_ttft_ms": round(statistics.median(s) * 1000, 1) if s else None,
+                "failures": f}
+            for m, (s, f) in data.items()
+        }
+
+
+class DispatchError(Exception):
+    """Every model in the chain failed; carries the last underlying error."""
+
+    def __init__(self, errors: List[Tuple[str, Exception]]):
+        self.errors = errors
+        model, last = errors[-1] if errors else ("", Exception("No models configured."))
+        super().__init__(f"{model}: {last}" if model else str(last))
+
+
+class EmptyCompletion(Exception):
+    """A model finished without producing any content; treated as a failure of that model."""
+
+    def __init__(self, model: str):
+        super().__init__(f"{model} returned an empty response.")
+
+
+class _Superseded(Exception):
+    """Raised inside a losing lane's token callback to abort its stream."""
+
+
+class HedgedDispatcher:
+    """
+    Runs `attempt(model, on_token, cancel, on_started) -> text` over `models` in order.
+    Each model gets a "lane" (its own thread, retries and cancel token). An attempt calls
+    `on_started()` when its request is actually sent (after any rate-limit queueing), so
+    neither the hedge budget nor the time-to-first-token samples include the wait.
+    """
+
+    def __init__(self, stats: LatencyStats, budgets: Dict[str, float] = None, max_retries: int = 2,
+                 backoff_base: float = 0.5, backoff_cap: float = 8.0):
+        self.stats = stats
+        self.budgets = budgets or {}
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+    def budget_for(self, model: str) -> float:
+        """Explicit budget if configured, else derived from recent latency, else the default."""
+        if model in self.budgets:
+            return float(self.budgets[model])
+        p90 = self.stats.percentile(model)
+        if p90 is None:
+            return DEFAULT_HEDGE_SEC
+        return max(MIN_HEDGE_SEC, min(MAX_HEDGE_SEC, p90 * HEDGE_MULTIPLIER))
+
+    def run(self, models: List[str],
+            attempt: Callable[[str, Callable[[str], None], CancelToken, Callable[[], None]], str],
+            on_token: Callable[[str], None] = None, cancel: CancelToken = None) -> Tuple[str, str, int]:
+        """
+        Returns (model, text, lanes_started) from the first model to stream a response.
+        Raises DispatchError if every model failed. Returns ("", "", n) if cancelled.
+        """
+        cancel = cancel or CancelToken()
+        cond = threading.Condition()
+        lanes: List[CancelToken] = []
+        started_at: List[Optional[float]] = []  # When each lane first sent a request; None while queued
+        failed: set = set()
+        errors: List[Tuple[str, Exception]] = []
+        state = {"winner": None, "result": None}
+
+        def cancel_losers(winner: int) -> None:
+            for idx, token in enumerate(lanes):
+                if idx != winner:
+                    token.cancel()
+
+        def lane(idx: int, model: str, token: CancelToken) -> None:
+            for attempt_no in range(self.max_retries + 1):
+                started: List[Optional[float]] = [None]
+                streaming = [False]
+
+                def mark_started() -> None:
+                    started[0] = time.perf_counter()
+                    with cond:
+                        if started_at[idx] is None:
+                            started_at[idx] = time.monotonic()
+                            cond.notify_all()
+
+                def forward(delta: str) -> None:
+                    if not streaming[0]:
+                        streaming[0] = True
+                        if started[0] is not None:
+                            self.stats.record(model, time.perf_counter() - started[0])
+                        with cond:
+                            if state["winner"] is None:
+                                state["winner"] = idx
+                                cond.notify_all()
+                        if state["winner"] == idx:
+                            cancel_losers(idx)
+                    if state["winner"] != idx:
+                        raise _Superseded()
+                    if on_token:
+                        on_token(delta)
+
+                try:
+                    text = attempt(model, forward, token, mark_started)
+                    if not (text or "").strip() and not token.cancelled:
+                        raise EmptyCompletion(model)  # Falls through to the next model, not retried
+                    with cond:
+                        if state["winner"] is None:
+                            state["winner"] = idx  # Finished without streaming (content came at once)
+                        if state["winner"] == idx and not token.cancelled:
+                            state["result"] = (model, text)
+                        else:
+                            failed.add(idx)
+                        cond.notify_all()
+                    return
+                except _Superseded:
+                    break
+                except Exception as e:
+                    if token.cancelled:
+                        break
+                    self.stats.record_failure(model)
+                    # A stream that already delivered text can't be retried transparently
+                    if streaming[0] or not is_retryable(e) or attempt_no == self.max_retries:
+                        with cond:
+                            errors.append((model, e))
+                        break
+                    if token.wait(backoff_delay(attempt_no, e, self.backoff_base, self.backoff_cap)):
+                        break
+            with cond:
+                failed.add(idx)
+                cond.notify_all()
+
+        def launch(idx: int) -> None:
+            token = CancelToken()
+            cancel.on_cancel(token.cancel)
+            lanes.append(token)
+            started_at.append(None)
+            threading.Thread(target=lane, args=(idx, models[idx], token), name=f"Dispatch-{models[idx]}",
+                             daemon=True).start()
+
+        cancel.on_cancel(lambda: self._notify(cond))
+        with cond:
+            if models:
+                launch(0)
+            while True:
+                if state["result"] is not None or cancel.cancelled:
+                    break
+                winner = state["winner"]
+                if winner is not None and winner in failed:
+                    break  # The streaming model failed mid-response
+                all_failed = len(failed) == len(lanes)
+                if all_failed and len(lanes) == len(models):
+                    break
+
+                timeout = None
+                if winner is None and len(lanes) < len(models):
+                    current = len(lanes) - 1
+                    if all_failed:
+                        launch(len(lanes))  # Fallback after failure
+                        continue
+                    if started_at[current] is not None:
+                        # The budget runs from when the request was sent, not while it is queued
+                        remaining = started_at[current] + self.budget_for(models[current]) - time.monotonic()
+                        if remaining <= 0:
+                            launch(len(lanes))  # Hedge after the budget
+                            continue
+                        timeout = remaining
+                cond.wait(timeout)
+
+        if state["result"] is not None:
+            cancel_losers(state["winner"])
+            model, text = state["result"]
+            return model, text, len(lanes)
+        for token in lanes:
+            token.cancel()
+        if cancel.cancelled:
+            return "", "", len(lanes)
+        raise DispatchError(errors)
+
+    @staticmethod
+    def _notify(cond: threading.Condition) -> None:
+        with cond:
+            cond.notify_all()
@@ -0,0 +1,183 @@
+# file_classifier.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Decides which staged files are left out of the diff sent to the model: lockfiles,
+generated and vendored code, binaries and oversized files. Signals, in order:
+  1. Path globs (built-in lists plus the user's `exclude_globs`), matched anywhere in the tree.
+  2. numstat binary markers and changed-line counts.
+  3. .gitattributes: `linguist-generated`, `linguist-vendored` and `-diff` (or `binary`).
+  4. The size of the staged blob, which catches one-line minified files and data dumps.
+Globs and attributes are also expressed as git pathspecs, so git skips those files
+itself no matter how many there are.
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from cancellation import CancelToken
+
+LOCKFILE_GLOBS = [
+    "**/package-lock.json", "**/npm-shrinkwrap.json", "**/yarn.lock", "**/pnpm-lock.yaml",
+    "**/Cargo.lock", "**/go.sum", "**/composer.lock", "**/Gemfile.lock", "**/poetry.lock",
+    "**/Pipfile.lock", "**/uv.lock",
+]
+GENERATED_GLOBS = [
+    "**/*.min.js", "**/*.min.css", "**/*.js.map", "**/*.css.map", "**/*_pb2.py", "**/*_pb2_grpc.py",
+    "**/*.pb.go", "**/*.pb.cc", "**/*.pb.h", "**/*.snap", "**/__snapshots__/**",
+]
+VENDORED_GLOBS = ["**/node_modules/**", "**/vendor/**"]
+
+# Attribute checks, as (attribute, value that excludes, reason). "set" is a bare `attr`.
+ATTRIBUTE_RULES = [
+    ("linguist-generated", "set", "generated"),
+    ("linguist-generated", "true", "generated"),
+    ("linguist-vendored", "set", "vendored"),
+    ("linguist-vendored", "true", "vendored"),
+    ("diff", "unset", "no-diff"),   # `-diff`, also implied by the `binary` macro
+]
+
+DEFAULT_MAX_LINES = 5000               # Added + deleted lines
+DEFAULT_MAX_BYTES = 512 * 1024         # Size of the staged file
+
+
+def is_null_oid(oid: str) -> bool:
+    """The all-zero id git reports for a missing (deleted or unborn) blob, SHA-1 or SHA-256."""
+    return not oid.strip("0")
+
+
+def glob_to_regex(pattern: str) -> "re.Pattern":
+    """
+    Compiles a glob with git's `:(glob)` semantics: `*` and `?` stay within one path
+    component, `**/` matches any leading directories and `/**` everything below.
+    """
+    out = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("/.*")
+            i += 3
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return re.compile("".join(out) + r"\Z")
+
+
+_GENERATED_OR_VENDORED = [glob_to_regex(g) for g in GENERATED_GLOBS + VENDORED_GLOBS]
+
+
+def is_generated(path: str) -> bool:
+    """True for paths matching the built-in generated or vendored globs (also weighs packing)."""
+    return any(regex.match(path) for regex in _GENERATED_OR_VENDORED)
+
+
+class FileClassifier:
+    """
+    Classifies staged files as excluded (with a reason) or not.
+    `extra_globs` come from the `exclude_globs` setting and are reported as "excluded".
+    """
+
+    def __init__(self, extra_globs: List[str] = None, max_lines: int = DEFAULT_MAX_LINES,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.globs: List[Tuple[str, str]] = (
+            [(g, "lockfile") for g in LOCKFILE_GLOBS]
+            + [(g, "generated") for g in GENERATED_GLOBS]
+            + [(g, "vendored") for g in VENDORED_GLOBS]
+            + [(g, "excluded") for g in (extra_globs or [])]
+        )
+        self._compiled = [(glob_to_regex(g), reason) for g, reason in self.globs]
+
+    @property
+    def key(self) -> Tuple:
+        """Identity of the settings, so cached results are rebuilt when they change."""
+        return (tuple(self.globs), self.max_lines, self.max_bytes)
+
+    def exclude_pathspecs(self) -> List[str]:
+        """The glob and attribute rules as exclude pathspecs (a fixed count, however many files match)."""
+        specs = [f":(exclude,glob){g}" for g, _ in self.globs]
+        for attr, value, _ in ATTRIBUTE_RULES:
+            if value == "set":
+                specs.append(f":(exclude,attr:{attr})")
+            elif value == "unset":
+                specs.append(f":(exclude,attr:-{attr})")
+            else:
+                specs.append(f":(exclude,attr:{attr}={value})")
+        return specs
+
+    def match_glob(self, path: str) -> Optional[str]:
+        for regex, reason in self._compiled:
+            if regex.match(path):
+                return reason
+        return None
+
+    def classify(self, git, numstat: List[Tuple[str, str, str]], blob_oids: Dict[str, str] = None,
+                 cancel: CancelToken = None) -> Dict[str, str]:
+        """
+        Returns {path: reason} for the files to leave out of the diff. Reasons: "lockfile",
+        "generated", "vendored", "excluded" (user glob), "no-diff", "binary" and "too large".
+        `blob_oids` maps paths to their staged blob for the size check.
+        """
+        return self.classify_many(git, [(numstat, blob_oids or {})], cancel)[0]
+
+    def classify_many(self, git, changes: List[Tuple[List[Tuple[str, str, str]], Dict[str, str]]],
+                      cancel: CancelToken = None) -> List[Dict[str, str]]:
+        """
+        Classifies several change sets (e.g. every commit of a branch) with one attribute
+        lookup and one size lookup in total. `changes` holds (numstat, blob_oids) pairs.
+        """
+        results: List[Dict[str, str]] = []
+        pending: List[List[Tuple[str, str]]] = []   # Per change set: (path, blob oid) left to check
+
+        # 1-2. Path globs, then numstat: binary markers and changed-line counts
+        for numstat, blob_oids in changes:
+            excluded: Dict[str, str] = {}
+            remaining = []
+            for added, deleted, path in numstat:
+                reason = self.match_glob(path)
+                if reason is None and added == "-":
+                    reason = "binary"
+                if reason is None and int(added) + int(deleted) > self.max_lines:
+                    reason = "too large"
+                if reason:
+                    excluded[path] = reason
+                else:
+                    remaining.append((path, blob_oids.get(path)))
+            results.append(excluded)
+            pending.append(remaining)
+
+        paths = sorted({path for remaining in pending for path, _ in remaining})
+        if not paths:
+            return results
+
+        # 3-4. Attributes and blob sizes, read concurrently (one git process each)
+        oids = sorted({oid for remaining in pending for _, oid in remaining if oid and not is_null_oid(oid)})
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            f_attrs = pool.submit(git.check_attributes, paths, sorted({a for a, _, _ in ATTRIBUTE_RULES}),
+                                  cancel=cancel)
+            f_sizes = pool.submit(git.object_sizes, oids, cancel=cancel) if oids else None
+        attrs = f_attrs.result()
+        sizes = f_sizes.result() if f_sizes else {}
+
+        for excluded, remaining in zip(results, pending):
+            for path, oid in remaining:
+                values = attrs.get(path, {})
+                for attr, value, reason in ATTRIBUTE_RULES:
+                    if values.get(attr) == value:
+                        excluded[path] = reason
+                        break
+                else:
+                    if sizes.get(oid, 0) > self.max_bytes:
+                        excluded[path] = "too large"
+        return results
@@ -0,0 +1,119 @@
+# generation_cache.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Persistent cache of generated commit messages, stored beside the config file.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Union
+
+CACHE_FORMAT_VERSION = 1
+
+
+class GenerationCache:
+    """
+    LRU cache of generated messages keyed by a hash of everything that shaped them.
+    The whole index is held in memory so lookups never touch the disk; writes go
+    through an atomic rename. Entries are evicted by count, total size and age.
+    """
+
+    def __init__(self, path: str = None, max_entries: int = 500,
+                 max_bytes: int = 2 * 1024 * 1024, max_age_days: float = 30):
+        self.path = path or os.path.expanduser("~/.git-ai-commit-cache.json")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def make_key(diff_text: str, files: List[str], hint: str, model: str, prompt_version: Union[int, str]) -> str:
+        """Hashes the packed diff, file list, hint, model and system-prompt version."""
+        h = hashlib.sha256()
+        for part in (diff_text, "\0".join(files), hint or "", model or "", str(prompt_version)):
+            h.update(part.encode('utf-8', errors='surrogatepass'))
+            h.update(b"\0\1")  # Field separator so shifted boundaries can't collide
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached message, or None on a miss or an expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            now = time.time()
+            if now - entry["accessed"] > self.max_age:
+                self._remove(key)
+                return None
+            # Recency is updated in memory and persisted with the next write
+            entry["accessed"] = now
+            self._entries.move_to_end(key)
+            return entry["message"]
+
+    def put(self, key: str, message: str) -> None:
+        """Stores a message, evicts as needed and persists the cache."""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            now = time.time()
+            self._entries[key] = {"message": message, "created": now, "accessed": now}
+            self._size += len(message)
+            self._evict(now)
+            self._save()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._save()
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._size -= len(entry["message"])
+
+    def _evict(self, now: float) -> None:
+        """Drops expired entries, then least recently used ones until within limits."""
+        for key in [k for k, e in self._entries.items() if now - e["accessed"] > self.max_age]:
+            self._remove(key)
+        while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return
+        if data.get("version") != CACHE_FORMAT_VERSION:
+            return
+        entries = sorted(data.get("entries", {}).items(), key=lambda kv: kv[1].get("accessed", 0))
+        for key, entry in entries:
+            if isinstance(entry.get("message"), str):
+                self._entries[key] = entry
+                self._size += len(entry["message"])
+        self._evict(time.time())
+
+    def _save(self) -> None:
+        """Writes the cache atomically so a crash mid-write can't corrupt it."""
+        directory = os.path.dirname(self.path) or "."
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=".git-ai-commit-cache.", dir=directory)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"version": CACHE_FORMAT_VERSION, "entries": self._entries}, f)
+            os.replace(tmp_path, self.path)
+        except (IOError, OSError) as e:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            print(f"Error saving generation cache: {e}")
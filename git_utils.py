@@ -1,83 +1,619 @@
 # git_utils.py
-import tempfile # NEW IMPORT
+import hashlib
 import subprocess
+import threading
+import time
 import os
-from typing import List
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Dict, Tuple, Optional
+from cancellation import CancelToken
+from staged_diff import StagedDiff
+from token_service import BYTES_PER_TOKEN
+
+if TYPE_CHECKING:
+    from file_classifier import FileClassifier
+
+# Streaming engine defaults
+READ_CHUNK_SIZE = 64 * 1024
+STDERR_CAP_BYTES = 64 * 1024
+DEFAULT_TIMEOUT = 30.0
+DIFF_TIMEOUT = 60.0
+COMMIT_TIMEOUT = 120.0  # Leaves room for pre-commit hooks
+HISTORY_TIMEOUT = 600.0  # A first full history walk of a very large repo
+# `git diff` has no --pathspec-from-file, so long path lists are split over several runs
+# (Windows caps the whole command line at 32767 characters)
+MAX_PATHSPEC_CHARS = 24000
+
+
+class CommandResult:
+    """Structured outcome of a single git invocation."""
+
+    def __init__(self, args: List[str], returncode: Optional[int], output: bytes, stderr: bytes,
+                 truncated: bool, bytes_read: int, timed_out: bool, duration: float):
+        self.args = args
+        self.returncode = returncode
+        self.output = output
+        self.stderr = stderr
+        self.truncated = truncated      # True if the cap was hit and git was killed
+        self.bytes_read = bytes_read    # Bytes actually pulled from stdout
+        self.timed_out = timed_out
+        self.duration = duration
+
+    @property
+    def ok(self) -> bool:
+        """A truncated read is still usable; a failure or timeout is not."""
+        return not self.timed_out and (self.truncated or self.returncode == 0)
+
+    @property
+    def text(self) -> str:
+        return self.output.decode('utf-8', errors='replace').strip()
+
+
+def _pathspec_chars(paths: List[str]) -> int:
+    """Command-line length taken by `paths` as literal pathspecs."""
+    return sum(len(p) + len(":(exclude,literal) ") for p in paths)
+
+
+def _split_paths(paths: List[str]) -> List[List[str]]:
+    """Splits `paths` into batches that each fit one command line."""
+    batches: List[List[str]] = [[]]
+    size = 0
+    for path in paths:
+        cost = len(path) + len(":(literal) ")
+        if batches[-1] and size + cost > MAX_PATHSPEC_CHARS:
+            batches.append([])
+            size = 0
+        batches[-1].append(path)
+        size += cost
+    return batches
+
+
+class RepoSnapshot:
+    """
+    Immutable view of the staged state, gathered in one batched pass.
+    Keyed on the index contents and HEAD so repeated loads can reuse it.
+    """
+
+    def __init__(self, index_fingerprint: str, head_oid: str, name_status: List[Tuple[str, str]],
+                 numstat: List[Tuple[str, str, str]], diff: StagedDiff, history: str,
+                 diff_truncated: bool = False, diff_bytes_read: int = 0, git_commands: List[Dict] = None,
+                 excluded: Dict[str, str] = None, blob_oids: Dict[str, Tuple[str, str]] = None,
+                 diff_error: Optional[str] = None):
+        self.index_fingerprint = index_fingerprint
+        self.head_oid = head_oid
+        self.name_status = name_status   # [(status, path)]
+        self.numstat = numstat           # [(added, deleted, path)], '-' for binaries
+        self.blob_oids = blob_oids or {} # {path: (HEAD blob, staged blob)}; zeros when absent
+        self.excluded = excluded or {}   # {path: reason} left out of the diff by the classifier
+        self.diff = diff                 # Parsed once; consumers read slices of its buffer
+        self.history = history
+        self.diff_truncated = diff_truncated    # The byte cap was hit while streaming the diff
+        self.diff_error = diff_error            # Why reading the diff failed (the diff is then empty)
+        self.diff_bytes_read = diff_bytes_read
+        self.git_commands = git_commands or []  # [{"cmd", "ms", "bytes"}] of the build, for tracing
+
+    @property
+    def files(self) -> List[str]:
+        return [path for _, path in self.name_status]
+
+    @property
+    def diff_text(self) -> str:
+        """The whole diff decoded (a full copy; prefer reading slices of `diff`)."""
+        return self.diff.text(0, len(self.diff)).strip()
+
 
 class GitManager:
     def __init__(self, repo_path: str = None):
         self.repo_path = repo_path or os.getcwd()
+        # Alternate index (GIT_INDEX_FILE), e.g. the temporary one `git commit -a` hands to its hooks
+        self.index_file: Optional[str] = None
+
+        # Snapshot cache (see get_snapshot)
+        self._git_dir: Optional[str] = None
+        self._snapshot: Optional[RepoSnapshot] = None
+        self._snapshot_stat_key: Optional[Tuple] = None
+        self._snapshot_options: Optional[Tuple] = None
+        self._snapshot_lock = threading.Lock()
 
     def set_repo_path(self, path: str) -> bool:
         """Sets the working directory and verifies it is a git repo."""
         if os.path.isdir(path) and os.path.exists(os.path.join(path, ".git")):
+            if os.path.abspath(path) != os.path.abspath(self.repo_path):
+                self.invalidate_snapshot()
+                self._git_dir = None
             self.repo_path = path
             return True
         return False
 
-    def _run_command(self, command: str) -> str:
-        """Runs a shell command in the repo context and returns output."""
+    def _run(self, args: List[str], max_bytes: int = None, max_tokens: int = None,
+             timeout: float = DEFAULT_TIMEOUT, input_data: bytes = None,
+             cancel: CancelToken = None) -> CommandResult:
+        """
+        Runs `git <args>` in the repo context, streaming stdout in chunks.
+        Reading stops (and git is killed) once max_bytes, or max_tokens converted
+        via BYTES_PER_TOKEN, is exceeded. The process is also killed after `timeout`
+        seconds or when `cancel` is cancelled.
+        """
+        if max_tokens is not None:
+            token_cap = max_tokens * BYTES_PER_TOKEN
+            max_bytes = token_cap if max_bytes is None else min(max_bytes, token_cap)
+
+        cmd = ["git", *args]
+        start = time.perf_counter()
         try:
-            result = subprocess.check_output(
-                command, 
-                shell=True, 
-                cwd=self.repo_path, 
-                stderr=subprocess.STDOUT
+            proc = subprocess.Popen(
+                cmd,
+                cwd=self.repo_path,
+                env={**os.environ, "GIT_INDEX_FILE": self.index_file} if self.index_file else None,
+                stdin=subprocess.PIPE if input_data is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                # Avoid flashing console windows from the --noconsole build on Windows
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
             )
-            return result.decode('utf-8').strip()
-        except subprocess.CalledProcessError:
-            return ""
+        except OSError as e:
+            return CommandResult(cmd, None, b"", str(e).encode(), False, 0, False, 0.0)
+
+        if cancel is not None:
+            cancel.on_cancel(proc.kill)
+
+        timed_out = threading.Event()
+
+        def on_timeout():
+            timed_out.set()
+            proc.kill()
+
+        watchdog = threading.Timer(timeout, on_timeout) if timeout else None
+        if watchdog:
+            watchdog.daemon = True
+            watchdog.start()
+
+        # Drain stderr (bounded) and feed stdin on helper threads so pipes never deadlock
+        stderr_chunks: List[bytes] = []
+
+        def drain_stderr():
+            size = 0
+            for chunk in iter(lambda: proc.stderr.read1(READ_CHUNK_SIZE), b""):
+                if size < STDERR_CAP_BYTES:
+                    stderr_chunks.append(chunk[:STDERR_CAP_BYTES - size])
+                    size += len(chunk)
+
+        def feed_stdin():
+            try:
+                proc.stdin.write(input_data)
+                proc.stdin.close()
+            except OSError:
+                pass
+
+        helpers = [threading.Thread(target=drain_stderr, daemon=True)]
+        if input_data is not None:
+            helpers.append(threading.Thread(target=feed_stdin, daemon=True))
+        for t in helpers:
+            t.start()
+
+        chunks: List[bytes] = []
+        bytes_read = 0
+        truncated = False
+        try:
+            while True:
+                chunk = proc.stdout.read1(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                bytes_read += len(chunk)
+                if max_bytes is not None and bytes_read > max_bytes:
+                    # Keep what fits and stop git from producing the rest
+                    chunks.append(chunk[:len(chunk) - (bytes_read - max_bytes)])
+                    truncated = True
+                    proc.kill()
+                    break
+                chunks.append(chunk)
+        finally:
+            proc.stdout.close()
+            returncode = proc.wait()
+            if watchdog:
+                watchdog.cancel()
+            for t in helpers:
+                t.join(timeout=1.0)
+            proc.stderr.close()
+
+        return CommandResult(
+            cmd, returncode, b"".join(chunks), b"".join(stderr_chunks),
+            truncated, bytes_read, timed_out.is_set(), time.perf_counter() - start
+        )
+
+    def _run_text(self, args: List[str], **kwargs) -> str:
+        """Convenience wrapper: stripped stdout on success, empty string otherwise."""
+        result = self._run(args, **kwargs)
+        return result.text if result.ok else ""
+
+    def _get_git_dir(self) -> str:
+        """Resolves (and caches) the .git directory, which may live elsewhere for worktrees."""
+        if self._git_dir is None:
+            git_dir = self._run_text(["rev-parse", "--git-dir"])
+            self._git_dir = os.path.join(self.repo_path, git_dir) if git_dir else os.path.join(self.repo_path, ".git")
+        return self._git_dir
+
+    @property
+    def git_dir(self) -> str:
+        return self._get_git_dir()
+
+    def index_stat_key(self) -> Optional[Tuple]:
+        """
+        Cheap identity of the index and HEAD based on file stats only (no subprocess).
+        Returns None if the files cannot be inspected. Also polled by RepoWatcher.
+        """
+        git_dir = self._get_git_dir()
+        try:
+            index = os.stat(self.index_file or os.path.join(git_dir, "index"))
+            head_path = os.path.join(git_dir, "HEAD")
+            with open(head_path, 'r', encoding='utf-8') as f:
+                head = f.read().strip()
+            # Follow a symbolic HEAD to its loose ref (or packed-refs) so new commits change the key
+            ref_stat = None
+            if head.startswith("ref: "):
+                ref_path = os.path.join(git_dir, head[5:])
+                if not os.path.exists(ref_path):
+                    ref_path = os.path.join(git_dir, "packed-refs")
+                if os.path.exists(ref_path):
+                    st = os.stat(ref_path)
+                    ref_stat = (st.st_mtime_ns, st.st_size)
+            return (index.st_mtime_ns, index.st_size, index.st_ino, head, ref_stat)
+        except OSError:
+            return None
+
+    def index_fingerprint(self, cancel: CancelToken = None) -> str:
+        """
+        Hash of the staged entries (mode, blob, stage, path) without their stat data, so an
+        index rewritten by `git status` keeps its fingerprint. Read-only, unlike `git write-tree`,
+        which would store a tree object on every change. Empty string if git fails.
+        """
+        result = self._run(["ls-files", "--stage", "-z"], timeout=DIFF_TIMEOUT, cancel=cancel)
+        return hashlib.sha1(result.output).hexdigest() if result.ok and not result.truncated else ""
+
+    def invalidate_snapshot(self) -> None:
+        """Drops the cached snapshot so the next get_snapshot rebuilds it."""
+        with self._snapshot_lock:
+            self._snapshot = None
+            self._snapshot_stat_key = None
+
+    def get_snapshot(self, exclude_files: List[str] = None, history_n: int = 10,
+                     diff_max_bytes: int = None, cancel: CancelToken = None,
+                     classifier: "FileClassifier" = None) -> RepoSnapshot:
+        """
+        Returns the staged state (name-status, numstat, diff and log) gathered concurrently.
+        With a `classifier`, the files it excludes are left out of the diff (see file_classifier.py).
+        The result is reused until the index or HEAD actually changes:
+          1. If the index/HEAD stats are unchanged, the cached snapshot is returned as-is.
+          2. Otherwise the index fingerprint (see index_fingerprint) and HEAD are compared,
+             since tools like `git status` touch the index without changing its contents.
+        Safe to call from several threads; a cancelled or failed build is returned but never cached.
+        """
+        with self._snapshot_lock:
+            options = (tuple(exclude_files or ()), classifier.key if classifier else None, history_n, diff_max_bytes)
+            stat_key = self.index_stat_key()
+
+            cached = self._snapshot
+            if cached and options == self._snapshot_options:
+                if stat_key is not None and stat_key == self._snapshot_stat_key:
+                    return cached
+
+            fingerprint = self.index_fingerprint(cancel=cancel)
+            head_oid = self._run_text(["rev-parse", "--verify", "-q", "HEAD"], cancel=cancel)
+            if cached and options == self._snapshot_options and fingerprint \
+                    and (fingerprint, head_oid) == (cached.index_fingerprint, cached.head_oid):
+                self._snapshot_stat_key = stat_key
+                return cached
+
+            snapshot = self._build_snapshot(fingerprint, head_oid, list(options[0]), history_n, diff_max_bytes, cancel,
+                                            classifier)
+            if (cancel is not None and cancel.cancelled) or snapshot.diff_error:
+                return snapshot
+
+            self._snapshot = snapshot
+            self._snapshot_stat_key = stat_key
+            self._snapshot_options = options
+            return snapshot
+
+    def _build_snapshot(self, index_fingerprint: str, head_oid: str, exclude_files: List[str], history_n: int,
+                        diff_max_bytes: int = None, cancel: CancelToken = None,
+                        classifier: "FileClassifier" = None) -> RepoSnapshot:
+        """
+        Runs the independent git reads in parallel and assembles a RepoSnapshot.
+        With a classifier the diff waits for the file list, since what it excludes depends on it.
+        """
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            f_raw = pool.submit(self._run, ["diff", "--cached", "--raw", "--no-abbrev", "--no-renames", "-z"],
+                                cancel=cancel)
+            f_numstat = pool.submit(self._run, ["diff", "--cached", "--numstat", "--no-renames", "-z"],
+                                    cancel=cancel)
+            f_history = pool.submit(self._run, self._history_args(history_n), cancel=cancel)
+            f_diff = None
+            if classifier is None:
+                f_diff = pool.submit(self.read_staged_diff, exclude_files, max_bytes=diff_max_bytes, cancel=cancel)
+
+            # -z output: ":<old mode> <new mode> <old oid> <new oid> <status>\0<path>\0" pairs
+            name_status = []
+            blob_oids = {}
+            base_oids = {}
+            raw = f_raw.result()
+            if raw.ok:
+                fields = raw.output.decode('utf-8', errors='replace').split("\0")
+                for meta, path in zip(fields[0::2], fields[1::2]):
+                    parts = meta.split()
+                    if path and len(parts) == 5:
+                        name_status.append((parts[4], path))
+                        blob_oids[path] = parts[3]
+                        base_oids[path] = parts[2]
+
+            # -z output: "<added>\t<deleted>\t<path>\0" records
+            numstat = []
+            result = f_numstat.result()
+            if result.ok:
+                for record in result.output.decode('utf-8', errors='replace').split("\0"):
+                    parts = record.split("\t", 2)
+                    if len(parts) == 3:
+                        numstat.append((parts[0], parts[1], parts[2]))
+
+            excluded: Dict[str, str] = {}
+            classify_ms = 0.0
+            if classifier is not None:
+                start = time.perf_counter()
+                excluded = classifier.classify(self, numstat, blob_oids, cancel=cancel)
+                classify_ms = (time.perf_counter() - start) * 1000
+                # Glob and attribute matches are covered by the classifier's pathspecs; only
+                # per-file decisions (binary, size) need their own exclusions
+                literal = sorted(set(exclude_files) | {p for p, r in excluded.items() if r in ("binary", "too large")})
+                f_diff = pool.submit(self.read_staged_diff, literal, max_bytes=diff_max_bytes, cancel=cancel,
+                                     exclude_pathspecs=classifier.exclude_pathspecs())
+
+        diff = f_diff.result()
+        staged = StagedDiff(diff.output if diff.ok else b"", complete=not diff.truncated)
+        diff_error = None
+        if not diff.ok:
+            diff_error = "timed out" if diff.timed_out else \
+                diff.stderr.decode('utf-8', errors='replace').strip() or f"exit code {diff.returncode}"
+        history = f_history.result()
+
+        git_commands = [
+            {"cmd": label, "ms": round(r.duration * 1000, 2), "bytes": r.bytes_read}
+            for label, r in (("raw", raw), ("numstat", result), ("diff", diff), ("log", history))
+        ]
+        if classifier is not None:
+            git_commands.append({"cmd": "classify", "ms": round(classify_ms, 2), "bytes": 0})
+        return RepoSnapshot(index_fingerprint, head_oid, name_status, numstat, staged, history.text if history.ok else "",
+                            diff_truncated=diff.truncated, diff_bytes_read=diff.bytes_read, git_commands=git_commands,
+                            excluded=excluded,
+                            blob_oids={path: (base_oids[path], oid) for path, oid in blob_oids.items()},
+                            diff_error=diff_error)
 
     def get_staged_files(self) -> List[str]:
         """Returns a list of filenames currently staged for commit."""
-        output = self._run_command("git diff --cached --name-only")
-        if not output:
+        result = self._run(["diff", "--cached", "--name-only", "-z"])
+        if not result.ok:
             return []
-        return output.splitlines()
+        return [path for path in result.output.decode('utf-8', errors='replace').split("\0") if path]
 
-    def get_staged_diff(self, exclude_files: List[str] = None) -> str:
+    def _staged_diff_args(self, exclude_files: List[str] = None, paths: List[str] = None,
+                          exclude_pathspecs: List[str] = None) -> List[str]:
         """
-        Returns the diff. Supports excluding specific files via git pathspecs.
-        Example: git diff --cached -- . ":!package-lock.json"
+        Builds the argv for the staged diff. `paths` restricts it to literal paths;
+        `exclude_files` are excluded as literal paths and `exclude_pathspecs` as given.
+        Paths stay unquoted (core.quotePath=false) so `diff --git` headers match numstat paths.
+        Example: git -c core.quotePath=false diff --cached -- . ":(exclude,literal)package-lock.json"
         """
-        cmd = ["git", "diff", "--cached", "--", "."]
-        
+        args = ["-c", "core.quotePath=false", "diff", "--cached", "--"]
+        if paths:
+            args.extend(f":(literal){path}" for path in paths)
+        else:
+            args.append(".")
         if exclude_files:
-            for file in exclude_files:
-                # Git pathspec to exclude a file is ":!filename"
-                cmd.append(f":!{file}")
+            args.extend(f":(exclude,literal){file}" for file in exclude_files)
+        if exclude_pathspecs:
+            args.extend(exclude_pathspecs)
+        return args
+
+    def read_staged_diff(self, exclude_files: List[str] = None, paths: List[str] = None,
+                         max_bytes: int = None, cancel: CancelToken = None,
+                         exclude_pathspecs: List[str] = None) -> CommandResult:
+        """
+        Streams the staged diff, returning the structured result (see `truncated`).
+        Path lists too long for one command line are read in consecutive runs (in path
+        order) until `max_bytes` is reached; many exclusions become an explicit path list.
+        If any run fails, that run's (not ok) result is returned instead of a partial diff.
+        """
+        exclude_files = exclude_files or []
+        if not paths and _pathspec_chars(exclude_files) > MAX_PATHSPEC_CHARS:
+            skipped = set(exclude_files)
+            paths = [path for path in self.get_staged_files() if path not in skipped]
+            exclude_files = []
+            if not paths:
+                return CommandResult(["git", "diff", "--cached"], 0, b"", b"", False, 0, False, 0.0)
+
+        batches = _split_paths(paths) if paths else [None]
+        results: List[CommandResult] = []
+        remaining = max_bytes
+        for batch in batches:
+            result = self._run(self._staged_diff_args(exclude_files, batch, exclude_pathspecs), max_bytes=remaining,
+                               timeout=DIFF_TIMEOUT, cancel=cancel)
+            if not result.ok:
+                # A failed run is an error, not a truncated read: the diff would silently lack its files
+                return result
+            results.append(result)
+            if remaining is not None:
+                remaining -= result.bytes_read
+            if result.truncated or (remaining is not None and remaining <= 0) \
+                    or (cancel is not None and cancel.cancelled):
+                break
+        if len(results) == 1:
+            return results[0]
+
+        # One combined result, as if a single git call had produced it
+        last = results[-1]
+        return CommandResult(
+            results[0].args, last.returncode, b"".join(r.output for r in results), last.stderr,
+            any(r.truncated for r in results) or len(results) < len(batches), sum(r.bytes_read for r in results),
+            any(r.timed_out for r in results), sum(r.duration for r in results)
+        )
+
+    def get_staged_diff(self, exclude_files: List[str] = None, max_bytes: int = None,
+                        exclude_pathspecs: List[str] = None) -> str:
+        """
+        Returns the diff. Supports excluding specific files and pathspec patterns
+        (e.g. FileClassifier.exclude_pathspecs()); see _staged_diff_args.
+        Output beyond max_bytes is never read; git is killed instead.
+        """
+        result = self.read_staged_diff(exclude_files, max_bytes=max_bytes, exclude_pathspecs=exclude_pathspecs)
+        return result.text if result.ok else ""
 
-        # specific join for list command
-        full_cmd = " ".join(cmd)
-        return self._run_command(full_cmd)
+    def check_attributes(self, paths: List[str], attrs: List[str],
+                         cancel: CancelToken = None) -> Dict[str, Dict[str, str]]:
+        """
+        Looks up .gitattributes for many paths in one call. Returns {path: {attr: value}}
+        for attributes that are specified, where value is "set", "unset" or the assigned value.
+        """
+        if not paths:
+            return {}
+        result = self._run(["check-attr", "-z", "--stdin", *attrs],
+                           input_data="\0".join(paths).encode('utf-8') + b"\0", cancel=cancel)
+        found: Dict[str, Dict[str, str]] = {}
+        if not result.ok:
+            return found
+        # -z output: "<path>\0<attr>\0<value>\0" triples
+        fields = result.output.decode('utf-8', errors='replace').split("\0")
+        for path, attr, value in zip(fields[0::3], fields[1::3], fields[2::3]):
+            if value != "unspecified":
+                found.setdefault(path, {})[attr] = value
+        return found
+
+    def object_sizes(self, oids: List[str], cancel: CancelToken = None) -> Dict[str, int]:
+        """Sizes in bytes of the given objects (e.g. staged blobs), read in one call."""
+        if not oids:
+            return {}
+        result = self._run(["cat-file", "--batch-check=%(objectname) %(objectsize)"],
+                           input_data="\n".join(oids).encode() + b"\n", cancel=cancel)
+        sizes: Dict[str, int] = {}
+        if result.ok:
+            for line in result.output.decode('utf-8', errors='replace').splitlines():
+                oid, _, size = line.partition(" ")
+                if size.isdigit():
+                    sizes[oid] = int(size)
+        return sizes
+
+    @staticmethod
+    def _history_args(n: int, rev: str = None) -> List[str]:
+        return ["log", "-n", str(n), "--pretty=format:%ad - %s", *([rev] if rev else [])]
+
+    def get_recent_history(self, n: int = 10, cancel: CancelToken = None, rev: str = None) -> str:
+        """Returns the last n commit messages (of HEAD, or of `rev`) for context."""
+        return self._run_text(self._history_args(n, rev), cancel=cancel)
+
+    def read_history_log(self, head_oid: str, exclude: List[str] = None, log_format: str = "%H %s",
+                         cancel: CancelToken = None) -> CommandResult:
+        """
+        Non-merge commits reachable from `head_oid` but not from any `exclude` commit, newest
+        first, each followed by the paths it touched. Excluded commits that no longer exist
+        (e.g. after a rebase and gc) are ignored.
+        """
+        args = ["-c", "core.quotePath=false", "log", "--no-merges", "--name-only", f"--format={log_format}",
+                "--ignore-missing", head_oid]
+        if exclude:
+            args.extend(["--not", *exclude])
+        return self._run(args, timeout=HISTORY_TIMEOUT, cancel=cancel)
+
+    # --- Commit ranges and history rewriting ---
+
+    def resolve_branch(self, name: str = "HEAD") -> Tuple[str, str]:
+        """Returns (full ref name, commit oid) of a branch, or of the branch HEAD points to."""
+        ref = self._run_text(["rev-parse", "--symbolic-full-name", name])
+        oid = self._run_text(["rev-parse", "--verify", "-q", f"{name}^{{commit}}"])
+        return ref, oid
+
+    def read_range_log(self, base: str, tip: str, cancel: CancelToken = None) -> CommandResult:
+        """
+        Commits in base..tip, parents before children, each as "\x1e<oid> <parents>"
+        followed by its --raw and --numstat entries (-z: NUL-terminated, paths never quoted;
+        full blob ids, no rename detection). See branch_rewrite.parse_range_log.
+        """
+        return self._run(["log", "--reverse", "--topo-order", "--raw", "--numstat", "-z",
+                          "--no-abbrev", "--no-renames", "--format=%x1e%H %P", f"{base}..{tip}"],
+                         timeout=HISTORY_TIMEOUT, cancel=cancel)
+
+    def range_oids(self, base: str, tip: str, cancel: CancelToken = None) -> Optional[List[str]]:
+        """Commit ids of base..tip in read_range_log's order (parents first), or None if git fails."""
+        result = self._run(["rev-list", "--reverse", "--topo-order", f"{base}..{tip}"],
+                           timeout=HISTORY_TIMEOUT, cancel=cancel)
+        return result.text.split() if result.ok else None
 
-    def get_recent_history(self, n: int = 10) -> str:
-        """Returns the last n commit messages for context."""
-        return self._run_command(f'git log -n {n} --pretty=format:"%ad - %s"')
+    def read_commit_diff(self, oid: str, exclude_files: List[str] = None, exclude_pathspecs: List[str] = None,
+                         max_bytes: int = None, cancel: CancelToken = None) -> CommandResult:
+        """A commit's patch against its first parent (or the empty tree for a root commit)."""
+        literal = []
+        size = 0
+        for path in exclude_files or []:
+            # Past the command-line limit remaining files are left to the diff packer
+            size += len(path) + len(":(exclude,literal) ")
+            if size > MAX_PATHSPEC_CHARS:
+                break
+            literal.append(f":(exclude,literal){path}")
+        args = ["-c", "core.quotePath=false", "diff-tree", "-p", "-r", "--root", "--no-commit-id", "--no-renames", oid, "--", ".",
+                *literal, *(exclude_pathspecs or [])]
+        return self._run(args, max_bytes=max_bytes, timeout=DIFF_TIMEOUT, cancel=cancel)
+
+    def read_objects(self, oids: List[str], cancel: CancelToken = None) -> Dict[str, bytes]:
+        """Raw contents of many objects, read in one `git cat-file --batch` call."""
+        if not oids:
+            return {}
+        result = self._run(["cat-file", "--batch"], input_data="\n".join(oids).encode() + b"\n",
+                           timeout=HISTORY_TIMEOUT, cancel=cancel)
+        objects: Dict[str, bytes] = {}
+        if not result.ok:
+            return objects
+        # Each object: "<oid> <type> <size>\n<content>\n"
+        data = result.output
+        pos = 0
+        while pos < len(data):
+            header_end = data.index(b"\n", pos)
+            fields = data[pos:header_end].decode().split()
+            if len(fields) != 3:  # "<oid> missing"
+                pos = header_end + 1
+                continue
+            size = int(fields[2])
+            objects[fields[0]] = data[header_end + 1:header_end + 1 + size]
+            pos = header_end + 1 + size + 1
+        return objects
+
+    def write_objects(self, kind: str, payloads: List[bytes], cancel: CancelToken = None) -> List[str]:
+        """Writes many objects of one type in a single `git hash-object` call; returns their oids."""
+        if not payloads:
+            return []
+        with tempfile.TemporaryDirectory(prefix="git-ai-commit-") as tmp:
+            paths = []
+            for idx, payload in enumerate(payloads):
+                path = os.path.join(tmp, str(idx))
+                with open(path, 'wb') as f:
+                    f.write(payload)
+                paths.append(path)
+            result = self._run(["hash-object", "-t", kind, "-w", "--no-filters", "--stdin-paths"],
+                               input_data="\n".join(paths).encode('utf-8') + b"\n", timeout=HISTORY_TIMEOUT,
+                               cancel=cancel)
+        return result.text.splitlines() if result.ok else []
+
+    def object_format(self) -> str:
+        """The repository's hash algorithm ("sha1" or "sha256")."""
+        return self._run_text(["rev-parse", "--show-object-format"]) or "sha1"
+
+    def update_ref(self, ref: str, new_oid: str, old_oid: str, message: str) -> bool:
+        """Moves `ref` to `new_oid` only if it still points at `old_oid` (recorded in the reflog)."""
+        return self._run(["update-ref", "-m", message, ref, new_oid, old_oid]).ok
 
     def commit_with_message(self, message: str) -> str:
         """
         Commits staged changes using the provided message.
-        Uses a temp file to handle special characters/newlines safely.
+        The message is piped via stdin (-F -) so special characters/newlines are safe.
         """
-        # Create a temporary file to store the commit message
-        with tempfile.NamedTemporaryFile(mode='w+', delete=False, encoding='utf-8') as tf:
-            tf.write(message)
-            tf_path = tf.name
-
-        try:
-            # Use -F to read message from file
-            # usage of shell=True in _run_command requires careful string handling,
-            # so we manually construct the command string with the file path.
-            cmd = f'git commit -F "{tf_path}"'
-            result = self._run_command(cmd)
-            return result
-        finally:
-            # Cleanup temp file
-            if os.path.exists(tf_path):
-                os.remove(tf_path)
-        pass # placeholder for context
+        return self._run_text(["commit", "-F", "-"], input_data=message.encode('utf-8'), timeout=COMMIT_TIMEOUT)
 
     def stage_all_files(self) -> str:
         """Stages all modified and new files (git add .)."""
-        return self._run_command("git add .")
+        return self._run_text(["add", "."], timeout=COMMIT_TIMEOUT)
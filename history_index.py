@@ -0,0 +1,292 @@
+# history_index.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Local, incrementally updated index of a repository's commit history (SQLite, kept in
+the .git directory). It maps touched files and their parent directories to commits so
+the past commits most relevant to the staged paths can be looked up in milliseconds,
+even on very large histories. Only commits not reachable from an already indexed tip
+are read from git on each update.
+"""
+
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cancellation import CancelToken
+
+INDEX_FORMAT_VERSION = 1
+INDEX_FILENAME = "git-ai-commit-history.sqlite"
+
+BATCH_COMMITS = 2000            # Commits per write transaction while ingesting
+MAX_PATHS_PER_COMMIT = 200      # Sweeping commits (reformatting, vendoring) only index their first paths
+MAX_TIPS = 20                   # Indexed tips remembered to bound the next `git log`
+MAX_QUERY_PATHS = 200           # Staged paths considered per lookup
+PER_KEY_LIMIT = 200             # Most recent commits read per file/directory key
+
+# Relevance of a past commit per matching key: the same file, then closer directories.
+# Each match is divided by sqrt(paths the commit touched), so sweeping commits don't dominate.
+FILE_WEIGHT = 3.0
+DIR_WEIGHTS = (2.0, 1.0, 0.5)   # Parent directory, grandparent, anything above
+
+CONVENTIONAL_RE = re.compile(r"^(\w+)(?:\(([^)]*)\))?!?:\s")
+
+# Commit header in `git log` output: record separator, then oid / author time / subject
+LOG_FORMAT = "%x1e%H%x1f%at%x1f%s"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS commits (
+    id INTEGER PRIMARY KEY,
+    oid TEXT UNIQUE NOT NULL,
+    ts INTEGER NOT NULL,
+    subject TEXT NOT NULL,
+    type TEXT,
+    scope TEXT
+);
+CREATE INDEX IF NOT EXISTS commits_ts ON commits (ts);
+CREATE TABLE IF NOT EXISTS keys (id INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS touches (
+    key_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    commit_id INTEGER NOT NULL,
+    breadth INTEGER NOT NULL,
+    PRIMARY KEY (key_id, ts, commit_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS tips (oid TEXT PRIMARY KEY, indexed_at INTEGER NOT NULL);
+"""
+
+
+def path_keys(path: str) -> List[Tuple[str, float]]:
+    """The index keys of a path with their weights: the file itself and each parent directory ("dir/")."""
+    keys = [(path, FILE_WEIGHT)]
+    parts = path.split("/")[:-1]
+    for depth in range(len(parts), 0, -1):
+        weight = DIR_WEIGHTS[min(len(parts) - depth, len(DIR_WEIGHTS) - 1)]
+        keys.append(("/".join(parts[:depth]) + "/", weight))
+    return keys
+
+
+def parse_subject(subject: str) -> Tuple[Optional[str], Optional[str]]:
+    """Conventional Commits type and scope of a subject line, if it follows the format."""
+    match = CONVENTIONAL_RE.match(subject)
+    if not match:
+        return None, None
+    return match.group(1).lower(), (match.group(2) or None)
+
+
+def parse_log(output: str) -> Iterable[Tuple[str, int, str, List[str]]]:
+    """Yields (oid, timestamp, subject, paths) from `git log --name-only --format=LOG_FORMAT`."""
+    for record in output.split("\x1e"):
+        if not record.strip():
+            continue
+        header, _, names = record.partition("\n")
+        fields = header.split("\x1f", 2)
+        if len(fields) != 3:
+            continue
+        oid, ts, subject = fields
+        paths = [line for line in names.splitlines() if line]
+        yield oid, int(ts or 0), subject, paths
+
+
+class RelatedCommit:
+    def __init__(self, oid: str, ts: int, subject: str, score: float):
+        self.oid = oid
+        self.ts = ts
+        self.subject = subject
+        self.score = score      # 0 for recent commits used to fill the list
+
+    def format(self) -> str:
+        return f"{time.strftime('%Y-%m-%d', time.localtime(self.ts))} - {self.subject}"
+
+
+class HistoryIndex:
+    """
+    One repository's history index. Lookups are safe from any thread; updates run on a
+    background thread (see `refresh`) and commit in batches, so lookups are never blocked
+    for long and an interrupted first build keeps what it ingested.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()           # Guards the shared read connection
+        self._conn: Optional[sqlite3.Connection] = None
+        self._update_thread: Optional[threading.Thread] = None
+        self._update_lock = threading.Lock()
+        self._indexed_head: Optional[str] = None
+
+    @classmethod
+    def for_git_dir(cls, git_dir: str) -> "HistoryIndex":
+        return cls(os.path.join(git_dir, INDEX_FILENAME))
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        # WAL lets lookups (and other app instances) read while an update writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != str(INDEX_FORMAT_VERSION):
+            # Unknown or older layout: start over rather than migrate
+            conn.executescript("DELETE FROM touches; DELETE FROM keys; DELETE FROM commits; DELETE FROM tips;")
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(INDEX_FORMAT_VERSION),))
+            conn.commit()
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = self._connect()
+        return self._conn
+
+    # --- Updating ---
+
+    def refresh(self, git, head_oid: str, wait: float = 0.0) -> bool:
+        """
+        Brings the index up to `head_oid` on a background thread, waiting up to `wait`
+        seconds for it. Returns True if the index covers `head_oid` when this returns.
+        Typical incremental updates (a few new commits) finish well within a short wait;
+        a first build of a large history keeps running and is used once it finishes.
+        """
+        if not head_oid:
+            return False
+        if head_oid == self._indexed_head:
+            return True
+        with self._update_lock:
+            if self._update_thread is None or not self._update_thread.is_alive():
+                self._update_thread = threading.Thread(
+                    target=self._update_safely, args=(git, head_oid), name="HistoryIndex", daemon=True
+                )
+                self._update_thread.start()
+            thread = self._update_thread
+        if wait > 0:
+            thread.join(wait)
+        return head_oid == self._indexed_head
+
+    def _update_safely(self, git, head_oid: str) -> None:
+        try:
+            self.update(git, head_oid)
+        except (sqlite3.Error, OSError) as e:
+            print(f"Error updating history index: {e}")
+
+    def update(self, git, head_oid: str, cancel: CancelToken = None) -> int:
+        """Ingests the commits reachable from `head_oid` but from no indexed tip. Returns how many."""
+        conn = self._connect()
+        try:
+            tips = [row[0] for row in conn.execute("SELECT oid FROM tips ORDER BY indexed_at DESC")]
+            if head_oid in tips:
+                self._indexed_head = head_oid
+                return 0
+
+            result = git.read_history_log(head_oid, exclude=tips, log_format=LOG_FORMAT, cancel=cancel)
+            if not result.ok or (cancel is not None and cancel.cancelled):
+                return 0
+
+            count = 0
+            batch = []
+            for entry in parse_log(result.output.decode('utf-8', errors='replace')):
+                batch.append(entry)
+                if len(batch) >= BATCH_COMMITS:
+                    count += self._ingest(conn, batch)
+                    batch = []
+            count += self._ingest(conn, batch)
+
+            # Remember the new tip; the next update only reads what came after it
+            now = int(time.time())
+            conn.execute("INSERT OR REPLACE INTO tips (oid, indexed_at) VALUES (?, ?)", (head_oid, now))
+            conn.execute(
+                "DELETE FROM tips WHERE oid NOT IN (SELECT oid FROM tips ORDER BY indexed_at DESC LIMIT ?)",
+                (MAX_TIPS,)
+            )
+            conn.commit()
+            self._indexed_head = head_oid
+            return count
+        finally:
+            conn.close()
+
+    def _ingest(self, conn: sqlite3.Connection, entries: List[Tuple[str, int, str, List[str]]]) -> int:
+        """Writes one batch of commits in a single transaction. Already indexed commits are skipped."""
+        if not entries:
+            return 0
+        key_ids: Dict[str, int] = {}
+        added = 0
+        with conn:
+            for oid, ts, subject, paths in entries:
+                commit_type, scope = parse_subject(subject)
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO commits (oid, ts, subject, type, scope) VALUES (?, ?, ?, ?, ?)",
+                    (oid, ts, subject, commit_type, scope)
+                )
+                if not cursor.rowcount:
+                    continue
+                added += 1
+                commit_id = cursor.lastrowid
+
+                breadth = max(1, len(paths))
+                keys = {key for path in paths[:MAX_PATHS_PER_COMMIT] for key, _ in path_keys(path)}
+                for key in keys:
+                    key_id = key_ids.get(key)
+                    if key_id is None:
+                        conn.execute("INSERT OR IGNORE INTO keys (key) VALUES (?)", (key,))
+                        key_id = conn.execute("SELECT id FROM keys WHERE key = ?", (key,)).fetchone()[0]
+                        key_ids[key] = key_id
+                    conn.execute("INSERT OR IGNORE INTO touches (key_id, ts, commit_id, breadth) VALUES (?, ?, ?, ?)",
+                                 (key_id, ts, commit_id, breadth))
+        return added
+
+    # --- Lookup ---
+
+    def related(self, paths: List[str], n: int = 10) -> List[RelatedCommit]:
+        """
+        The `n` past commits most relevant to `paths`: commits that touched the same files
+        score highest, then those in the same or nearby directories, with focused commits
+        ahead of sweeping ones; ties go to the most recent. Remaining slots are filled with the most recent commits.
+        """
+        weights: Dict[str, float] = {}
+        for path in paths[:MAX_QUERY_PATHS]:
+            for key, weight in path_keys(path):
+                weights[key] = max(weight, weights.get(key, 0.0))
+
+        with self._lock:
+            conn = self._reader()
+            scores: Dict[int, float] = {}
+            recency: Dict[int, int] = {}
+            for key, weight in weights.items():
+                row = conn.execute("SELECT id FROM keys WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    continue
+                # Bounded per key via the (key_id, ts) primary key, so hot directories stay cheap
+                for ts, commit_id, breadth in conn.execute(
+                        "SELECT ts, commit_id, breadth FROM touches WHERE key_id = ? ORDER BY ts DESC LIMIT ?",
+                        (row[0], PER_KEY_LIMIT)):
+                    scores[commit_id] = scores.get(commit_id, 0.0) + weight / math.sqrt(breadth)
+                    recency[commit_id] = ts
+
+            ranked = sorted(scores, key=lambda cid: (scores[cid], recency[cid]), reverse=True)[:n]
+            commits = []
+            if ranked:
+                placeholders = ",".join("?" * len(ranked))
+                rows = {row[0]: row[1:] for row in conn.execute(
+                    f"SELECT id, oid, ts, subject FROM commits WHERE id IN ({placeholders})", ranked)}
+                commits = [RelatedCommit(*rows[cid], scores[cid]) for cid in ranked if cid in rows]
+
+            if len(commits) < n:
+                seen = set(ranked)
+                for cid, oid, ts, subject in conn.execute(
+                        "SELECT id, oid, ts, subject FROM commits ORDER BY ts DESC LIMIT ?", (n + len(seen),)):
+                    if cid not in seen and len(commits) < n:
+                        commits.append(RelatedCommit(oid, ts, subject, 0.0))
+        return commits
+
+    def commit_count(self) -> int:
+        with self._lock:
+            return self._reader().execute("SELECT COUNT(*) FROM commits").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,128 @@
+# hook_client.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Thin `prepare-commit-msg` hook client for the generation daemon (daemon.py).
+It imports only the standard library and sends the repository (and the index git is
+committing from) over a Unix socket, so a hook costs little more than the generation.
+It never blocks a commit: on any failure the message file is left as git wrote it.
+
+Installed by `python cli.py install-hook`; git calls it as
+    hook_client.py <message file> [<source> [<commit>]]
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict
+
+HOOK_MARKER = "git-ai-commit prepare-commit-msg hook"
+
+# Overridable from the environment of the `git commit` call
+SOCKET_ENV = "GIT_AI_COMMIT_SOCKET"
+TIMEOUT_ENV = "GIT_AI_COMMIT_HOOK_TIMEOUT"
+HINT_ENV = "GIT_AI_COMMIT_HINT"
+SKIP_ENV = "GIT_AI_COMMIT_SKIP"
+
+DEFAULT_TIMEOUT_SEC = 30.0
+AUTOSTART_WAIT_SEC = 5.0      # How long a cold daemon gets to start listening
+
+# Message sources that already carry a message (-m/-F, merges, squashes, amends) are left alone
+GENERATE_SOURCES = ("", "template")
+
+# `commit -v` puts the diff below this line uncommented; git discards everything after it
+SCISSORS_LINE = "# ------------------------ >8 ------------------------"
+
+
+def has_message_text(existing: str) -> bool:
+    """True if the file holds anything but `#` comment lines (e.g. a commit template body)."""
+    for line in existing.splitlines():
+        if line == SCISSORS_LINE:
+            break
+        if line.strip() and not line.startswith("#"):
+            return True
+    return False
+
+
+def socket_path() -> str:
+    return os.environ.get(SOCKET_ENV) or os.path.expanduser("~/.git-ai-commit.sock")
+
+
+def request(payload: Dict[str, Any], timeout: float, path: str = None) -> Dict[str, Any]:
+    """Sends one request line and reads one response line. Raises OSError if the daemon is unreachable."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path or socket_path())
+        sock.sendall(json.dumps(payload).encode('utf-8') + b"\n")
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            if chunk.endswith(b"\n"):
+                break
+    return json.loads(b"".join(chunks).decode('utf-8'))
+
+
+def start_daemon() -> bool:
+    """Starts daemon.py detached from this process and waits briefly until it answers."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "daemon.py")
+    subprocess.Popen([sys.executable, script], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, start_new_session=True)
+    deadline = time.monotonic() + AUTOSTART_WAIT_SEC
+    while time.monotonic() < deadline:
+        try:
+            return request({"op": "ping"}, 1.0).get("ok", False)
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def main(argv) -> int:
+    if len(argv) < 2 or not hasattr(socket, "AF_UNIX") or os.environ.get(SKIP_ENV):
+        return 0
+    message_file = argv[1]
+    source = argv[2] if len(argv) > 2 else ""
+    if source not in GENERATE_SOURCES:
+        return 0
+    with open(message_file, 'r', encoding='utf-8', errors='replace') as f:
+        existing = f.read()
+    # A template body would end up in the commit below the message; leave it to the user
+    if has_message_text(existing):
+        return 0
+
+    # 1. Git runs hooks from the top of the work tree; `commit -a` and `commit <paths>` use their own index
+    payload = {"op": "generate", "repo": os.getcwd(), "hint": os.environ.get(HINT_ENV, "")}
+    index_file = os.environ.get("GIT_INDEX_FILE")
+    if index_file:
+        payload["index_file"] = os.path.abspath(index_file)
+
+    # 2. Ask the daemon, starting it if it is not running yet
+    timeout = float(os.environ.get(TIMEOUT_ENV) or DEFAULT_TIMEOUT_SEC)
+    try:
+        try:
+            response = request(payload, timeout)
+        except (FileNotFoundError, ConnectionRefusedError):
+            if not start_daemon():
+                print("git-ai-commit: daemon did not start; write the message yourself.", file=sys.stderr)
+                return 0
+            response = request(payload, timeout)
+    except (OSError, ValueError) as e:
+        print(f"git-ai-commit: no message generated ({e}).", file=sys.stderr)
+        return 0
+    if not response.get("ok"):
+        print(f"git-ai-commit: {response.get('error', 'no message generated')}", file=sys.stderr)
+        return 0
+
+    # 3. Put the message above the comments git wrote (status, verbose diff)
+    with open(message_file, 'w', encoding='utf-8') as f:
+        f.write(response["message"].strip() + "\n" + ("\n" + existing if existing.strip() else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
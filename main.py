@@ -5,6 +5,10 @@
 The main entry point and GUI implementation using CustomTkinter.
 """
 
+import time
+_PROCESS_START = time.perf_counter()  # Before the heavier imports below, for startup measurement
+
+import json
 import os
 import sys
 import threading
@@ -12,10 +16,19 @@ import webbrowser
 import customtkinter as ctk
 import tkinter.filedialog as filedialog
 from app_logic import AppLogic
+from cancellation import CancelToken
+from diff_viewer import DiffViewer
+from repo_watcher import RepoWatcher
+from speculation import SpeculativeGenerator
+from tracing import Trace
 
 # --- CONFIGURATION ---
 APP_VERSION = "v1.0.0"
 BUY_ME_COFFEE_URL = "https://www.buymeacoffee.com/philipquicz"
+STREAM_FLUSH_MS = 50  # Batch streamed tokens into the textbox at most this often
+REFRESH_DEBOUNCE_MS = 250  # Coalesce bursts of refresh requests (e.g. several index writes)
+WATCH_INTERVAL_SEC = 0.5  # How often .git/index and HEAD are polled for changes
+STARTUP_TARGET_SEC = 1.0  # Target for the window to appear; check with `python main.py --measure-startup`
 
 # Theme Configuration
 ctk.set_appearance_mode("Dark")
@@ -32,9 +45,14 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 class GitAICommitApp(ctk.CTk):
-    def __init__(self):
+    def __init__(self, measure_startup=False):
         super().__init__()
         self.logic = AppLogic()
+        # Opt-in background generation of the staged change's message (speculative_generation)
+        self.speculator = SpeculativeGenerator(self.logic)
+        self.measure_startup = measure_startup
+        self._startup_times = {}
+        self.startup_exit_code = 0
 
         # Window Setup
         self.title(f"GitAI Commit - {APP_VERSION}")
@@ -54,13 +72,31 @@ class GitAICommitApp(ctk.CTk):
         self.var_api_key = ctk.StringVar(value=self.logic.config.get("api_key"))
         self.var_model = ctk.StringVar(value=self.logic.config.get("selected_model"))
         self.var_repo_path = ctk.StringVar(value=self.logic.config.get("last_repo_path"))
+
+        # Streaming generation state
+        self._generation_token = None
+        self._stream_buffer = []
+        self._stream_started = False
+
+        # Background refresh state
+        self._refresh_token = None
+        self._refresh_after_id = None
         
         self.create_sidebar()
         self.create_main_area()
         
-        # Initial Data Load
+        # Initial Data Load (runs in the background; the window is shown first)
+        self.after_idle(self._on_window_shown)
         self.refresh_data()
 
+        # Refresh automatically when the index or HEAD changes (e.g. staging from a terminal)
+        self.watcher = RepoWatcher(
+            self.logic.git.index_stat_key,
+            lambda: self.after(0, self.refresh_data, REFRESH_DEBOUNCE_MS),
+            interval=WATCH_INTERVAL_SEC
+        )
+        self.watcher.start()
+
     def create_sidebar(self):
         """Creates the left-hand configuration panel."""
         self.sidebar_frame = ctk.CTkFrame(self, width=250, corner_radius=0)
@@ -144,10 +180,14 @@ class GitAICommitApp(ctk.CTk):
         self.lbl_tokens = ctk.CTkLabel(self.stats_frame, text="Tokens: 0")
         self.lbl_tokens.pack(side="left", padx=15, pady=10)
 
+        # Per-stage timings of the last refresh or generation (full traces go to the JSONL log)
+        self.lbl_timing = ctk.CTkLabel(self.stats_frame, text="", text_color="gray", font=("Arial", 11))
+        self.lbl_timing.pack(side="left", padx=(0, 15), pady=10)
+
         self.lbl_warning = ctk.CTkLabel(self.stats_frame, text="", text_color="#ff5555", font=("Arial", 12, "bold"))
         self.lbl_warning.pack(side="left", padx=15, pady=10)
 
-        self.btn_refresh = ctk.CTkButton(self.stats_frame, text="Refresh", width=80, command=self.refresh_data)
+        self.btn_refresh = ctk.CTkButton(self.stats_frame, text="Refresh", width=80, command=self.on_refresh_click)
         self.btn_refresh.pack(side="right", padx=10, pady=10)
 
         self.btn_stage = ctk.CTkButton(self.stats_frame, text="Stage All", width=80, fg_color="#eab308", text_color="black", hover_color="#ca8a04", command=self.on_stage_click)
@@ -157,9 +197,20 @@ class GitAICommitApp(ctk.CTk):
         self.entry_hint = ctk.CTkEntry(self.main_frame, placeholder_text="Optional: Context hint (e.g. 'Fixes login bug')...")
         self.entry_hint.grid(row=1, column=0, sticky="ew", pady=(0, 10))
 
-        # 3. Output Textbox (Editable)
-        self.txt_output = ctk.CTkTextbox(self.main_frame, font=("Consolas", 14))
-        self.txt_output.grid(row=2, column=0, sticky="nsew", pady=(0, 10))
+        # 3. Tabs: staged diff viewer and the editable message output
+        self.tabs = ctk.CTkTabview(self.main_frame)
+        self.tabs.grid(row=2, column=0, sticky="nsew", pady=(0, 10))
+        self.tabs.add("Staged Changes")
+        self.tabs.add("Message")
+        for name in ("Staged Changes", "Message"):
+            self.tabs.tab(name).grid_columnconfigure(0, weight=1)
+            self.tabs.tab(name).grid_rowconfigure(0, weight=1)
+
+        self.diff_viewer = DiffViewer(self.tabs.tab("Staged Changes"), self.logic.load_file_diff, fg_color="transparent")
+        self.diff_viewer.grid(row=0, column=0, sticky="nsew")
+
+        self.txt_output = ctk.CTkTextbox(self.tabs.tab("Message"), font=("Consolas", 14))
+        self.txt_output.grid(row=0, column=0, sticky="nsew")
         
         # 4. Action Bar
         self.action_frame = ctk.CTkFrame(self.main_frame, height=50, fg_color="transparent")
@@ -168,71 +219,153 @@ class GitAICommitApp(ctk.CTk):
         self.btn_generate = ctk.CTkButton(self.action_frame, text="Generate Message", height=40, command=self.on_generate_click)
         self.btn_generate.pack(side="right")
         
+        self.var_force = ctk.BooleanVar(value=False)
+        self.chk_force = ctk.CTkCheckBox(self.action_frame, text="Force regenerate", variable=self.var_force)
+        self.chk_force.pack(side="left")
+
+        self.btn_cancel = ctk.CTkButton(self.action_frame, text="Cancel", height=40, width=80, fg_color="#b91c1c", hover_color="#991b1b", state="disabled", command=self.on_cancel_click)
+        self.btn_cancel.pack(side="right", padx=(10, 0))
+
         self.btn_copy = ctk.CTkButton(self.action_frame, text="Copy to Clipboard", height=40, fg_color="gray", command=self.copy_to_clipboard)
         self.btn_copy.pack(side="right", padx=10)
 
-    def on_stage_click(self):
-        """Stages all files and refreshes the view."""
-        self.logic.stage_changes()
+    def _on_window_shown(self):
+        """First idle pass of the main loop: the window is up. Warm slow imports off-thread."""
+        self._startup_times["window_sec"] = round(time.perf_counter() - _PROCESS_START, 3)
+        model = self.var_model.get()
+        threading.Thread(target=self.logic.warm_up, args=(model,), daemon=True).start()
+
+    def _report_startup(self):
+        """Prints startup timings (--measure-startup) and exits; non-zero if over target."""
+        self._startup_times["first_data_sec"] = round(time.perf_counter() - _PROCESS_START, 3)
+        self._startup_times["target_sec"] = STARTUP_TARGET_SEC
+        print(json.dumps(self._startup_times))
+        self.startup_exit_code = 0 if self._startup_times.get("window_sec", 0) <= STARTUP_TARGET_SEC else 1
+        self.after(0, self.destroy)
+
+    def on_refresh_click(self):
         self.refresh_data()
 
+    def on_stage_click(self):
+        """Stages all files in the background; the refresh follows when it completes."""
+        self.btn_stage.configure(state="disabled")
+
+        def work():
+            self.logic.stage_changes()
+            self.after(0, lambda: (self.btn_stage.configure(state="normal"), self.refresh_data()))
+
+        threading.Thread(target=work, daemon=True).start()
+
     def browse_repo(self):
         path = filedialog.askdirectory()
         if path:
+            # Stop the current refresh so switching repos never waits on it
+            if self._refresh_token is not None:
+                self._refresh_token.cancel()
             if self.logic.update_repo_path(path):
+                self.speculator.cancel()
                 self.var_repo_path.set(path)
+                self.watcher.reset()
                 self.refresh_data()
 
-    def refresh_data(self):
-        data = self.logic.load_repo_data()
+    def refresh_data(self, delay_ms=0):
+        """
+        Schedules a background refresh. Requests within the debounce window are
+        coalesced, and starting a new refresh cancels any superseded one.
+        """
+        if self._refresh_after_id is not None:
+            self.after_cancel(self._refresh_after_id)
+        self._refresh_after_id = self.after(delay_ms, self._start_refresh)
+
+    def _start_refresh(self):
+        self._refresh_after_id = None
+        if self._refresh_token is not None:
+            self._refresh_token.cancel()
+        token = CancelToken()
+        self._refresh_token = token
+        model = self.var_model.get()
+
+        def work():
+            data = self.logic.load_repo_data(model, cancel=token)
+            self.after(0, lambda: self._apply_refresh(token, data))
+
+        threading.Thread(target=work, daemon=True).start()
+
+    def _apply_refresh(self, token, data):
+        """Renders refresh results on the main thread, dropping superseded ones."""
+        if token is not self._refresh_token or token.cancelled:
+            return
+        self._refresh_token = None
+        if self.measure_startup and "first_data_sec" not in self._startup_times:
+            self._report_startup()
         
+        # A different staged change cancels speculation; a settled one starts it
+        self.speculator.on_staged_change(data, self.entry_hint.get(), self.var_model.get())
+
         if "error" in data:
             self.lbl_files_count.configure(text="Invalid Repo", text_color="red")
-            self.txt_output.delete("0.0", "end")
-            self.txt_output.insert("0.0", "Error: The selected folder is not a git repository.")
+            self.diff_viewer.set_files([])
+            self.diff_viewer.show_message("Error: The selected folder is not a git repository.")
             return
 
         # Update Stats
         file_count = len(data["files"])
         self.lbl_files_count.configure(text=f"Files: {file_count}", text_color=("black", "white"))
         self.lbl_tokens.configure(text=f"Est. Tokens: ~{data['token_count']}")
+        if self._generation_token is None:
+            self.lbl_timing.configure(text=data["trace"].summary())
 
         # Update Security Warning
         if data["warnings"]:
             warn_text = f"⚠️ SENSITIVE FILE: {data['warnings'][0]}"
             self.lbl_warning.configure(text=warn_text)
+        elif data["secret_findings"]:
+            finding = data["secret_findings"][0]
+            more = f" (+{len(data['secret_findings']) - 1} more)" if len(data["secret_findings"]) > 1 else ""
+            warn_text = f"⚠️ SECRET: {finding['rule']} in {finding['file']}:{finding['line']}{more}"
+            self.lbl_warning.configure(text=warn_text)
         else:
             self.lbl_warning.configure(text="")
 
-        # Debug Preview
-        preview = f"Repo: {data['repo_name']}\n"
-        if data['lockfiles_excluded']:
-            preview += f"Excluded Lockfiles: {data['lockfiles_excluded']}\n"
-        
-        preview += f"\n--- Diff Preview ({len(data['diff_text'])} chars) ---\n"
-        
-        preview += data['diff_text'][:5000] + ("..." if len(data['diff_text']) > 5000 else "")
-        
-        self.txt_output.delete("0.0", "end")
-        self.txt_output.insert("0.0", preview)
+        # Staged files (diffs load on demand); the message tab is left untouched
+        self.diff_viewer.set_files(data["file_stats"])
 
     def on_generate_click(self):
         """UI Handler for generation button."""
         # Disable button to prevent double-click
         self.btn_generate.configure(state="disabled", text="Generating...")
+        self.btn_cancel.configure(state="normal")
+        self.tabs.set("Message")
         self.txt_output.delete("0.0", "end")
         self.txt_output.insert("0.0", "Thinking...")
 
         # Get inputs
         hint = self.entry_hint.get()
         model = self.var_model.get()
+        force = self.var_force.get()
 
         self.logic.save_setting("selected_model", model)
 
+        # Fresh token per generation so late results from a cancelled run are ignored
+        token = CancelToken()
+        self._generation_token = token
+        self._stream_buffer = []
+        self._stream_started = False
+        self.after(STREAM_FLUSH_MS, lambda: self._flush_stream(token))
+
         # Start thread
-        thread = threading.Thread(target=self._run_generation_thread, args=(hint, model))
+        trace = Trace("generate")
+        thread = threading.Thread(target=self._run_generation_thread, args=(hint, model, token, force, trace), daemon=True)
         thread.start()
 
+    def on_cancel_click(self):
+        """Aborts the in-flight generation stream."""
+        token = self._generation_token
+        if token is None:
+            return
+        token.cancel()
+        self._finish_generation(token, "Error: Generation cancelled.")
+
     def on_commit_click(self):
         """Handler for the actual git commit action."""
         # 1. Get text from editable box
@@ -256,8 +389,8 @@ class GitAICommitApp(ctk.CTk):
             self.entry_hint.delete(0, "end") # Clear the hint
             self.lbl_files_count.configure(text="Files: 0") # Reset count immediately visually
             
-            # 6. Auto-refresh after 1.5 seconds
-            self.after(1500, self.refresh_data)
+            # 6. Refresh stats and the staged file list
+            self.refresh_data(REFRESH_DEBOUNCE_MS)
         else:
             self.txt_output.delete("0.0", "end")
             self.txt_output.insert("0.0", f"ERROR / GIT OUTPUT:\n{result}")
@@ -265,22 +398,63 @@ class GitAICommitApp(ctk.CTk):
         # Reset button
         self.btn_commit.configure(state="disabled", text="Commit Changes")
 
-    def _run_generation_thread(self, hint, model):
+    def _run_generation_thread(self, hint, model, token, force=False, trace=None):
         """Worker thread for API call."""
-        result = self.logic.generate_commit_message(hint, model)
+        # list.append is atomic; the main thread drains the buffer in _flush_stream
+        result = None
+        spec = None if force else self.speculator.claim(hint, model)
+        if spec is None:
+            # Not usable for this request (other hint/model or change): stop it spending budget alongside
+            self.speculator.cancel()
+        else:
+            # Use the background generation of this exact change: finished, or joined mid-stream
+            token.on_cancel(spec.token.cancel)
+            spec.attach(self._stream_buffer.append)
+            spec.done.wait()
+            trace.set(speculative=True)
+            if not spec.failed or token.cancelled:
+                result = spec.result
+        if result is None:
+            result = self.logic.generate_commit_message(
+                hint, model, on_token=self._stream_buffer.append, cancel=token, force=force, trace=trace
+            )
         # Schedule UI update on main thread
-        self.after(0, lambda: self._finish_generation(result))
+        self.after(0, lambda: self._finish_generation(token, result, trace))
 
-    def _finish_generation(self, result):
+    def _flush_stream(self, token):
+        """Appends buffered tokens to the textbox, batching updates to avoid flooding Tk."""
+        if token is not self._generation_token:
+            return
+        if self._stream_buffer:
+            chunk_count = len(self._stream_buffer)
+            text = "".join(self._stream_buffer[:chunk_count])
+            del self._stream_buffer[:chunk_count]
+            if not self._stream_started:
+                # First tokens replace the "Thinking..." placeholder
+                self._stream_started = True
+                self.txt_output.delete("0.0", "end")
+            self.txt_output.insert("end", text)
+            self.txt_output.see("end")
+        self.after(STREAM_FLUSH_MS, lambda: self._flush_stream(token))
+
+    def _finish_generation(self, token, result, trace=None):
         """Called on main thread when API returns."""
+        if token is not self._generation_token:
+            # A superseded or cancelled generation finishing late
+            return
+        self._generation_token = None
+        if trace is not None:
+            self.lbl_timing.configure(text=trace.summary())
+
         self.txt_output.delete("0.0", "end")
         self.txt_output.insert("0.0", result)
         
         # Re-enable button
         self.btn_generate.configure(state="normal", text="Generate Message")
+        self.btn_cancel.configure(state="disabled")
         
         # Enable commit button if result is valid
-        if not result.startswith("Error"):
+        if result.strip() and not result.startswith(("Error", "API Error")):
             self.btn_commit.configure(state="normal")
 
     def copy_to_clipboard(self):
@@ -288,5 +462,6 @@ class GitAICommitApp(ctk.CTk):
         self.clipboard_append(self.txt_output.get("0.0", "end").strip())
 
 if __name__ == "__main__":
-    app = GitAICommitApp()
-    app.mainloop()
\ No newline at end of file
+    app = GitAICommitApp(measure_startup="--measure-startup" in sys.argv)
+    app.mainloop()
+    sys.exit(app.startup_exit_code)
\ No newline at end of file
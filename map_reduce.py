@@ -0,0 +1,155 @@
+# map_reduce.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Map-reduce summarization for change sets too large for a single prompt.
+Staged files are grouped into token-bounded shards, each shard is summarized
+by a concurrent LLM call (map), and the summaries feed the final message (reduce).
+"""
+
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from cancellation import CancelToken
+from diff_packer import DiffPacker, DIFF_READ_FACTOR
+from generation_cache import GenerationCache
+from git_utils import GitManager
+from token_service import BYTES_PER_TOKEN
+
+# Bump when MAP_SYSTEM_PROMPT changes so cached shard summaries are not reused
+MAP_PROMPT_VERSION = 1
+
+MAP_SYSTEM_PROMPT = (
+    "You summarize one part of a larger staged git change so that a commit message can be written later.\n"
+    "Return 2-8 concise bullet points (-) describing what changed and, where evident, why.\n"
+    "Mention the affected modules or files. No preamble, no Markdown code blocks.\n"
+)
+
+# Rough cost model used to size shards before any diff is read
+TOKENS_PER_CHANGED_LINE = 12
+TOKENS_PER_FILE = 20
+
+# A shard boundary is placed after files whose path hash hits this modulus, so boundaries
+# depend on paths rather than positions: restaging one file leaves the other shards intact.
+BOUNDARY_MODULUS = 8
+MAX_SHARDS = 24
+
+
+def estimate_tokens(added: str, deleted: str) -> int:
+    """Rough token cost of one file's diff from its numstat line counts."""
+    if added == "-":  # Binary
+        return TOKENS_PER_FILE
+    return TOKENS_PER_FILE + (int(added) + int(deleted)) * TOKENS_PER_CHANGED_LINE
+
+
+def _is_boundary(path: str) -> bool:
+    digest = hashlib.blake2b(path.encode('utf-8', errors='surrogatepass'), digest_size=4).digest()
+    return int.from_bytes(digest, "big") % BOUNDARY_MODULUS == 0
+
+
+def shard_files(numstat: List[Tuple[str, str, str]], shard_tokens: int) -> List[List[str]]:
+    """
+    Groups files (in path order) into shards of roughly `shard_tokens` estimated tokens.
+    A shard ends at a path-hash boundary once it is half full, or when it is full.
+    There are never more than MAX_SHARDS shards; the packer trims oversized shards instead.
+    """
+    total = sum(estimate_tokens(a, d) for a, d, _ in numstat)
+    shard_tokens = max(shard_tokens, total // MAX_SHARDS + 1)
+
+    shards: List[List[str]] = []
+    sizes: List[int] = []
+    current: List[str] = []
+    size = 0
+    for added, deleted, path in sorted(numstat, key=lambda entry: entry[2]):
+        cost = estimate_tokens(added, deleted)
+        if current and size + cost > shard_tokens:
+            shards.append(current)
+            sizes.append(size)
+            current, size = [], 0
+        current.append(path)
+        size += cost
+        if _is_boundary(path) and size >= shard_tokens // 2:
+            shards.append(current)
+            sizes.append(size)
+            current, size = [], 0
+    if current:
+        shards.append(current)
+        sizes.append(size)
+
+    # Boundaries close half-full shards, so the count can exceed the cap: merge the smallest
+    # neighbouring pair until it fits (other shards keep their paths, and their cached summaries)
+    while len(shards) > MAX_SHARDS:
+        idx = min(range(len(shards) - 1), key=lambda i: sizes[i] + sizes[i + 1])
+        shards[idx:idx + 2] = [shards[idx] + shards[idx + 1]]
+        sizes[idx:idx + 2] = [sizes[idx] + sizes[idx + 1]]
+    return shards
+
+
+class MapReduceSummarizer:
+    """Summarizes shards concurrently, caching each summary by the shard's packed diff."""
+
+    def __init__(self, git: GitManager, packer: DiffPacker, cache: GenerationCache,
+                 complete: Callable[[List[Dict[str, str]], CancelToken], str], width: int = 4,
+                 redact: Callable[[str], str] = None):
+        self.git = git
+        self.packer = packer
+        self.cache = cache
+        self.complete = complete  # Sends messages, returns the raw completion text
+        self.width = max(1, width)
+        self.redact = redact      # Applied to each shard's diff before it is packed
+
+    def summarize(self, numstat: List[Tuple[str, str, str]], model: str, shard_budget: int,
+                  cancel: CancelToken = None) -> Optional[str]:
+        """
+        Returns the combined shard summaries, or None if cancelled.
+        Raises the first error encountered by a map call.
+        """
+        cancel = cancel or CancelToken()
+        stats = {path: (a, d) for a, d, path in numstat}
+        shards = shard_files(numstat, shard_budget)
+
+        def run_shard(paths: List[str]) -> str:
+            if cancel.cancelled:
+                return ""
+            # 1. Read only this shard's diff, capped to what the packer could use
+            diff = self.git.read_staged_diff(
+                paths=paths, max_bytes=shard_budget * BYTES_PER_TOKEN * DIFF_READ_FACTOR, cancel=cancel
+            )
+            if not diff.ok:
+                if cancel.cancelled:
+                    return ""
+                raise RuntimeError("Reading a shard's diff failed: "
+                                   + (diff.stderr.decode('utf-8', errors='replace').strip() or "git diff error"))
+            diff_text = diff.text
+            if self.redact:
+                diff_text = self.redact(diff_text)
+            shard_stat = [(stats[p][0], stats[p][1], p) for p in paths]
+            packed = self.packer.pack(diff_text, shard_budget, shard_stat, complete=not diff.truncated)
+
+            # 2. Per-shard cache: unchanged shards are never re-summarized
+            key = GenerationCache.make_key(packed.text, paths, "", model, f"map-{MAP_PROMPT_VERSION}")
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+            messages = [
+                {"role": "system", "content": MAP_SYSTEM_PROMPT},
+                {"role": "user", "content": f"## FILES\n{chr(10).join(paths)}\n\n## CODE DIFF\n{packed.text}"},
+            ]
+            summary = self.complete(messages, cancel).strip()
+            if summary and not cancel.cancelled:
+                self.cache.put(key, summary)
+            return summary
+
+        with ThreadPoolExecutor(max_workers=self.width) as pool:
+            summaries = list(pool.map(run_shard, shards))
+
+        if cancel.cancelled:
+            return None
+
+        blocks = []
+        for idx, (paths, summary) in enumerate(zip(shards, summaries), 1):
+            head = ", ".join(paths[:5]) + (f" (+{len(paths) - 5} more)" if len(paths) > 5 else "")
+            blocks.append(f"### Part {idx}/{len(shards)}: {head}\n{summary}")
+        return "\n\n".join(blocks)
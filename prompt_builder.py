@@ -0,0 +1,79 @@
+# prompt_builder.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Assembles the chat messages for commit message generation in cache-friendly order.
+Providers cache prompts by exact prefix, so the parts that rarely change come first
+(the fixed rules, then the repository's style examples, then the staged change) and
+the hint, which changes between regenerations of the same change, comes last.
+"""
+
+from typing import Any, Dict, List
+
+# Bump whenever SYSTEM_PROMPT or the message layout changes: it is part of the generation
+# cache key, so results produced by an older prompt are not reused.
+PROMPT_VERSION = 2
+
+SYSTEM_PROMPT = (
+    "You are a senior developer and git expert. You write commit messages that strictly adhere to the 'Conventional Commits' specification.\n\n"
+    "## RULES\n"
+    "1. **Header Format**: <type>(<scope>): <subject>\n"
+    "   - Types: feat, fix, docs, style, refactor, perf, test, build, ci, chore, revert.\n"
+    "   - Scope: Optional, based on file names/modules (e.g., 'auth', 'ui', 'api').\n"
+    "   - Subject: Imperative mood ('add' not 'added'), lowercase, max 50 chars, no period.\n"
+    "2. **Body**:\n"
+    "   - Required for non-trivial changes.\n"
+    "   - Wrap lines strictly at 72 characters.\n"
+    "   - Use bullet points (-) for listing specific changes.\n"
+    "   - Focus on the 'why' and 'what', not just code translation.\n"
+    "3. **Output**:\n"
+    "   - Return ONLY the raw message. No Markdown code blocks (```). No conversational filler.\n"
+    "4. **Context**: Past commits are examples of this repository's scopes and style. "
+    "A context hint from the user, when given, takes priority.\n"
+)
+
+# The file list repeats what the diff shows; past this many paths only a count is given
+MAX_LISTED_FILES = 100
+
+# Providers that only cache up to an explicit breakpoint (OpenRouter passes `cache_control`
+# through); others cache matching prefixes automatically.
+CACHE_CONTROL_PREFIXES = ("anthropic/", "google/gemini")
+
+
+def format_file_list(files: List[str]) -> str:
+    listed = "\n".join(files[:MAX_LISTED_FILES])
+    if len(files) > MAX_LISTED_FILES:
+        listed += f"\n... and {len(files) - MAX_LISTED_FILES} more files"
+    return listed
+
+
+def build_messages(history: str, files: List[str], diff_text: str, hint: str,
+                   model: str = None) -> List[Dict[str, Any]]:
+    """
+    Returns [system rules, repository context + staged change, hint].
+    Everything before the hint message is identical for every generation of the same
+    staged change, so regenerating with another hint reuses the cached prefix.
+    """
+    context = (
+        f"## REPOSITORY STYLE (Past commits related to these files)\n{history or 'None'}\n\n"
+        f"## STAGED FILE LIST\n{format_file_list(files)}\n\n"
+        f"## CODE DIFF\n{diff_text}"
+    )
+    if model and model.startswith(CACHE_CONTROL_PREFIXES):
+        context_content: Any = [{"type": "text", "text": context, "cache_control": {"type": "ephemeral"}}]
+    else:
+        context_content = context
+
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": context_content},
+        {"role": "user", "content": f"## CONTEXT HINT (User Intent - Priority High)\n{hint if hint else 'None'}"},
+    ]
+
+
+def message_text(message: Dict[str, Any]) -> str:
+    """The text of a message whose content is a string or a list of text parts."""
+    content = message["content"]
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") for part in content)
@@ -0,0 +1,53 @@
+# rate_limit.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Global concurrency and rate limiting for API calls shared across worker threads.
+"""
+
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Combines a semaphore (max in-flight calls) with a token bucket (calls per minute).
+    Use as a context manager around each API call.
+    """
+
+    def __init__(self, max_concurrent: int = 4, per_minute: float = 0):
+        self._semaphore = threading.BoundedSemaphore(max(1, max_concurrent))
+        self.per_minute = per_minute
+        self._capacity = max(1.0, per_minute / 60.0 * 5) if per_minute else 0  # Allow short bursts
+        self._tokens = self._capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take_token(self) -> None:
+        """Blocks until the bucket has a token (no-op when unlimited)."""
+        if not self.per_minute:
+            return
+        rate = self.per_minute / 60.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._last) * rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / rate
+            time.sleep(wait)
+
+    def __enter__(self):
+        self._semaphore.acquire()
+        try:
+            self._take_token()
+        except BaseException:
+            self._semaphore.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._semaphore.release()
+        return False
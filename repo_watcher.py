@@ -0,0 +1,55 @@
+# repo_watcher.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Lightweight polling watcher for the git index and HEAD.
+"""
+
+import threading
+from typing import Any, Callable
+
+
+class RepoWatcher:
+    """
+    Polls a cheap stat-based key (see GitManager.index_stat_key) on a daemon thread
+    and invokes `on_change` whenever it differs from the last seen value.
+    Stat polling is used instead of OS file events so it works the same on every platform.
+    """
+
+    def __init__(self, key_fn: Callable[[], Any], on_change: Callable[[], None], interval: float = 0.5):
+        self.key_fn = key_fn
+        self.on_change = on_change
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_key = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._last_key = self._read_key()
+        self._thread = threading.Thread(target=self._loop, name="RepoWatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def reset(self) -> None:
+        """Re-baselines the key (e.g. after switching repositories) without firing."""
+        self._last_key = self._read_key()
+
+    def _read_key(self) -> Any:
+        try:
+            return self.key_fn()
+        except Exception:
+            return None
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            key = self._read_key()
+            if key != self._last_key:
+                self._last_key = key
+                try:
+                    self.on_change()
+                except Exception:
+                    pass
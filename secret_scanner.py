@@ -0,0 +1,217 @@
+# secret_scanner.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Content-level secret scanner for staged diffs.
+A literal keyword prefilter finds candidate lines, and all rules are compiled into a
+single alternation that runs only on those lines. File and line numbers are resolved
+only for matches.
+"""
+
+import bisect
+import math
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Union
+
+from staged_diff import StagedDiff
+
+# (rule name, pattern). Patterns must not contain capturing groups except where noted.
+RULES = [
+    ("aws-access-key-id", r"\b(?:AKIA|ASIA)[0-9A-Z]{16}\b"),
+    ("aws-secret-access-key", r"(?i:aws.{0,20}?(?:secret|key).{0,20}?)['\"][0-9a-zA-Z/+]{40}['\"]"),
+    ("private-key", r"-----BEGIN (?:RSA |EC |DSA |OPENSSH |PGP |ENCRYPTED )?PRIVATE KEY-----"),
+    ("github-token", r"\bgh[pousr]_[A-Za-z0-9]{36,}\b"),
+    ("slack-token", r"\bxox[abposr]-[A-Za-z0-9-]{10,}\b"),
+    ("google-api-key", r"\bAIza[0-9A-Za-z_\-]{35}\b"),
+    ("stripe-secret-key", r"\b[sr]k_live_[0-9a-zA-Z]{24,}\b"),
+    ("openai-or-openrouter-key", r"\bsk-(?:or-v1-|proj-)?[A-Za-z0-9_\-]{32,}\b"),
+    ("jwt", r"\beyJ[A-Za-z0-9_\-]{10,}\.eyJ[A-Za-z0-9_\-]{10,}\.[A-Za-z0-9_\-]{10,}\b"),
+    ("generic-credential",
+     r"(?i:(?:api[_-]?key|secret|token|passw(?:or)?d|credential)s?['\"]?\s*[:=]\s*)['\"][^'\"\s]{8,}['\"]"),
+]
+
+# Candidates for the entropy check: quoted, long, base64/hex-ish values on lines that
+# mention a credential-like word. The value is the only capturing group.
+ENTROPY_CANDIDATE = (
+    r"(?i:(?:key|secret|token|passw|credential|auth)[^\n'\"]{0,40})['\"]([A-Za-z0-9+/=_\-]{24,})['\"]"
+)
+ENTROPY_RULE = "high-entropy-string"
+
+# Rules that match `name = "value"`; redaction keeps the name and replaces only the quoted value
+VALUE_RULES = {"aws-secret-access-key", "generic-credential", ENTROPY_RULE}
+ENTROPY_THRESHOLD = 4.0  # bits per character
+
+SHARD_THRESHOLD = 1024 * 1024  # Diffs larger than this are scanned in parallel shards
+SHARD_SIZE = 512 * 1024
+
+# Compiled for bytes: the diff is scanned in place in its StagedDiff buffer (secrets are ASCII)
+_COMBINED = re.compile(
+    "|".join(f"(?P<r{i}>{pattern})" for i, (_, pattern) in enumerate(RULES)).encode()
+    + f"|(?P<entropy>{ENTROPY_CANDIDATE})".encode()
+)
+_RULE_NAMES = {f"r{i}": name for i, (name, _) in enumerate(RULES)}
+
+# Cheap literal prefilter: every rule needs one of these on its line, so the (much slower)
+# combined pattern only runs on the few candidate lines.
+_KEYWORDS = re.compile(
+    rb"akia|asia|private key|gh[pousr]_|xox|aiza|k_live_|sk-|eyj|key|secret|token|passw|credential|auth|aws",
+    re.IGNORECASE
+)
+_FILE_HEADER = re.compile(rb"^diff --git a/.* b/(.*)$", re.MULTILINE)
+_HUNK_HEADER = re.compile(rb"^@@ -\d+(?:,\d+)? \+(\d+)(?:,\d+)? @@", re.MULTILINE)
+
+
+def shannon_entropy(value: str) -> float:
+    counts = Counter(value)
+    length = len(value)
+    return -sum(c / length * math.log2(c / length) for c in counts.values())
+
+
+class Finding:
+    """A suspected secret on an added line of the staged diff."""
+
+    def __init__(self, file: str, line: int, rule: str, start: int, end: int):
+        self.file = file
+        self.line = line      # Line number in the new version of the file (0 if unknown)
+        self.rule = rule
+        self.start = start    # Byte offsets of the match in the scanned diff buffer
+        self.end = end
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"file": self.file, "line": self.line, "rule": self.rule}
+
+    def __str__(self) -> str:
+        return f"{self.rule} in {self.file}:{self.line}"
+
+
+def _buffer(diff: Union[str, bytes, StagedDiff]) -> bytes:
+    if isinstance(diff, StagedDiff):
+        return diff.buffer
+    return diff.encode('utf-8', errors='surrogatepass') if isinstance(diff, str) else diff
+
+
+class SecretScanner:
+    """
+    Scans added (`+`) diff lines for secrets and can redact them before prompting.
+    Accepts a StagedDiff (scanned in its buffer without copying) or plain text.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+
+    def scan(self, diff: Union[str, StagedDiff]) -> List[Finding]:
+        """Returns findings on added lines, in diff order."""
+        buffer = _buffer(diff)
+        if len(buffer) <= SHARD_THRESHOLD:
+            return self._scan_range(buffer, 0, len(buffer))
+
+        # Large diffs: split at file boundaries and scan the shards on worker threads
+        bounds = self._shard_bounds(buffer)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = pool.map(lambda b: self._scan_range(buffer, b[0], b[1]), bounds)
+        return [finding for shard in results for finding in shard]
+
+    def redact(self, diff: Union[str, StagedDiff]) -> Union[str, StagedDiff]:
+        """
+        Replaces every match (added, removed or context lines) with a placeholder.
+        Returns the same type; the input itself when nothing matched.
+        """
+        buffer = _buffer(diff)
+        parts: List[bytes] = []
+        last = 0
+        for line_start, line_end in self._candidate_lines(buffer, 0, len(buffer), added_only=False):
+            for m in _COMBINED.finditer(buffer, line_start, line_end):
+                rule = self._rule_for(m)
+                if rule:
+                    start, end = m.span()
+                    if rule in VALUE_RULES:
+                        start = buffer.rfind(buffer[end - 1:end], start, end - 1)
+                    parts.append(buffer[last:start])
+                    parts.append(f"[REDACTED:{rule}]".encode())
+                    last = end
+        if not parts:
+            return diff
+        parts.append(buffer[last:])
+        redacted = b"".join(parts)
+        if isinstance(diff, StagedDiff):
+            return StagedDiff(redacted, diff.complete)
+        return redacted.decode('utf-8', errors='surrogatepass')
+
+    def _shard_bounds(self, buffer: bytes) -> List[Tuple[int, int]]:
+        bounds = []
+        start = 0
+        while start < len(buffer):
+            end = buffer.find(b"\ndiff --git ", start + SHARD_SIZE)
+            end = len(buffer) if end == -1 else end + 1
+            bounds.append((start, end))
+            start = end
+        return bounds
+
+    @staticmethod
+    def _rule_for(match: re.Match) -> str:
+        """Maps a combined-pattern match to its rule, applying the entropy check."""
+        if match.group("entropy") is not None:
+            value = match.group(match.re.groupindex["entropy"] + 1).decode('ascii', errors='replace')
+            return ENTROPY_RULE if shannon_entropy(value) >= ENTROPY_THRESHOLD else ""
+        return _RULE_NAMES.get(match.lastgroup, "")
+
+    def _candidate_lines(self, buffer: bytes, start: int, end: int, added_only: bool = True):
+        """Yields (line_start, line_end) of lines in [start, end) that contain a keyword."""
+        last_line = -1
+        pos = start
+        while True:
+            m = _KEYWORDS.search(buffer, pos, end)
+            if not m:
+                return
+            hit = m.start()
+            line_start = buffer.rfind(b"\n", start, hit) + 1 or start
+            line_end = buffer.find(b"\n", hit, end)
+            line_end = end if line_end == -1 else line_end
+            pos = line_end + 1
+            if line_start == last_line:
+                continue
+            last_line = line_start
+            # Only added lines; "+++" is the file header
+            if not added_only or (buffer.startswith(b"+", line_start) and not buffer.startswith(b"+++", line_start)):
+                yield line_start, line_end
+
+    def _scan_range(self, buffer: bytes, start: int, end: int) -> List[Finding]:
+        findings: List[Finding] = []
+        file_starts = file_names = hunk_starts = hunk_lines = None
+
+        for line_start, line_end in self._candidate_lines(buffer, start, end):
+            for m in _COMBINED.finditer(buffer, line_start, line_end):
+                rule = self._rule_for(m)
+                if not rule:
+                    continue
+
+                # Resolve file/line lazily: matches are rare, so index headers only when needed
+                if file_starts is None:
+                    # Shards start on file boundaries, so headers before `start` are never needed
+                    files = [(fm.start(), fm.group(1).decode('utf-8', errors='replace'))
+                             for fm in _FILE_HEADER.finditer(buffer, start, end)]
+                    file_starts = [pos for pos, _ in files]
+                    file_names = [name for _, name in files]
+                    hunks = [(hm.start(), int(hm.group(1))) for hm in _HUNK_HEADER.finditer(buffer, start, end)]
+                    hunk_starts = [pos for pos, _ in hunks]
+                    hunk_lines = [line for _, line in hunks]
+
+                f_idx = bisect.bisect_right(file_starts, line_start) - 1
+                filename = file_names[f_idx] if f_idx >= 0 else "?"
+                line_no = 0
+                h_idx = bisect.bisect_right(hunk_starts, line_start) - 1
+                if h_idx >= 0 and (f_idx < 0 or hunk_starts[h_idx] > file_starts[f_idx]):
+                    line_no = self._new_line_number(buffer, hunk_starts[h_idx], hunk_lines[h_idx], line_start)
+                findings.append(Finding(filename, line_no, rule, m.start(), m.end()))
+        return findings
+
+    @staticmethod
+    def _new_line_number(buffer: bytes, hunk_pos: int, first_line: int, line_start: int) -> int:
+        """Counts new-side lines (added or context) between the hunk header and the match."""
+        body_start = buffer.find(b"\n", hunk_pos) + 1
+        # Lines in between, minus removed ones (each starts right after a newline)
+        lines = buffer.count(b"\n", body_start, line_start)
+        removed = buffer.count(b"\n-", body_start - 1, line_start - 1)
+        return first_line + lines - removed
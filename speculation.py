@@ -0,0 +1,189 @@
+# speculation.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Opt-in speculative generation: once the staged change has stayed the same for a short
+while, its message is generated in the background and held until Generate is clicked,
+which then shows it at once (or joins the stream still in flight). A change to the
+staged content cancels the speculation and discards its result. Speculative API calls
+are capped per hour so an idle window never runs up costs.
+"""
+
+import collections
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from cancellation import CancelToken
+from tracing import Trace
+
+DEFAULT_CALLS_PER_HOUR = 20
+
+
+class SpeculationBudget:
+    """Sliding one-hour window of speculative API calls."""
+
+    def __init__(self, per_hour: int = DEFAULT_CALLS_PER_HOUR):
+        self.per_hour = per_hour
+        self._calls = collections.deque()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        while self._calls and now - self._calls[0] >= 3600:
+            self._calls.popleft()
+
+    def try_take(self) -> bool:
+        """Records a call and returns True, or False if the hour's budget is spent."""
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            if len(self._calls) >= self.per_hour:
+                return False
+            self._calls.append(now)
+            return True
+
+    def remaining(self) -> int:
+        with self._lock:
+            self._expire(time.monotonic())
+            return max(0, self.per_hour - len(self._calls))
+
+
+class Speculation:
+    """One background generation. Streamed chunks are kept so a late listener sees all of them."""
+
+    def __init__(self, key: str, hint: str, model: str):
+        self.key = key
+        self.hint = hint
+        self.model = model
+        self.token = CancelToken()
+        self.result: Optional[str] = None
+        self.done = threading.Event()
+        self._chunks: List[str] = []
+        self._listener: Optional[Callable[[str], None]] = None
+        self._lock = threading.Lock()
+
+    def deliver(self, chunk: str) -> None:
+        with self._lock:
+            self._chunks.append(chunk)
+            listener = self._listener
+        if listener:
+            listener(chunk)
+
+    def attach(self, on_token: Callable[[str], None] = None) -> None:
+        """Replays the chunks received so far to `on_token`, then forwards new ones."""
+        with self._lock:
+            if on_token:
+                for chunk in self._chunks:
+                    on_token(chunk)
+            self._listener = on_token
+
+    def finish(self, result: str) -> None:
+        self.result = result
+        self.done.set()
+
+    @property
+    def failed(self) -> bool:
+        return self.done.is_set() and (not self.result or self.result.startswith(("Error", "API Error")))
+
+
+class SpeculativeGenerator:
+    """
+    Drives speculation for one AppLogic. Call `on_staged_change` after every refresh and
+    `claim` when the user asks for a message. Enabled by the `speculative_generation` setting.
+    """
+
+    def __init__(self, logic, budget: SpeculationBudget = None):
+        self.logic = logic
+        self.budget = budget or SpeculationBudget(int(logic.config.get("speculative_calls_per_hour")))
+        self._current: Optional[Speculation] = None
+        self._pending_key: Optional[str] = None
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def enabled(self) -> bool:
+        return bool(self.logic.config.get("speculative_generation"))
+
+    def _eligible_key(self, data: Dict[str, Any], hint: str, model: str) -> Optional[str]:
+        """The generation key worth speculating on, or None (nothing staged, sensitive, or too big)."""
+        if not self.enabled() or not data or "error" in data or not data["diff_text"]:
+            return None
+        if not self.logic.config.get("api_key"):
+            return None
+        # Sensitive files or secrets wait for an explicit click; oversized changes cost many calls
+        if data["warnings"] or data["secret_findings"] or data["needs_map_reduce"]:
+            return None
+        return self.logic.generation_key(data, hint, model)
+
+    def on_staged_change(self, data: Optional[Dict[str, Any]], hint: str, model: str) -> None:
+        """
+        Called with fresh repo data. A different staged change cancels the current
+        speculation and schedules a new one once the change has been stable for the delay.
+        """
+        key = self._eligible_key(data, hint, model)
+        with self._lock:
+            current = self._current
+            if current is not None and current.key == key and not current.token.cancelled:
+                return
+            if key is not None and key == self._pending_key:
+                return  # Already waiting for this change to settle
+            if current is not None:
+                current.token.cancel()
+                self._current = None
+            self._cancel_timer()
+            if key is None or self.logic.generation_cache.get(key) is not None:
+                return  # Nothing to do, or a click is already instant
+            self._pending_key = key
+            delay = float(self.logic.config.get("speculative_delay_sec"))
+            self._timer = threading.Timer(delay, self._start, (key, hint, model))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._pending_key = None
+
+    def _start(self, key: str, hint: str, model: str) -> None:
+        with self._lock:
+            if self._pending_key != key:
+                return
+            self._timer = None
+            self._pending_key = None
+            self.budget.per_hour = int(self.logic.config.get("speculative_calls_per_hour"))
+            if not self.budget.try_take():
+                return
+            spec = Speculation(key, hint, model)
+            self._current = spec
+        threading.Thread(target=self._run, args=(spec,), name="Speculation", daemon=True).start()
+
+    def _run(self, spec: Speculation) -> None:
+        trace = Trace("generate", speculative=True)
+        # The index is read again here; if it moved since the key was taken, nothing is generated
+        # (a message for one staged state must never be held under another's key)
+        result = self.logic.generate_commit_message(spec.hint, spec.model, on_token=spec.deliver,
+                                                    cancel=spec.token, trace=trace, expected_key=spec.key)
+        # A result for a change that was superseded meanwhile is dropped (and was not cached)
+        spec.finish(result)
+
+    def claim(self, hint: str, model: str) -> Optional[Speculation]:
+        """
+        Hands over the speculation for the currently staged change, finished or in flight,
+        or None. Runs git if the index changed, so call it from a worker thread.
+        """
+        with self._lock:
+            spec = self._current
+        if spec is None or spec.hint != hint or spec.model != model or spec.token.cancelled or spec.failed:
+            return None
+        data = self.logic.load_repo_data(model)
+        if "error" in data or self.logic.generation_key(data, hint, model) != spec.key:
+            return None
+        return spec
+
+    def cancel(self) -> None:
+        """Drops pending and in-flight speculation (e.g. when switching repositories)."""
+        with self._lock:
+            self._cancel_timer()
+            if self._current is not None:
+                self._current.token.cancel()
+                self._current = None
@@ -0,0 +1,154 @@
+# staged_diff.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Parsed view of a unified diff, built once per snapshot and shared by every consumer
+(token counting, secret scanning, packing and the diff viewer). The raw `git diff`
+output is kept as one bytes buffer; files and hunks are small records of offsets into
+it, and consumers read slices through memoryviews instead of copying or decoding the
+whole diff. Text is decoded only for the slices that end up in a prompt or on screen.
+"""
+
+import re
+from typing import Dict, List, Optional, Union
+
+# Section starts after a newline; a literal "\n" prefix lets the regex engine skip ahead quickly
+_SECTION_RE = re.compile(rb"\n(?:diff --git |@@)")
+_DIFF_PREFIX = b"diff --git "
+
+
+class HunkRecord:
+    """One hunk: the `@@` line up to (not including) the newline ending its last line."""
+    __slots__ = ("start", "end", "added", "deleted")
+
+    def __init__(self, start: int, end: int, added: int, deleted: int):
+        self.start = start
+        self.end = end
+        self.added = added
+        self.deleted = deleted
+
+
+class FileRecord:
+    """One file's section: header lines (`diff --git`, index, ---/+++) followed by its hunks."""
+    __slots__ = ("path", "start", "header_end", "end", "hunks")
+
+    def __init__(self, path: str, start: int):
+        self.path = path
+        self.start = start
+        self.header_end = start
+        self.end = start
+        self.hunks: List[HunkRecord] = []
+
+    @property
+    def added(self) -> int:
+        return sum(h.added for h in self.hunks)
+
+    @property
+    def deleted(self) -> int:
+        return sum(h.deleted for h in self.hunks)
+
+
+def _line_end(buffer: bytes, start: int, limit: int) -> int:
+    """End of the last complete line before `limit` (without its newline)."""
+    end = limit
+    while end > start and buffer[end - 1:end] in (b"\n", b"\r"):
+        end -= 1
+    return end
+
+
+class StagedDiff:
+    """
+    A unified diff parsed into FileRecord/HunkRecord offsets over one shared buffer.
+    If `complete` is False (the read was truncated), the trailing hunk is dropped because
+    it may be cut mid-line; its file keeps the hunks before it.
+    """
+
+    def __init__(self, buffer: bytes, complete: bool = True):
+        self.buffer = buffer
+        self.complete = complete
+        self.files: List[FileRecord] = []
+        self._by_path: Optional[Dict[str, FileRecord]] = None
+        self._parse()
+
+    @classmethod
+    def from_text(cls, text: str, complete: bool = True) -> "StagedDiff":
+        return cls(text.encode('utf-8', errors='surrogatepass'), complete)
+
+    def _parse(self) -> None:
+        buffer = self.buffer
+        current: Optional[FileRecord] = None
+        hunk_start = -1
+
+        def close_hunk(limit: int) -> None:
+            end = _line_end(buffer, hunk_start, limit)
+            # Count lines starting with +/- (the `@@` line itself never does)
+            current.hunks.append(HunkRecord(hunk_start, end, buffer.count(b"\n+", hunk_start, end),
+                                            buffer.count(b"\n-", hunk_start, end)))
+            current.end = end
+
+        starts = [0] if buffer.startswith((_DIFF_PREFIX, b"@@")) else []
+        starts.extend(m.start() + 1 for m in _SECTION_RE.finditer(buffer))
+        for pos in starts:
+            if buffer.startswith(_DIFF_PREFIX, pos):
+                if current is not None and hunk_start >= 0:
+                    close_hunk(pos)
+                elif current is not None:
+                    current.header_end = current.end = _line_end(buffer, current.start, pos)
+                line_end = buffer.find(b"\n", pos)
+                line = buffer[pos:len(buffer) if line_end == -1 else line_end].decode('utf-8', errors='replace')
+                # "diff --git a/path b/path" -> path (b side)
+                path = line.rsplit(" b/", 1)[-1] if " b/" in line else line[len("diff --git "):]
+                current = FileRecord(path.rstrip("\r"), pos)
+                self.files.append(current)
+                hunk_start = -1
+            elif current is not None:
+                if hunk_start >= 0:
+                    close_hunk(pos)
+                else:
+                    current.header_end = current.end = _line_end(buffer, current.start, pos)
+                hunk_start = pos
+
+        if current is None:
+            return
+        if hunk_start < 0:
+            current.header_end = current.end = _line_end(buffer, current.start, len(buffer))
+        elif self.complete:
+            close_hunk(len(buffer))
+
+    # --- Reading ---
+
+    def view(self, start: int, end: int) -> memoryview:
+        """Zero-copy slice of the buffer."""
+        return memoryview(self.buffer)[start:end]
+
+    def text(self, start: int, end: int) -> str:
+        return str(memoryview(self.buffer)[start:end], 'utf-8', 'replace')
+
+    def header_view(self, record: FileRecord) -> memoryview:
+        return self.view(record.start, record.header_end)
+
+    def hunk_view(self, hunk: HunkRecord) -> memoryview:
+        return self.view(hunk.start, hunk.end)
+
+    def file_view(self, record: FileRecord) -> memoryview:
+        return self.view(record.start, record.end)
+
+    def file(self, path: str) -> Optional[FileRecord]:
+        if self._by_path is None:
+            self._by_path = {record.path: record for record in self.files}
+        return self._by_path.get(path)
+
+    def is_complete(self, record: FileRecord) -> bool:
+        """False for the last file of a truncated read, whose tail is missing."""
+        return self.complete or not self.files or record is not self.files[-1]
+
+    def __len__(self) -> int:
+        return len(self.buffer)
+
+    def __bool__(self) -> bool:
+        return bool(self.files) or bool(self.buffer.strip())
+
+
+def as_staged_diff(diff: Union[str, StagedDiff], complete: bool = True) -> StagedDiff:
+    """Accepts either form, so callers holding plain text (per-commit or shard diffs) still work."""
+    return diff if isinstance(diff, StagedDiff) else StagedDiff.from_text(diff, complete)
@@ -0,0 +1,9 @@
+# conftest.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""The application modules live at the repository root; make them importable from the tests."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,127 @@
+# test_branch_rewrite.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+import shutil
+import subprocess
+
+import pytest
+
+from branch_rewrite import BranchRewriter, commit_message, object_id, parse_range_log, rebuild_commit
+from git_utils import GitManager
+
+A = "a" * 40
+B = "b" * 40
+C = "c" * 40
+BLOB = "1" * 40
+ZERO = "0" * 40
+
+
+def test_parse_range_log_reads_nul_separated_entries():
+    output = (
+        f"\x1e{A} {C}\0\n"
+        f":100644 100644 {ZERO[:39]}2 {BLOB} M\0tab\tname.txt\0"
+        f":000000 100644 {ZERO} {BLOB[:39]}2 A\0café \"q\".py\0"
+        f"3\t1\ttab\tname.txt\0"
+        f"5\t0\tcafé \"q\".py\0"
+        f"\x1e{B} {A} {C}\0\n"
+    )
+    first, merge = parse_range_log(output)
+    assert (first.oid, first.parents) == (A, [C])
+    assert first.numstat == [("3", "1", "tab\tname.txt"), ("5", "0", 'café "q".py')]
+    assert first.blob_oids == {"tab\tname.txt": BLOB, 'café "q".py': BLOB[:39] + "2"}
+    assert first.files == ["tab\tname.txt", 'café "q".py']
+    assert (merge.oid, merge.parents, merge.numstat) == (B, [A, C], [])
+
+
+def test_parse_range_log_binary_numstat():
+    output = f"\x1e{A}\0\n:000000 100644 {ZERO} {BLOB} A\0logo.png\0-\t-\tlogo.png\0"
+    (commit,) = parse_range_log(output)
+    assert commit.parents == []
+    assert commit.numstat == [("-", "-", "logo.png")]
+
+
+def test_rebuild_commit_replaces_parents_message_and_drops_signature():
+    raw = (f"tree {BLOB}\nparent {A}\nauthor X <x@y> 1 +0000\ncommitter X <x@y> 1 +0000\n"
+           f"gpgsig -----BEGIN PGP SIGNATURE-----\n sig\n -----END PGP SIGNATURE-----\n\nwip\n").encode()
+    rebuilt = rebuild_commit(raw, [B], "feat: real message")
+    assert rebuilt == (f"tree {BLOB}\nparent {B}\nauthor X <x@y> 1 +0000\ncommitter X <x@y> 1 +0000\n\n"
+                       f"feat: real message\n").encode()
+    assert commit_message(rebuild_commit(raw, [A], None)) == "wip\n"
+
+
+def test_object_id_matches_git():
+    if not shutil.which("git"):
+        pytest.skip("git not installed")
+    payload = b"hello\n"
+    expected = subprocess.run(["git", "hash-object", "--stdin"], input=payload, capture_output=True).stdout
+    assert object_id("blob", payload) == expected.decode().strip()
+
+
+def _git(repo, *args):
+    return subprocess.run(["git", *args], cwd=repo, capture_output=True, text=True, check=True).stdout.strip()
+
+
+@pytest.fixture
+def repo(tmp_path):
+    if not shutil.which("git"):
+        pytest.skip("git not installed")
+    _git(tmp_path, "init", "-q", "-b", "main")
+    _git(tmp_path, "config", "user.email", "dev@example.com")
+    _git(tmp_path, "config", "user.name", "Dev")
+    (tmp_path / "a.txt").write_text("base\n")
+    _git(tmp_path, "add", "a.txt")
+    _git(tmp_path, "commit", "-q", "-m", "init")
+    _git(tmp_path, "checkout", "-q", "-b", "feature")
+    for i in range(3):
+        (tmp_path / f"f{i}.txt").write_text(f"{i}\n")
+        _git(tmp_path, "add", ".")
+        _git(tmp_path, "commit", "-q", "-m", f"wip {i}")
+    return tmp_path
+
+
+def _plan(repo):
+    git = GitManager(str(repo))
+    oids = git.range_oids("main", "feature")
+    return {
+        "ref": "refs/heads/feature",
+        "base": _git(repo, "rev-parse", "main"),
+        "old_tip": _git(repo, "rev-parse", "feature"),
+        "commits": [{"oid": oid, "original": f"wip {i}", "message": f"feat: change {i}"} for i, oid in enumerate(oids)],
+    }
+
+
+def _rewriter(repo):
+    return BranchRewriter(GitManager(str(repo)), None, None, None, None)
+
+
+def test_apply_rewrites_messages_and_keeps_trees(repo):
+    plan = _plan(repo)
+    trees = _git(repo, "log", "--format=%T", "main..feature")
+    result = _rewriter(repo).apply(plan)
+    assert result["ok"] and result["rewritten"] == 3
+    assert _git(repo, "log", "--format=%s", "main..feature").splitlines() == [
+        "feat: change 2", "feat: change 1", "feat: change 0"]
+    assert _git(repo, "log", "--format=%T", "main..feature") == trees
+
+
+def test_apply_refuses_when_the_branch_moved(repo):
+    plan = _plan(repo)
+    (repo / "late.txt").write_text("late\n")
+    _git(repo, "add", ".")
+    _git(repo, "commit", "-q", "-m", "late")
+    tip = _git(repo, "rev-parse", "feature")
+    result = _rewriter(repo).apply(plan)
+    assert not result["ok"] and "moved" in result["error"]
+    assert _git(repo, "rev-parse", "feature") == tip
+
+
+@pytest.mark.parametrize("edit", ["drop", "reorder"])
+def test_apply_refuses_an_edited_commit_list(repo, edit):
+    plan = _plan(repo)
+    if edit == "drop":
+        del plan["commits"][1]
+    else:
+        plan["commits"][0], plan["commits"][1] = plan["commits"][1], plan["commits"][0]
+    result = _rewriter(repo).apply(plan)
+    assert not result["ok"] and "do not match" in result["error"]
+    assert _git(repo, "rev-parse", "feature") == plan["old_tip"]
@@ -0,0 +1,75 @@
+# test_diff_packer.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+from diff_packer import (MAX_DIFF_TOKENS, MIN_DIFF_TOKENS, DiffPacker, budget_for_model, file_weight)
+
+
+def count(texts):
+    """Deterministic stand-in for the token counter: one token per 4 bytes."""
+    return [len(t if isinstance(t, str) else bytes(t)) // 4 + 1 for t in texts]
+
+
+def file_diff(path, hunks, lines=8):
+    parts = [f"diff --git a/{path} b/{path}\nindex 1111111..2222222 100644\n--- a/{path}\n+++ b/{path}\n"]
+    for h in range(hunks):
+        body = "".join(f"+line {h}-{i} of {path}\n" for i in range(lines))
+        parts.append(f"@@ -{h * 100},0 +{h * 100},{lines} @@ def f{h}():\n{body}")
+    return "".join(parts)
+
+
+def test_everything_fits_in_a_large_budget():
+    diff = file_diff("src/a.py", 2) + file_diff("src/b.py", 1)
+    packed = DiffPacker(count).pack(diff, 5000)
+    assert packed.included_files == ["src/a.py", "src/b.py"]
+    assert packed.summarized_files == []
+    assert packed.text == diff.rstrip("\n")
+    assert packed.token_count <= packed.budget
+
+
+def test_trimming_stays_within_budget_and_summarizes_the_rest():
+    diff = "".join(file_diff(f"src/m{i}.py", 3, lines=20) for i in range(6))
+    budget = 600
+    packed = DiffPacker(count).pack(diff, budget)
+    assert packed.token_count <= budget
+    assert packed.included_files
+    assert set(packed.included_files).isdisjoint(packed.summarized_files)
+    assert set(packed.included_files) | set(packed.summarized_files) == {f"src/m{i}.py" for i in range(6)}
+    assert "## OMITTED FROM DIFF (summaries)" in packed.text
+    # Summaries carry the touched definitions from the hunk headers
+    assert "def f0():" in packed.text.split("## OMITTED FROM DIFF (summaries)")[1]
+
+
+def test_partially_included_files_note_omitted_hunks():
+    diff = file_diff("src/big.py", 4, lines=30)
+    one_hunk = count([file_diff("src/big.py", 1, lines=30)])[0]
+    packed = DiffPacker(count).pack(diff, int(one_hunk * 1.6))
+    assert packed.included_files == ["src/big.py"]
+    assert "more hunks omitted)" in packed.text
+
+
+def test_source_is_packed_before_generated_files():
+    diff = file_diff("dist/app.min.js", 1, lines=20) + file_diff("src/app.py", 1, lines=20)
+    size = count([file_diff("src/app.py", 1, lines=20)])[0]
+    packed = DiffPacker(count).pack(diff, int(size * 1.4))
+    assert packed.included_files == ["src/app.py"]
+    assert packed.summarized_files == ["dist/app.min.js"]
+
+
+def test_files_missing_from_a_truncated_read_are_summarized_from_numstat():
+    diff = file_diff("src/a.py", 1)
+    numstat = [("8", "0", "src/a.py"), ("120", "4", "src/z.py"), ("-", "-", "img.png")]
+    packed = DiffPacker(count).pack(diff, 5000, numstat, complete=False)
+    assert "- src/z.py (+120 -4)" in packed.text
+    assert "- img.png (binary)" in packed.text
+    # The last file of a truncated read has no exact size
+    assert "src/a.py" not in packed.file_tokens
+
+
+def test_budget_for_model_is_clamped():
+    assert budget_for_model("google/gemini-pro") == MAX_DIFF_TOKENS
+    assert MIN_DIFF_TOKENS <= budget_for_model("unknown/model") <= MAX_DIFF_TOKENS
+
+
+def test_file_weight_orders_source_docs_tests_generated():
+    assert file_weight("src/app.py") > file_weight("README.md") > file_weight("web/app.min.js")
+    assert file_weight("tests/test_app.py") == file_weight("docs/guide.rst")
@@ -0,0 +1,128 @@
+# test_dispatcher.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+import threading
+import time
+
+import pytest
+
+from cancellation import CancelToken
+from dispatcher import DispatchError, HedgedDispatcher, LatencyStats
+
+
+class ApiError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def dispatcher(budgets=None, retries=1):
+    return HedgedDispatcher(LatencyStats(), budgets, max_retries=retries, backoff_base=0.001, backoff_cap=0.01)
+
+
+def test_first_model_wins_and_tokens_are_forwarded():
+    received = []
+
+    def attempt(model, deliver, cancel, started):
+        started()
+        for part in ("feat: ", "add x"):
+            deliver(part)
+        return "feat: add x"
+
+    model, text, lanes = dispatcher().run(["a", "b"], attempt, on_token=received.append)
+    assert (model, text, lanes) == ("a", "feat: add x", 1)
+    assert "".join(received) == "feat: add x"
+
+
+def test_non_retryable_failure_falls_back_to_the_next_model():
+    calls = []
+
+    def attempt(model, deliver, cancel, started):
+        calls.append(model)
+        started()
+        if model == "a":
+            raise ApiError(400)
+        deliver("ok")
+        return "ok"
+
+    assert dispatcher().run(["a", "b"], attempt)[:2] == ("b", "ok")
+    assert calls == ["a", "b"]  # 400 is not retried
+
+
+def test_retryable_failure_is_retried_on_the_same_model():
+    calls = []
+
+    def attempt(model, deliver, cancel, started):
+        calls.append(model)
+        started()
+        if len(calls) == 1:
+            raise ApiError(503)
+        deliver("ok")
+        return "ok"
+
+    assert dispatcher(retries=2).run(["a", "b"], attempt)[:2] == ("a", "ok")
+    assert calls == ["a", "a"]
+
+
+def test_empty_completion_falls_back_and_finally_raises():
+    def attempt(model, deliver, cancel, started):
+        started()
+        return ""
+
+    with pytest.raises(DispatchError) as info:
+        dispatcher().run(["a", "b"], attempt)
+    assert [model for model, _ in info.value.errors] == ["a", "b"]
+
+
+def test_slow_model_is_hedged_and_the_loser_cancelled():
+    cancelled = threading.Event()
+
+    def attempt(model, deliver, cancel, started):
+        started()
+        if model == "slow":
+            cancel.wait(5)
+            if cancel.cancelled:
+                cancelled.set()
+            return ""
+        deliver("fast")
+        return "fast"
+
+    model, text, lanes = dispatcher({"slow": 0.05}).run(["slow", "fast"], attempt)
+    assert (model, text, lanes) == ("fast", "fast", 2)
+    assert cancelled.wait(1)
+
+
+def test_rate_limit_queueing_does_not_trigger_a_hedge():
+    stats = LatencyStats()
+
+    def attempt(model, deliver, cancel, started):
+        time.sleep(0.2)  # Waiting for the rate limiter, longer than the budget
+        started()
+        deliver("ok")
+        return "ok"
+
+    result = HedgedDispatcher(stats, {"a": 0.05}).run(["a", "b"], attempt)
+    assert result == ("a", "ok", 1)
+    summary = stats.summary()["a"]
+    assert summary["samples"] == 1 and summary["median_ttft_ms"] < 100
+
+
+def test_cancel_returns_empty_result():
+    token = CancelToken()
+
+    def attempt(model, deliver, cancel, started):
+        started()
+        token.cancel()
+        cancel.wait(1)
+        return ""
+
+    assert dispatcher().run(["a"], attempt, cancel=token)[:2] == ("", "")
+
+
+def test_budget_follows_recent_latency():
+    stats = LatencyStats()
+    for _ in range(10):
+        stats.record("m", 4.0)
+    d = HedgedDispatcher(stats)
+    assert d.budget_for("m") == pytest.approx(6.0)
+    assert HedgedDispatcher(stats, {"m": 1.0}).budget_for("m") == 1.0
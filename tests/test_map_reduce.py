@@ -0,0 +1,45 @@
+# test_map_reduce.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+from map_reduce import MAX_SHARDS, estimate_tokens, shard_files
+
+
+def _numstat(count, lines=100, prefix="src/module"):
+    return [(str(lines), "0", f"{prefix}{i:05d}.py") for i in range(count)]
+
+
+def test_shard_count_is_capped_on_a_large_change():
+    numstat = _numstat(5000)
+    shards = shard_files(numstat, 8000)
+    assert len(shards) <= MAX_SHARDS
+    assert sorted(p for shard in shards for p in shard) == sorted(p for _, _, p in numstat)
+
+
+def test_shards_keep_path_order_and_every_file_once():
+    numstat = _numstat(300, lines=40)
+    shards = shard_files(list(reversed(numstat)), 2000)
+    flat = [p for shard in shards for p in shard]
+    assert flat == sorted(p for _, _, p in numstat)
+
+
+def test_shards_respect_the_budget_when_under_the_cap():
+    numstat = _numstat(60, lines=10)
+    budget = 1500
+    shards = shard_files(numstat, budget)
+    assert 1 < len(shards) <= MAX_SHARDS
+    costs = {p: estimate_tokens(a, d) for a, d, p in numstat}
+    for shard in shards:
+        assert sum(costs[p] for p in shard) <= budget
+
+
+def test_restaging_one_file_leaves_other_shards_intact():
+    numstat = _numstat(400, lines=20)
+    before = shard_files(numstat, 3000)
+    changed = [(a, d, p) if p != numstat[200][2] else ("25", d, p) for a, d, p in numstat]
+    after = shard_files(changed, 3000)
+    unchanged = [s for s in before if s in after]
+    assert len(unchanged) >= len(before) - 2
+
+
+def test_binary_files_get_a_flat_estimate():
+    assert estimate_tokens("-", "-") == estimate_tokens("0", "0")
@@ -0,0 +1,79 @@
+# test_staged_diff.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+from staged_diff import StagedDiff, as_staged_diff
+
+DIFF = (
+    "diff --git a/app.py b/app.py\n"
+    "index 1111111..2222222 100644\n"
+    "--- a/app.py\n"
+    "+++ b/app.py\n"
+    "@@ -1,2 +1,3 @@ def main():\n"
+    " keep\n"
+    "-old\n"
+    "+new\n"
+    "+more\n"
+    "@@ -10 +11 @@\n"
+    "-x\n"
+    "+y\n"
+    "diff --git a/café.txt b/café.txt\n"
+    "new file mode 100644\n"
+    "index 0000000..3333333\n"
+    "--- /dev/null\n"
+    "+++ b/café.txt\n"
+    "@@ -0,0 +1 @@\n"
+    "+héllo\n"
+    "diff --git a/logo.png b/logo.png\n"
+    "index 4444444..5555555 100644\n"
+    "Binary files a/logo.png and b/logo.png differ\n"
+)
+
+
+def test_files_and_hunks_are_located_by_offset():
+    diff = StagedDiff.from_text(DIFF)
+    assert [f.path for f in diff.files] == ["app.py", "café.txt", "logo.png"]
+
+    app = diff.files[0]
+    assert diff.text(app.start, app.header_end).splitlines()[-1] == "+++ b/app.py"
+    assert [diff.text(h.start, h.end).splitlines()[0] for h in app.hunks] == ["@@ -1,2 +1,3 @@ def main():",
+                                                                             "@@ -10 +11 @@"]
+    assert [(h.added, h.deleted) for h in app.hunks] == [(2, 1), (1, 1)]
+    assert (app.added, app.deleted) == (3, 2)
+
+
+def test_offsets_are_bytes_and_slices_decode():
+    diff = StagedDiff.from_text(DIFF)
+    cafe = diff.file("café.txt")
+    assert diff.text(cafe.hunks[0].start, cafe.hunks[0].end) == "@@ -0,0 +1 @@\n+héllo"
+    assert bytes(diff.file_view(cafe)).decode("utf-8").startswith("diff --git a/café.txt")
+
+
+def test_header_only_file_has_no_hunks():
+    diff = StagedDiff.from_text(DIFF)
+    logo = diff.file("logo.png")
+    assert logo.hunks == []
+    assert diff.text(logo.start, logo.end).endswith("Binary files a/logo.png and b/logo.png differ")
+
+
+def test_file_sections_do_not_include_the_next_header():
+    diff = StagedDiff.from_text(DIFF)
+    for record in diff.files:
+        assert diff.text(record.start, record.end).count("diff --git") == 1
+
+
+def test_truncated_read_drops_the_trailing_hunk():
+    text = DIFF.split("diff --git a/logo.png")[0][:-4]  # Cut mid-line in the last hunk
+    diff = StagedDiff.from_text(text, complete=False)
+    cafe = diff.file("café.txt")
+    assert cafe.hunks == []
+    assert not diff.is_complete(cafe)
+    assert diff.is_complete(diff.file("app.py"))
+    assert len(diff.file("app.py").hunks) == 2
+
+
+def test_empty_and_passthrough():
+    empty = StagedDiff(b"")
+    assert not empty and len(empty) == 0 and empty.files == []
+    diff = StagedDiff.from_text(DIFF)
+    assert as_staged_diff(diff) is diff
+    assert [f.path for f in as_staged_diff(DIFF).files] == [f.path for f in diff.files]
@@ -0,0 +1,100 @@
+# test_token_service.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+import pytest
+
+import token_service
+from token_service import BYTES_PER_TOKEN, TokenCounter, encoding_for_model
+
+
+class FakeEncoder:
+    """Counts whitespace-separated words and records what it was asked to encode."""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode_ordinary_batch(self, texts, num_threads=1):
+        self.calls.append(list(texts))
+        return [t.split() for t in texts]
+
+
+@pytest.fixture
+def encoder(monkeypatch):
+    fake = FakeEncoder()
+    monkeypatch.setattr(TokenCounter, "_get_encoder", lambda self, name: fake)
+    return fake
+
+
+def test_counts_are_memoized_and_misses_batched(encoder):
+    counter = TokenCounter()
+    assert counter.count_many(["a b", "c d e", "a b"]) == [2, 3, 2]
+    assert encoder.calls == [["a b", "c d e"]]  # Duplicates encoded once, in one batch
+    assert counter.count_many(["c d e", "f"]) == [3, 1]
+    assert encoder.calls[-1] == ["f"]
+
+
+def test_memoryview_slices_share_the_memo_with_text(encoder):
+    counter = TokenCounter()
+    buffer = "x héllo wörld y".encode("utf-8")
+    view = memoryview(buffer)[2:-2]
+    assert counter.count_many([view]) == [2]
+    assert counter.count("héllo wörld") == 2
+    assert len(encoder.calls) == 1
+
+
+def test_memo_is_per_encoding(encoder):
+    counter = TokenCounter()
+    counter.count("one two", "openai/gpt-4o")
+    counter.count("one two", "mistralai/mistral-7b-instruct")
+    assert len(encoder.calls) == 2
+    assert encoding_for_model("openai/gpt-4o") != encoding_for_model("mistralai/mistral-7b-instruct")
+
+
+def test_memo_is_bounded(encoder):
+    counter = TokenCounter(max_entries=3)
+    counter.count_many(["a", "b", "c", "d"])
+    assert len(counter._memo) == 3
+
+
+def _failing_then_working(monkeypatch):
+    import tiktoken
+    fake = FakeEncoder()
+    state = {"online": False, "loads": 0}
+
+    def get_encoding(name):
+        state["loads"] += 1
+        if not state["online"]:
+            raise OSError("offline")
+        return fake
+
+    monkeypatch.setattr(tiktoken, "get_encoding", get_encoding)
+    return state
+
+
+def test_failed_encoder_load_falls_back_and_is_retried_after_backoff(monkeypatch):
+    pytest.importorskip("tiktoken")
+    state = _failing_then_working(monkeypatch)
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(token_service.time, "monotonic", lambda: clock["now"])
+    counter = TokenCounter()
+    text = "one two three four five six seven"
+
+    # 1. Offline: estimate, and no retry within the backoff
+    assert counter.count(text) == len(text) // BYTES_PER_TOKEN
+    state["online"] = True
+    clock["now"] += token_service.ENCODER_RETRY_SEC / 2
+    assert counter.count(text) == len(text) // BYTES_PER_TOKEN
+    assert state["loads"] == 1
+
+    # 2. After the backoff the encoder loads, and the estimate was never memoized
+    clock["now"] += token_service.ENCODER_RETRY_SEC
+    assert counter.count(text) == 7
+    assert state["loads"] == 2
+    assert counter.count(text) == 7
+    assert state["loads"] == 2
+
+
+def test_count_messages_adds_framing(encoder):
+    counter = TokenCounter()
+    messages = [{"role": "system", "content": "a b"}, {"role": "user", "content": "c"}]
+    assert counter.count_messages(messages) == 3 + 2 * token_service.TOKENS_PER_MESSAGE + token_service.TOKENS_PER_REPLY
@@ -0,0 +1,180 @@
+# token_service.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Token counting service: encoders are loaded once per family, chunks are encoded
+in parallel batches, and counts are memoized by content hash.
+"""
+
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
+
+from prompt_builder import message_text
+
+if TYPE_CHECKING:
+    import tiktoken  # Imported on first encoder load to keep startup fast
+
+DEFAULT_ENCODING = "cl100k_base"
+BYTES_PER_TOKEN = 4  # Rough heuristic used without an encoder, and to turn a token cap into a byte cap
+ENCODER_RETRY_SEC = 60.0  # A failed encoder load (e.g. offline) is retried after this long
+
+# Directory (next to the sources, or inside the PyInstaller bundle) holding pre-downloaded
+# encoder files; see `python cli.py tokenizer-cache`. When present, tiktoken never downloads.
+BUNDLED_CACHE_DIR = "tiktoken_cache"
+
+# Model id prefixes (OpenRouter style "<vendor>/<model>") mapped to the closest tiktoken encoding.
+# Non-OpenAI models don't publish tiktoken encodings; cl100k_base is a close approximation.
+MODEL_ENCODINGS = [
+    ("openai/gpt-4o", "o200k_base"),
+    ("openai/gpt-4.1", "o200k_base"),
+    ("openai/gpt-5", "o200k_base"),
+    ("openai/o1", "o200k_base"),
+    ("openai/o3", "o200k_base"),
+    ("openai/o4", "o200k_base"),
+]
+
+# Per-message framing overhead of the chat format (role markers etc.)
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+
+def bundled_cache_path() -> str:
+    """Where the bundled encoder files live, whether or not they have been downloaded."""
+    base = getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base, BUNDLED_CACHE_DIR)
+
+
+def bundled_cache_dir() -> Optional[str]:
+    path = bundled_cache_path()
+    return path if os.path.isdir(path) else None
+
+
+def build_encoder_cache(directory: str, encodings: List[str] = None) -> List[str]:
+    """
+    Downloads the encoder files for `encodings` (default: every encoding used here)
+    into `directory`, for bundling with the app. Needs network access.
+    """
+    os.makedirs(directory, exist_ok=True)
+    os.environ["TIKTOKEN_CACHE_DIR"] = os.path.abspath(directory)
+    import tiktoken
+    names = encodings or sorted({DEFAULT_ENCODING} | {name for _, name in MODEL_ENCODINGS})
+    for name in names:
+        tiktoken.get_encoding(name)
+    return names
+
+
+def encoding_for_model(model: str) -> str:
+    """Returns the tiktoken encoding name used to count tokens for `model`."""
+    for prefix, encoding in MODEL_ENCODINGS:
+        if (model or "").startswith(prefix):
+            return encoding
+    return DEFAULT_ENCODING
+
+
+def _as_text(text: Union[str, memoryview]) -> str:
+    return text if isinstance(text, str) else str(text, 'utf-8', 'replace')
+
+
+class TokenCounter:
+    """Model-aware, memoized token counter shared by the packer and the prompt estimate."""
+
+    def __init__(self, max_entries: int = 50000, num_threads: int = 4):
+        self.max_entries = max_entries
+        self.num_threads = num_threads
+        self._encoders: Dict[str, "tiktoken.Encoding"] = {}
+        self._encoder_failures: Dict[str, float] = {}  # {name: monotonic time of the last failed load}
+        self._memo: "OrderedDict[bytes, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_encoder(self, name: str) -> Optional["tiktoken.Encoding"]:
+        """
+        Loads an encoder on first use; None if it is unavailable (e.g. offline).
+        A failed load is retried once ENCODER_RETRY_SEC have passed.
+        """
+        with self._lock:
+            if name not in self._encoders:
+                failed_at = self._encoder_failures.get(name)
+                if failed_at is not None and time.monotonic() - failed_at < ENCODER_RETRY_SEC:
+                    return None
+                try:
+                    bundled = bundled_cache_dir()
+                    if bundled and "TIKTOKEN_CACHE_DIR" not in os.environ:
+                        os.environ["TIKTOKEN_CACHE_DIR"] = bundled
+                    import tiktoken
+                    self._encoders[name] = tiktoken.get_encoding(name)
+                    self._encoder_failures.pop(name, None)
+                except Exception:
+                    self._encoder_failures[name] = time.monotonic()
+                    return None
+            return self._encoders[name]
+
+    def clear(self) -> None:
+        """Drops memoized counts; loaded encoders are kept."""
+        with self._lock:
+            self._memo.clear()
+
+    def count(self, text: str, model: str = None) -> int:
+        return self.count_many([text], model)[0]
+
+    def count_many(self, texts: List[Union[str, memoryview]], model: str = None) -> List[int]:
+        """
+        Counts tokens for each text. Only texts not seen before are encoded,
+        in a single parallel batch. UTF-8 memoryviews (slices of a StagedDiff) are
+        hashed in place and only decoded when they miss the memo.
+        """
+        encoding_name = encoding_for_model(model)
+        keys = [self._key(encoding_name, t) for t in texts]
+        counts: List[Optional[int]] = [None] * len(texts)
+
+        # 1. Serve what we can from the memo
+        misses: Dict[bytes, List[int]] = {}
+        with self._lock:
+            for idx, key in enumerate(keys):
+                cached = self._memo.get(key)
+                if cached is not None:
+                    self._memo.move_to_end(key)
+                    counts[idx] = cached
+                else:
+                    misses.setdefault(key, []).append(idx)
+
+        if not misses:
+            return counts
+
+        # 2. Encode the unique misses together
+        miss_texts = [_as_text(texts[indices[0]]) for indices in misses.values()]
+        encoder = self._get_encoder(encoding_name)
+        if encoder is None:
+            # Fallback estimate when no encoder can be loaded
+            miss_counts = [len(t) // BYTES_PER_TOKEN for t in miss_texts]
+        else:
+            # encode_ordinary: diff content may legitimately contain special-token text
+            encoded = encoder.encode_ordinary_batch(miss_texts, num_threads=self.num_threads)
+            miss_counts = [len(tokens) for tokens in encoded]
+
+        # 3. Store and fill in (estimates are not memoized, so exact counts replace them once an encoder loads)
+        with self._lock:
+            for (key, indices), value in zip(misses.items(), miss_counts):
+                if encoder is not None:
+                    self._memo[key] = value
+                for idx in indices:
+                    counts[idx] = value
+            while len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+        return counts
+
+    def count_messages(self, messages: List[Dict[str, Any]], model: str = None) -> int:
+        """Counts a chat request the way it is sent, including per-message framing."""
+        contents = [message_text(m) for m in messages]
+        return sum(self.count_many(contents, model)) + TOKENS_PER_MESSAGE * len(messages) + TOKENS_PER_REPLY
+
+    @staticmethod
+    def _key(encoding_name: str, text: Union[str, memoryview]) -> bytes:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(encoding_name.encode())
+        h.update(text.encode('utf-8', errors='surrogatepass') if isinstance(text, str) else text)
+        return h.digest()
@@ -0,0 +1,169 @@
+# tracing.py
+# Copyright (c) 2025 GitAI-Commit. All rights reserved.
+
+"""
+Lightweight per-operation timing spans and a rotating JSONL trace log.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+TRACE_FORMAT_VERSION = 1
+
+# Short labels for the one-line summary shown in the UI, in display order
+SUMMARY_SPANS = [
+    ("git.snapshot", "git"),
+    ("secrets.scan", "scan"),
+    ("diff.pack", "pack"),
+    ("tokens.prompt", "tokens"),
+    ("map_reduce", "map"),
+    ("api.queue", "queue"),
+]
+
+
+class Span:
+    """One timed stage. `attrs` holds stage-specific figures (bytes read, tokens, ...)."""
+
+    def __init__(self, name: str, start_ms: float, attrs: Dict[str, Any]):
+        self.name = name
+        self.start_ms = start_ms  # Offset from the start of the trace
+        self.duration_ms = 0.0
+        self.attrs = attrs
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "start_ms": round(self.start_ms, 2),
+                "duration_ms": round(self.duration_ms, 2), **self.attrs}
+
+
+class Trace:
+    """
+    Collects spans for one operation (a refresh or a generation).
+    Spans may be recorded from worker threads.
+    """
+
+    def __init__(self, operation: str, **attrs: Any):
+        self.operation = operation
+        self.attrs: Dict[str, Any] = dict(attrs)
+        self.spans: List[Span] = []
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.total_ms = None
+        self._lock = threading.Lock()
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[Span]:
+        """Times the enclosed block. Attributes can be added to the yielded span inside it."""
+        span = Span(name, self.elapsed_ms(), attrs)
+        try:
+            yield span
+        finally:
+            span.duration_ms = self.elapsed_ms() - span.start_ms
+            with self._lock:
+                self.spans.append(span)
+
+    def set(self, **attrs: Any) -> None:
+        with self._lock:
+            self.attrs.update(attrs)
+
+    def finish(self) -> float:
+        if self.total_ms is None:
+            self.total_ms = self.elapsed_ms()
+        return self.total_ms
+
+    def duration_of(self, name: str) -> float:
+        """Total time spent in spans called `name`."""
+        with self._lock:
+            return sum(s.duration_ms for s in self.spans if s.name == name)
+
+    def find(self, name: str, **match: Any) -> Optional[Span]:
+        """The most recently finished span called `name` whose attributes match."""
+        with self._lock:
+            for span in reversed(self.spans):
+                if span.name == name and all(span.attrs.get(k) == v for k, v in match.items()):
+                    return span
+        return None
+
+    def sum_attr(self, name: str, key: str) -> float:
+        """Sums a numeric attribute over the spans called `name` (e.g. the cost of map calls)."""
+        with self._lock:
+            return sum(s.attrs.get(key) or 0 for s in self.spans if s.name == name)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start_ms)
+            return {
+                "version": TRACE_FORMAT_VERSION,
+                "operation": self.operation,
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+                "total_ms": round(self.total_ms if self.total_ms is not None else self.elapsed_ms(), 2),
+                **self.attrs,
+                "spans": [s.to_dict() for s in spans],
+            }
+
+    def summary(self) -> str:
+        """Compact one-liner, e.g. "git 42ms · pack 8ms · TTFT 0.9s · 35 tok/s · $0.0004 · 1.6s"."""
+        parts = []
+        for name, label in SUMMARY_SPANS:
+            duration = self.duration_of(name)
+            if duration >= 1:
+                parts.append(f"{label} {duration:.0f}ms")
+        if "ttft_ms" in self.attrs:
+            parts.append(f"TTFT {self.attrs['ttft_ms'] / 1000:.1f}s")
+        if self.attrs.get("cached_tokens") and self.attrs.get("prompt_tokens"):
+            # Share of the prompt the provider served from its prompt cache
+            parts.append(f"{self.attrs['cached_tokens'] / self.attrs['prompt_tokens']:.0%} prompt cached")
+        if self.attrs.get("tokens_per_sec"):
+            parts.append(f"{self.attrs['tokens_per_sec']:.0f} tok/s")
+        if self.attrs.get("cost"):
+            parts.append(f"${self.attrs['cost']:.4f}")
+        if self.attrs.get("cache_hit"):
+            parts.append("cached")
+        parts.append(f"{self.finish() / 1000:.1f}s" if self.finish() >= 1000 else f"{self.finish():.0f}ms")
+        return " · ".join(parts)
+
+
+class TraceLog:
+    """
+    Appends finished traces as JSON lines, rotating the file at `max_bytes`
+    (keeping `backups` older files: trace.jsonl.1, .2, ...).
+    """
+
+    _locks: Dict[str, threading.Lock] = {}
+    _locks_guard = threading.Lock()
+
+    def __init__(self, path: str, max_bytes: int = 1024 * 1024, backups: int = 3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        # One lock per file, shared by every TraceLog writing to it (e.g. batch workers)
+        with TraceLog._locks_guard:
+            self._lock = TraceLog._locks.setdefault(os.path.abspath(path), threading.Lock())
+
+    def write(self, trace: Trace) -> None:
+        trace.finish()
+        line = json.dumps(trace.to_dict(), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                    self._rotate()
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"Error writing trace log: {e}")
+
+    def _rotate(self) -> None:
+        for idx in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{idx}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{idx + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)